@@ -0,0 +1,210 @@
+"""
+This module provides the timing engine used to fire alarms. Events are held in a
+binary heap and are run by a dedicated thread that sleeps until the next event is
+due, so alarms go off on time whether or not anyone is using the web page.
+"""
+
+
+import heapq
+import logging
+import threading
+import time
+
+
+class Event:
+    """A scheduled call held in the engine's heap
+
+    Events are ordered by time, then priority, then insertion order, which
+    matches the ordering used by the standard library's sched module.
+    """
+    __slots__ = ('time', 'priority', 'sequence', 'action', 'argument', 'kwargs', 'cancelled', 'queued')
+
+    def __init__(self, time: float, priority: int, sequence: int, action, argument: tuple, kwargs: dict):
+        self.time = time
+        self.priority = priority
+        self.sequence = sequence
+        self.action = action
+        self.argument = argument
+        self.kwargs = kwargs
+        self.cancelled = False
+        self.queued = True #False once the event has been taken off the heap to be run
+
+    def __lt__(self, other) -> bool:
+        return (self.time, self.priority, self.sequence) < (other.time, other.priority, other.sequence)
+
+    def __repr__(self) -> str:
+        return 'Event(time=%r, priority=%r, action=%r)' % (self.time, self.priority, self.action)
+
+
+class AlarmEngine:
+    """Runs scheduled events on a background thread
+
+    Insertion is O(log n). Cancelling marks the event so that it is skipped when it
+    reaches the top of the heap, and the heap is compacted once cancelled events
+    make up more than half of it, so cancel is O(1) amortised.
+
+    The runner never sleeps for longer than max_wait, so if the clock jumps forward,
+    for example after the computer has been asleep, overdue events are still run
+    soon after it wakes.
+
+    Keyword arguments:
+    timefunc -- function returning the current time in seconds since the epoch
+    max_wait -- most seconds the runner sleeps before checking the clock again
+    """
+
+    def __init__(self, timefunc=time.time, max_wait: float = 60):
+        self.timefunc = timefunc
+        self.max_wait = max_wait
+        self._heap = []
+        self._sequence = 0
+        self._cancelled = 0
+        self._lock = threading.Condition(threading.RLock())
+        self._thread = None
+        self._running = False
+
+    def enterabs(self, time: float, priority: int, action, argument: tuple = (), kwargs: dict = None) -> Event:
+        """Schedules an action to be run at an absolute time and returns its event"""
+        with self._lock:
+            self._sequence += 1
+            event = Event(time, priority, self._sequence, action, argument, kwargs or {})
+            heapq.heappush(self._heap, event)
+            if self._heap[0] is event: #wakes the runner if the new event is now the earliest
+                self._lock.notify()
+        return event
+
+    def enterabs_many(self, entries) -> list:
+        """Schedules many actions at once and returns their events in the same order
+
+        When the batch is large compared to the heap, the events are appended and the
+        heap is rebuilt in one O(n) pass instead of pushing each event in turn.
+
+        Keyword arguments:
+        entries -- iterable of (time, priority, action, argument) tuples
+        """
+        with self._lock:
+            earliest = self._heap[0] if self._heap else None
+            events = []
+            for time, priority, action, argument in entries:
+                self._sequence += 1
+                events.append(Event(time, priority, self._sequence, action, argument, {}))
+            if len(events) > len(self._heap) // 8:
+                self._heap.extend(events)
+                heapq.heapify(self._heap)
+            else:
+                for event in events:
+                    heapq.heappush(self._heap, event)
+            if self._heap and self._heap[0] is not earliest: #wakes the runner if the earliest event changed
+                self._lock.notify()
+        return events
+
+    def enter(self, delay: float, priority: int, action, argument: tuple = (), kwargs: dict = None) -> Event:
+        """Schedules an action to be run after a delay in seconds and returns its event"""
+        return self.enterabs(self.timefunc() + delay, priority, action, argument, kwargs)
+
+    def cancel(self, event: Event) -> bool:
+        """Cancels a pending event, returns False if it has already run or been cancelled"""
+        with self._lock:
+            if event is None or event.cancelled or event.action is None:
+                return False
+            event.cancelled = True
+            if not event.queued:
+                return True #taken off the heap with others due at the same time, so it is skipped when its turn comes
+            self._cancelled += 1
+            if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+                self._compact()
+            return True
+
+    def _compact(self) -> None:
+        """Removes cancelled events from the heap"""
+        self._heap = [event for event in self._heap if not event.cancelled]
+        heapq.heapify(self._heap)
+        self._cancelled = 0
+
+    def empty(self) -> bool:
+        """Checks whether there are no pending events"""
+        with self._lock:
+            return len(self._heap) == self._cancelled
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._heap) - self._cancelled
+
+    @property
+    def queue(self) -> list:
+        """A sorted list of the pending events"""
+        with self._lock:
+            return sorted(event for event in self._heap if not event.cancelled)
+
+    def next_deadline(self) -> float:
+        """Returns the time of the earliest pending event, or None if there is none"""
+        with self._lock:
+            self._discard_cancelled()
+            return self._heap[0].time if self._heap else None
+
+    def _discard_cancelled(self) -> None:
+        """Pops cancelled events off the top of the heap"""
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+            self._cancelled -= 1
+
+    def _pop_due(self, now: float) -> list:
+        """Removes and returns every event that is due at the given time"""
+        due = []
+        self._discard_cancelled()
+        while self._heap and self._heap[0].time <= now:
+            event = heapq.heappop(self._heap)
+            event.queued = False
+            due.append(event)
+            self._discard_cancelled()
+        return due
+
+    def _fire(self, event: Event) -> None:
+        """Runs the action of an event unless it was cancelled after being taken off the heap
+
+        Any error raised by the action is logged rather than raised.
+        """
+        with self._lock:
+            if event.cancelled:
+                return
+            action = event.action
+            event.action = None #marks the event as run so it can no longer be cancelled
+        try:
+            action(*event.argument, **event.kwargs)
+        except Exception:
+            logging.exception('scheduled event %r raised an error', action)
+
+    def _run(self) -> None:
+        """Main loop of the runner thread"""
+        while True:
+            with self._lock:
+                if not self._running:
+                    return
+                due = self._pop_due(self.timefunc())
+                if not due:
+                    timeout = self._heap[0].time - self.timefunc() if self._heap else self.max_wait
+                    timeout = min(timeout, self.max_wait)
+                    self._lock.wait(timeout)
+                    continue
+            for event in due: #actions run without the lock so they can schedule new events
+                self._fire(event)
+
+    def start(self) -> None:
+        """Starts the runner thread if it is not already running"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='alarm-engine', daemon=True)
+            self._thread.start()
+        logging.info('alarm engine started')
+
+    def stop(self, timeout: float = None) -> None:
+        """Stops the runner thread, pending events are kept"""
+        with self._lock:
+            self._running = False
+            self._lock.notify()
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        logging.info('alarm engine stopped')
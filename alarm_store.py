@@ -0,0 +1,114 @@
+"""
+This module provides the registry that holds the alarms set by the user. Alarms are
+indexed by title and by date so that adding, finding and cancelling an alarm does
+not require searching through every alarm.
+"""
+
+
+import heapq
+import itertools
+import threading
+
+
+class AlarmRegistry:
+    """Holds alarms indexed by title and date
+
+    Iterating over the registry yields the alarms in the order they were added,
+    so it can be passed straight to the html template.
+    """
+
+    def __init__(self):
+        self._by_title = {}
+        self._by_date = {}
+        self._date_heap = [] #dates that have alarms, earliest first
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._by_title)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._by_title.values()))
+
+    def __contains__(self, title: str) -> bool:
+        return title in self._by_title
+
+    def page(self, start: int, count: int) -> list:
+        """Returns up to count alarms from a position in the order they were added
+
+        Only the alarms up to the end of the page are visited, none are copied.
+        """
+        with self._lock:
+            return list(itertools.islice(self._by_title.values(), start, start + count))
+
+    def get(self, title: str) -> dict:
+        """Returns the alarm with the given title, or None if there is none"""
+        return self._by_title.get(title)
+
+    def on_date(self, date: str) -> list:
+        """Returns the alarms set for a date formatted as YYYY-MM-DD"""
+        with self._lock:
+            return list(self._by_date.get(date, {}).values())
+
+    def pop_dates_until(self, date: str) -> list:
+        """Returns, earliest first, the dates with alarms up to and including a date
+
+        Each date is only returned once, so calling this again with a later date
+        only returns the dates that have been reached since.
+
+        Keyword arguments:
+        date -- the last date to return, formatted as YYYY-MM-DD
+        """
+        with self._lock:
+            dates = []
+            while self._date_heap and self._date_heap[0] <= date:
+                earliest = heapq.heappop(self._date_heap)
+                if earliest in self._by_date and (not dates or dates[-1] != earliest):
+                    dates.append(earliest)
+            return dates
+
+    def add(self, alarm: dict) -> bool:
+        """Adds an alarm, returns False if an alarm with the same title already exists"""
+        with self._lock:
+            if alarm['title'] in self._by_title:
+                return False
+            self._by_title[alarm['title']] = alarm
+            if alarm['date'] not in self._by_date:
+                heapq.heappush(self._date_heap, alarm['date'])
+            self._by_date.setdefault(alarm['date'], {})[alarm['title']] = alarm
+            return True
+
+    def add_many(self, alarms) -> list:
+        """Adds many alarms at once and returns the ones that were added
+
+        Alarms whose title is already taken, including by an earlier alarm in the
+        same batch, are skipped.
+        """
+        with self._lock:
+            return [alarm for alarm in alarms if self.add(alarm)]
+
+    def set_schedule(self, alarm: dict, event) -> None:
+        """Records the scheduler event that will fire an alarm"""
+        with self._lock:
+            alarm['schedule'] = event
+
+    def pop(self, title: str) -> dict:
+        """Removes and returns the alarm with the given title, or None if there is none"""
+        with self._lock:
+            alarm = self._by_title.pop(title, None)
+            if alarm is None:
+                return None
+            same_date = self._by_date.get(alarm['date'])
+            if same_date is not None:
+                same_date.pop(title, None)
+                if not same_date:
+                    del self._by_date[alarm['date']]
+            return alarm
+
+    def discard(self, alarm: dict) -> bool:
+        """Removes an alarm if it is still held, returns False if it was not"""
+        with self._lock:
+            if self._by_title.get(alarm['title']) is not alarm:
+                return False
+            self.pop(alarm['title'])
+            return True
@@ -0,0 +1,130 @@
+"""
+This module provides the cache shared by everything that asks the news, weather and
+Covid-19 APIs for information. Responses are kept for a configurable time, requests
+for the same information that arrive together share a single upstream call, and the
+last good response is served if the API stops answering.
+"""
+
+
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+
+class _Entry:
+    """A cached response and the time it was fetched"""
+    __slots__ = ('value', 'fetched')
+
+    def __init__(self, value, fetched: float):
+        self.value = value
+        self.fetched = fetched
+
+
+class _Flight:
+    """An upstream call that other callers can wait on"""
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ApiCache:
+    """A time-limited, least-recently-used cache of API responses
+
+    Keyword arguments:
+    name -- name of the source, used in log messages
+    ttl -- seconds a response is served before it is fetched again
+    max_entries -- number of responses kept before the least recently used is dropped
+    max_stale -- seconds an expired response may still be served if fetching fails
+    timefunc -- function returning the current time in seconds
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: int = 128, max_stale: float = 86400, timefunc=time.monotonic):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_stale = max_stale
+        self.timefunc = timefunc
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale = 0
+        self.errors = 0
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, fetch):
+        """Returns the cached response for a key, calling fetch if it is missing or expired
+
+        Keyword arguments:
+        key -- identifies the request, for example the location of a weather request
+        fetch -- function taking no arguments that requests the information upstream
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.timefunc() - entry.fetched < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader: #another caller is already fetching this key
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = fetch()
+        except Exception as error:
+            flight.error = error
+        with self._lock:
+            del self._flights[key]
+            if flight.error is None:
+                self._store(key, flight.value)
+            else:
+                self.errors += 1
+                entry = self._entries.get(key)
+                if entry is not None and self.timefunc() - entry.fetched < self.ttl + self.max_stale:
+                    #the last good response is served instead of the error
+                    logging.warning('%s request failed, serving stale response: %r', self.name, flight.error)
+                    self.stale += 1
+                    flight.value, flight.error = entry.value, None
+        flight.done.set()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _store(self, key, value) -> None:
+        """Stores a response and drops the least recently used ones over the limit"""
+        self._entries[key] = _Entry(value, self.timefunc())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key=None) -> None:
+        """Drops the cached response for a key, or every response if no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Returns the hit and miss counters of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced,
+                    'stale': self.stale, 'errors': self.errors, 'entries': len(self._entries),
+                    'hit_ratio': (self.hits + self.coalesced) / lookups if lookups else 0.0}
@@ -0,0 +1,216 @@
+"""
+This module provides the HTTP client used by every API request. Each source has its
+own pooled keep-alive session, requests are given connect and read timeouts, failed
+requests are retried with jittered exponential backoff, and a circuit breaker stops
+requests to a source that keeps failing until it has had time to recover.
+The requests library is only imported when the first request is made, as importing
+it takes longer than starting the rest of the program.
+"""
+
+
+import logging
+import random
+import threading
+import time
+from metrics import registry
+
+FETCH_SECONDS = registry.histogram('upstream_fetch_seconds', 'Seconds taken by each attempt at an API request', ('source', 'outcome'))
+FETCH_FAILURES = registry.counter('upstream_failures_total', 'API requests that failed after every retry', ('source',))
+
+
+class CircuitOpenError(IOError):
+    """Raised when a request is refused because the source's circuit breaker is open
+
+    Like the errors raised by requests, it is an IOError.
+    """
+
+
+class CircuitBreaker:
+    """Stops calls to a source after repeated failures
+
+    The breaker opens after a number of consecutive failures. While it is open
+    every call is refused, and once the reset timeout has passed a single trial
+    call is let through; if it succeeds the breaker closes again.
+
+    Keyword arguments:
+    failure_threshold -- consecutive failures needed to open the breaker
+    reset_timeout -- seconds the breaker stays open before a trial call
+    timefunc -- function returning the current time in seconds
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30, timefunc=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timefunc = timefunc
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Either 'closed', 'open' or 'half-open'"""
+        if self.opened_at is None:
+            return 'closed'
+        if self.timefunc() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        """Checks whether a call may be made now"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """Closes the breaker after a successful call"""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        """Counts a failed call and opens the breaker if there have been too many"""
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = self.timefunc()
+            self._trial = False
+
+
+class ApiClient:
+    """Makes requests to one API source
+
+    Keyword arguments:
+    name -- name of the source, used in log messages
+    connect_timeout -- seconds to wait for a connection to be made
+    read_timeout -- seconds to wait for the response
+    retries -- number of times a failed request is repeated
+    backoff -- seconds waited before the first retry, doubled for every retry after it
+    max_backoff -- most seconds waited before any retry
+    pool_size -- number of keep-alive connections kept open to the source
+    breaker -- circuit breaker for the source, a default one is created if not given
+    """
+
+    def __init__(self, name: str, connect_timeout: float = 3.05, read_timeout: float = 10,
+                 retries: int = 3, backoff: float = 0.5, max_backoff: float = 8,
+                 pool_size: int = 10, breaker: CircuitBreaker = None):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """The keep-alive session requests are made with, created when the first request is made"""
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def _delay(self, attempt: int) -> float:
+        """Returns a random delay of up to the exponential backoff for an attempt"""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def call(self, request):
+        """Calls a request function with retries, backoff and the circuit breaker
+
+        Connection errors, timeouts and responses with a 429 or 5xx status are
+        retried; any other error is counted as a failure and raised straight away,
+        except a 4xx status, which means the request rather than the source was at fault.
+
+        Keyword arguments:
+        request -- function taking no arguments that makes the request
+        """
+        import requests #only slow the first time, after that it is looked up in sys.modules
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError('%s circuit breaker is open' % self.name)
+            start = time.perf_counter()
+            try:
+                result = request()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as error:
+                failure = error
+            except requests.exceptions.HTTPError as error:
+                status = error.response.status_code if error.response is not None else None
+                if status != 429 and (status is None or status < 500):
+                    FETCH_SECONDS.observe(time.perf_counter() - start, (self.name, 'rejected'))
+                    self.breaker.record_success() #the source answered, the request was at fault
+                    raise
+                failure = error
+            except Exception:
+                #any other error, such as a body that is not JSON, is not retried but still counts
+                #as a failure, so a half-open breaker's trial call is always settled
+                FETCH_SECONDS.observe(time.perf_counter() - start, (self.name, 'failed'))
+                self.breaker.record_failure()
+                raise
+            else:
+                FETCH_SECONDS.observe(time.perf_counter() - start, (self.name, 'ok'))
+                self.breaker.record_success()
+                return result
+            FETCH_SECONDS.observe(time.perf_counter() - start, (self.name, 'failed'))
+            self.breaker.record_failure()
+            logging.warning('%s request failed (attempt %d of %d): %r', self.name, attempt + 1, self.retries + 1, failure)
+            if attempt < self.retries:
+                time.sleep(self._delay(attempt))
+        FETCH_FAILURES.inc(labels=(self.name,))
+        raise failure
+
+    def get_json(self, url: str, params: dict = None):
+        """Requests a URL and returns the decoded JSON response, or None if it is empty
+
+        Keyword arguments:
+        url -- the address to request
+        params -- query string parameters to add to the address
+        """
+        def request():
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            if response.status_code == 204:
+                return None
+            return response.json()
+        return self.call(request)
+
+    def stream(self, url: str, params: dict = None) -> 'requests.Response':
+        """Requests a URL and returns the response before its body has been read
+
+        The body can then be read in chunks with iter_content. The response should
+        be closed, or used in a with statement, so its connection is released.
+        The time recorded for the request is the time until the headers arrived.
+
+        Keyword arguments:
+        url -- the address to request
+        params -- query string parameters to add to the address
+        """
+        import requests
+        def request():
+            response = self.session.get(url, params=params, timeout=self.timeout, stream=True)
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                response.close()
+                raise
+            return response
+        return self.call(request)
+
+    def close(self) -> None:
+        """Closes the connections held by the session, if any request has been made"""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
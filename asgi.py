@@ -0,0 +1,168 @@
+"""
+This module serves the application through ASGI so that it can be run by an
+asynchronous server such as uvicorn instead of Flask's development server:
+
+    uvicorn asgi:application
+
+Pages streaming events from /events are served by the event loop itself, so an open
+page does not hold a thread. Every other route is run by the Flask app on a bounded
+pool of threads, so a slow request never blocks the event loop or the other pages.
+"""
+
+
+import asyncio
+import io
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import main
+
+WORKERS = 16 #threads the Flask routes are run on
+
+
+def build_environ(scope: dict, body: bytes) -> dict:
+    """Converts an ASGI http scope and request body into a WSGI environ
+
+    Keyword arguments:
+    scope -- the ASGI connection scope
+    body -- the whole request body
+    """
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False}
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = 'HTTP_' + name
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+class AsgiApp:
+    """Serves a Flask application and the events of an event broker through ASGI
+
+    Keyword arguments:
+    wsgi_app -- the Flask application serving every route except /events
+    broker -- the broker whose events are streamed from /events
+    snapshot -- function returning the state sent to a page when it connects
+    workers -- number of threads the Flask application is run on
+    heartbeat -- seconds without events before a keep-alive comment is sent
+    startup -- function called when the server starts
+    shutdown -- function called when the server stops
+    """
+
+    def __init__(self, wsgi_app, broker, snapshot, workers: int = WORKERS, heartbeat: float = 15,
+                 startup=None, shutdown=None):
+        self.wsgi_app = wsgi_app
+        self.broker = broker
+        self.snapshot = snapshot
+        self.heartbeat = heartbeat
+        self.startup = startup
+        self.shutdown = shutdown
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='asgi')
+
+    async def __call__(self, scope: dict, receive, send) -> None:
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] != 'http':
+            raise ValueError('unsupported connection type ' + scope['type'])
+        elif scope['path'] == '/events' and scope['method'] == 'GET':
+            await self.stream_events(receive, send)
+        else:
+            await self.call_wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send) -> None:
+        """Starts and stops the background tasks along with the server"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.startup is not None:
+                    self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.broker.close()
+                if self.shutdown is not None:
+                    self.shutdown()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def stream_events(self, receive, send) -> None:
+        """Streams events to a page on the event loop until the page disconnects"""
+        subscription = self.broker.subscribe(self.snapshot, loop=asyncio.get_running_loop())
+        async def wait_for_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+        watcher = asyncio.ensure_future(wait_for_disconnect())
+        watcher.add_done_callback(lambda watcher: subscription.end()) #ends the stream as soon as the page leaves
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]})
+        try:
+            async for message in subscription.messages(self.heartbeat):
+                await send({'type': 'http.response.body', 'body': message, 'more_body': True})
+            if not watcher.done(): #the stream was ended by the broker, not by the page
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            watcher.cancel()
+
+    async def call_wsgi(self, scope: dict, receive, send) -> None:
+        """Runs a request through the Flask application on the thread pool"""
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        environ = build_environ(scope, bytes(body))
+        status, headers, content = await asyncio.get_running_loop().run_in_executor(self.executor, self.run_wsgi, environ)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': content})
+
+    def run_wsgi(self, environ: dict) -> tuple:
+        """Calls the Flask application and returns its status, headers and body"""
+        response = {}
+        written = []
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+            return written.append
+        try:
+            result = self.wsgi_app(environ, start_response)
+            try:
+                content = b''.join(written) + b''.join(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        except Exception:
+            logging.exception('request to %s failed', environ['PATH_INFO'])
+            return 500, [(b'content-type', b'text/plain')], b'Internal Server Error'
+        return response['status'], response['headers'], content
+
+
+application = AsgiApp(main.app, main.events, main.page_state,
+                      startup=main.start_background_tasks, shutdown=main.stop_background_tasks)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(application, host='127.0.0.1', port=5000)
@@ -0,0 +1,670 @@
+"""
+This module is used to measure the performance of the alarm clock's subsystems.
+Run it directly to print the results of every benchmark.
+"""
+
+import builtins
+import http.client
+import json
+import multiprocessing
+import os
+import selectors
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import urllib.parse
+import threading
+import time
+from concurrent.futures import wait
+from datetime import datetime
+
+from alarm_engine import AlarmEngine
+from alarm_store import AlarmRegistry
+from config import Config
+from speech import Pyttsx3Backend
+from speech import SpeechPipeline
+from speech import SpeechQueue
+from speech import NullBackend
+from storage import AlarmStorage
+from news_filter import NewsMatcher
+from news_filter import find_article
+from news_filter import iter_articles
+from werkzeug.serving import make_server
+from briefing import fetch_briefing
+from functools import partial
+from metrics import Registry
+from recurrence import compile_rule
+from recurrence import parse_rule
+from recurrence import zone
+import logging
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Returns the value at the given fraction of a list of numbers
+
+    Keyword arguments:
+    values -- the measured values
+    fraction -- position between 0 and 1 of the value to return
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def report(name: str, values: list, unit: str = 'ms', scale: float = 1000) -> None:
+    """Prints the median, 99th percentile and maximum of a list of measurements"""
+    print('%-40s median %8.3f%s  p99 %8.3f%s  max %8.3f%s' % (name,
+        percentile(values, 0.5) * scale, unit,
+        percentile(values, 0.99) * scale, unit,
+        max(values) * scale, unit))
+
+def benchmark_alarm_engine(pending: int = 100000, samples: int = 200) -> None:
+    """Measures how late alarms fire while many other alarms are pending
+
+    Keyword arguments:
+    pending -- number of alarms waiting in the engine far in the future
+    samples -- number of alarms whose firing latency is recorded
+    """
+    engine = AlarmEngine()
+    far_future = time.time() + 86400
+    start = time.perf_counter()
+    events = [engine.enterabs(far_future + i, 1, print) for i in range(pending)]
+    insert_time = (time.perf_counter() - start) / pending
+    engine.start()
+    latencies = []
+    fired = threading.Event()
+    def record(due: float) -> None:
+        latencies.append(time.time() - due)
+        fired.set()
+    for i in range(samples):
+        fired.clear()
+        due = time.time() + 0.002
+        engine.enterabs(due, 1, record, (due,))
+        fired.wait(1)
+    start = time.perf_counter()
+    for event in events[:pending // 2]:
+        engine.cancel(event)
+    cancel_time = (time.perf_counter() - start) / (pending // 2)
+    engine.stop()
+    print('alarm engine with %d pending alarms' % pending)
+    print('%-40s %8.3fus' % ('insert', insert_time * 1e6))
+    print('%-40s %8.3fus' % ('cancel', cancel_time * 1e6))
+    report('firing latency', latencies)
+
+def benchmark_alarm_registry(sizes: tuple = (10, 100, 1000, 10000, 100000), samples: int = 500) -> None:
+    """Measures the latency of the form requests that set and delete an alarm as the number of alarms grows
+
+    Each sample is two requests through the Flask app, as the page sends them:
+    one setting an alarm for today and one deleting it again. The alarms already
+    set are for tomorrow, so they wait in the registry rather than the engine.
+
+    Keyword arguments:
+    sizes -- numbers of alarms already set when the requests are measured
+    samples -- number of alarms set and deleted for each size
+    """
+    import main
+    directory = tempfile.mkdtemp()
+    main.storage = AlarmStorage(os.path.join(directory, 'alarms.db'))
+    client = main.app.test_client()
+    headers = {'X-Requested-With': 'fetch'} #answered with no page, as when the page sends the form itself
+    today = main.current_time()
+    tomorrow = datetime.fromtimestamp(time.time() + 86400, main.TIMEZONE).strftime('%Y-%m-%d')
+    print('set and delete alarm request latency')
+    for size in sizes:
+        main.s = AlarmEngine()
+        main.alarms = AlarmRegistry()
+        main.alarms.add_many({'title': 'alarm %d' % i, 'content': '', 'date': tomorrow, 'time': '07:00',
+                              'news': False, 'weather': False, 'location': None, 'schedule': None} for i in range(size))
+        latencies = []
+        for i in range(samples):
+            title = 'new alarm %d' % i
+            start = time.perf_counter()
+            client.get('/index', query_string={'alarm': today + 'T23:59', 'two': title}, headers=headers)
+            client.get('/index', query_string={'alarm_item': title}, headers=headers)
+            latencies.append(time.perf_counter() - start)
+        assert len(main.alarms) == size
+        report('%d alarms' % size, latencies, 'us', 1e6)
+    main.storage.close()
+    shutil.rmtree(directory, ignore_errors=True)
+
+def benchmark_config(alarms: int = 10000) -> None:
+    """Compares reading config.json on every lookup with the loaded Config
+
+    Each alarm looks up the settings three times, once for each of the news
+    request, the weather request and the weather notification.
+
+    Keyword arguments:
+    alarms -- number of alarms whose config lookups are measured
+    """
+    opened = []
+    real_open = builtins.open
+    def counting_open(*args, **kwargs):
+        opened.append(args[0])
+        return real_open(*args, **kwargs)
+    def reread():
+        with open('config.json', 'r') as f:
+            return json.load(f)
+    config = Config('config.json')
+    print('config lookups for %d alarms' % alarms)
+    for name, lookup in (('reading config.json', reread), ('loaded Config', lambda: config)):
+        opened.clear()
+        builtins.open = counting_open
+        try:
+            start = time.perf_counter()
+            for i in range(alarms * 3):
+                lookup()["API-keys"]["news"]
+            elapsed = time.perf_counter() - start
+        finally:
+            builtins.open = real_open
+        print('%-40s %8.3fus per alarm  %6.2f files opened per alarm' % (name, elapsed / alarms * 1e6, len(opened) / alarms))
+
+def benchmark_speech(backend=None, samples: int = 5) -> None:
+    """Measures the time from an alarm going off to the start of its first audio
+
+    The first measurement synthesises the announcement when the alarm goes off,
+    the second plays audio that was rendered before the alarm was due. Audio is
+    not actually played; the time is taken when playback would begin.
+
+    Keyword arguments:
+    backend -- text to speech backend to measure, pyttsx3 is used if not given
+    samples -- number of alarms measured for each case
+    """
+    backend = backend or Pyttsx3Backend()
+    started = []
+    class FirstAudio:
+        def render(self, text, path):
+            backend.render(text, path)
+        def play(self, path, text):
+            started.append(time.perf_counter())
+    announcements = ['alarm wake up has gone off', 'covid report is New cases today 547']
+    print('fire to first audio')
+    try:
+        for name, prepared in (('synthesised at fire time', False), ('rendered ahead of time', True)):
+            latencies = []
+            for i in range(samples):
+                texts = [text + ' %d' % i for text in announcements]
+                with tempfile.TemporaryDirectory() as directory:
+                    pipeline = SpeechPipeline(FirstAudio(), cache_dir=directory)
+                    if prepared:
+                        pipeline.prerender(texts)
+                    started.clear()
+                    start = time.perf_counter()
+                    pipeline.speak(texts)
+                    latencies.append(started[0] - start)
+            report(name, latencies)
+    except RuntimeError as error:
+        print('text to speech engine is not available: %s' % error)
+
+def benchmark_recovery(counts: tuple = (1000, 10000, 100000, 300000)) -> None:
+    """Measures how long it takes to restore saved alarms into the alarm registry
+
+    Keyword arguments:
+    counts -- numbers of saved alarms to restore
+    """
+    print('alarm recovery')
+    for count in counts:
+        with tempfile.TemporaryDirectory() as directory:
+            storage = AlarmStorage(os.path.join(directory, 'alarms.db'), batch_size=10000)
+            start = time.perf_counter()
+            storage.save_alarms({'title': 'alarm %d' % i, 'content': '', 'date': '2020-12-%02d' % (i % 28 + 1),
+                                 'time': '07:00', 'news': True, 'weather': False} for i in range(count))
+            storage.flush()
+            saved = time.perf_counter() - start
+            start = time.perf_counter()
+            registry = AlarmRegistry()
+            for alarm in storage.load_alarms():
+                alarm['schedule'] = None
+                registry.add(alarm)
+            restored = time.perf_counter() - start
+            storage.close()
+        print('%-40s saved in %8.3fs  restored in %8.3fs' % ('%d alarms' % count, saved, restored))
+
+def synthetic_news(articles: int, match_at: int) -> bytes:
+    """Builds a news API response by repeating the articles in news_test.json
+
+    Keyword arguments:
+    articles -- number of articles in the response
+    match_at -- position of the only relevant article, or None for no relevant article
+    """
+    with open('news_test.json', 'r') as f:
+        sample = [article for article in json.load(f)['articles']
+                  if 'Covid' not in article['title'] and article['source']['name'] != 'BBC News']
+    payload = [dict(sample[i % len(sample)], title='Article %d' % i) for i in range(articles)]
+    if match_at is not None:
+        payload[match_at] = dict(payload[match_at], title='Covid update %d' % match_at)
+    return json.dumps({'status': 'ok', 'totalResults': articles, 'articles': payload}).encode()
+
+def benchmark_news_filter(articles: int = 100000, chunk_size: int = 8192) -> None:
+    """Compares parsing a whole news response with streaming it until a match is found
+
+    Keyword arguments:
+    articles -- number of articles in the synthetic response
+    chunk_size -- bytes in each chunk of the streamed response
+    """
+    matcher = NewsMatcher()
+    print('news filter with %d articles' % articles)
+    for match_at in (10, articles // 2, None):
+        raw = synthetic_news(articles, match_at)
+        chunks = [raw[i:i + chunk_size] for i in range(0, len(raw), chunk_size)]
+        start = time.perf_counter()
+        find_article(json.loads(raw)['articles'], matcher)
+        whole = time.perf_counter() - start
+        start = time.perf_counter()
+        find_article(iter_articles(chunks), matcher)
+        streamed = time.perf_counter() - start
+        print('%-40s whole %8.3fms  streamed %8.3fms' % ('match at %s' % match_at, whole * 1000, streamed * 1000))
+
+
+def benchmark_alarm_api(count: int = 2000, batch_size: int = 1000) -> None:
+    """Compares creating alarms one request at a time with the JSON API's batches
+
+    Keyword arguments:
+    count -- number of alarms created each way
+    batch_size -- number of alarms sent in each JSON API request
+    """
+    import main
+    saved_storage = main.storage
+    directory = tempfile.mkdtemp()
+    main.storage = AlarmStorage(os.path.join(directory, 'alarms.db'), batch_size=10000)
+    client = main.app.test_client()
+    date = main.current_time()
+    print('alarm creation (%d alarms)' % count)
+    paths = (('form, page rendered', {}), ('form, sent by the page', {'X-Requested-With': 'fetch'}))
+    for name, headers in paths:
+        start = time.perf_counter()
+        for i in range(count):
+            client.get('/index?alarm=%sT23:59&two=form%%20%d&news=news' % (date, i), headers=headers)
+        elapsed = time.perf_counter() - start
+        print('%-40s %8.0f alarms/s' % (name, count / elapsed))
+        client.delete('/api/alarms', json={'titles': ['form %d' % i for i in range(count)]})
+    batch = [{'title': 'api %d' % i, 'date': date, 'time': '23:59', 'news': True} for i in range(count)]
+    start = time.perf_counter()
+    for i in range(0, count, batch_size):
+        client.post('/api/alarms', json=batch[i:i + batch_size])
+    elapsed = time.perf_counter() - start
+    print('%-40s %8.0f alarms/s' % ('JSON API, %d per request' % batch_size, count / elapsed))
+    start = time.perf_counter()
+    pages = 0
+    url = '/api/alarms?per_page=1000'
+    while url:
+        url = client.get(url).get_json()['next']
+        pages += 1
+    print('%-40s %8.3fms' % ('listed in %d pages' % pages, (time.perf_counter() - start) * 1000))
+    start = time.perf_counter()
+    client.delete('/api/alarms', json={'titles': [alarm['title'] for alarm in batch]})
+    print('%-40s %8.3fms' % ('deleted in one request', (time.perf_counter() - start) * 1000))
+    main.storage.close()
+    main.storage = saved_storage
+
+def benchmark_weather(alarms: int = 10000, cities: int = 500, latency: float = 0.01) -> None:
+    """Compares fetching the weather for every alarm with fetching it once for each location
+
+    The weather API is stood in for by a local server that takes the given latency
+    to answer each request.
+
+    Keyword arguments:
+    alarms -- number of alarms wanting a weather briefing in the same window
+    cities -- number of locations the alarms are spread across
+    latency -- seconds the stand-in API takes to answer
+    """
+    import main
+    from tests.support import start_stub_server
+    with open('weather_test.json', 'r') as f:
+        weather = json.load(f)
+    requested = []
+    def route(handler):
+        time.sleep(latency)
+        requested.append(urllib.parse.parse_qs(urllib.parse.urlsplit(handler.path).query)['q'][0])
+        return 200, json.dumps(weather).encode()
+    server = start_stub_server({'/weather': route})
+    saved_url = main.WEATHER_URL
+    main.WEATHER_URL = 'http://127.0.0.1:%d/weather' % server.server_address[1]
+    locations = ['city %d' % (i % cities) for i in range(alarms)]
+    print('weather for %d alarms in %d locations' % (alarms, cities))
+    start = time.perf_counter()
+    fetch_briefing({i: partial(main.weather_api_request, city) for i, city in enumerate(locations)}, timeout=600, pool=main.weather_pool)
+    elapsed = time.perf_counter() - start
+    print('%-40s %8.3fs  %6d requests' % ('fetched for every alarm', elapsed, len(requested)))
+    requested.clear()
+    start = time.perf_counter()
+    wait(main.fetch_weather_batch(locations).values())
+    fetched = time.perf_counter() - start
+    for city in locations: #every alarm's notification is then made from the cache
+        main.check_weather_api(city)
+    elapsed = time.perf_counter() - start
+    print('%-40s %8.3fs  %6d requests  (%.3fs fetching)' % ('fetched once for each location', elapsed, len(requested), fetched))
+    main.WEATHER_URL = saved_url
+    main.weather_cache.invalidate()
+    server.shutdown()
+    numbers = [(i * 7919 % 100000) / 1000 - 50 for i in range(100000)]
+    def split_rounding(number):
+        number_value = str(number).split('.')
+        return int(number_value[0]) + 1 if int(number_value[1][0]) > 4 else int(number_value[0])
+    for name, rounding in (('rounding by splitting strings', split_rounding), ('rounding numerically', main.round_to_integer)):
+        start = time.perf_counter()
+        for number in numbers:
+            rounding(number)
+        print('%-40s %8.3fus per temperature' % (name, (time.perf_counter() - start) / len(numbers) * 1e6))
+
+def raise_file_limit(files: int) -> None:
+    """Allows the process to open enough sockets for the push benchmark where the system supports it"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < files:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (files if hard == resource.RLIM_INFINITY else min(files, hard), hard))
+
+def benchmark_push(clients: int = 1000, samples: int = 50) -> None:
+    """Measures how long events take to reach every page connected to the server
+
+    The application is served by one process with a thread for each connection,
+    the same as when it is run directly. The time taken to render the whole page,
+    which every change used to cost every page, is measured for comparison.
+
+    Keyword arguments:
+    clients -- number of pages connected to /events at the same time
+    samples -- number of events published
+    """
+    import main
+    raise_file_limit(2 * clients + 256)
+    server = make_server('127.0.0.1', 0, main.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    address = server.server_address
+    selector = selectors.DefaultSelector()
+    start = time.perf_counter()
+    for i in range(clients):
+        connection = socket.create_connection(address)
+        connection.sendall(b'GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        received = b''
+        while b'event: snapshot' not in received:
+            received += connection.recv(65536)
+        connection.setblocking(False)
+        selector.register(connection, selectors.EVENT_READ, [b''])
+    connected = time.perf_counter() - start
+    print('server push with %d connected pages (connected in %.3fs)' % (len(main.events), connected))
+    latencies = []
+    publishing = []
+    for sample in range(samples):
+        marker = ('"title": "push %d"' % sample).encode('utf-8')
+        waiting = clients
+        start = time.perf_counter()
+        main.events.publish('notification_added', {'title': 'push %d' % sample, 'content': ''})
+        publishing.append(time.perf_counter() - start)
+        while waiting:
+            for key, mask in selector.select():
+                received = key.data[0] + key.fileobj.recv(65536)
+                if marker in received:
+                    latencies.append(time.perf_counter() - start)
+                    received = received[received.index(marker):]
+                    waiting -= 1
+                key.data[0] = received[-len(marker):]
+    report('event delivered to each page', latencies)
+    report('event published to every page', publishing)
+    client = main.app.test_client()
+    renders = []
+    for sample in range(samples):
+        start = time.perf_counter()
+        client.get('/')
+        renders.append(time.perf_counter() - start)
+    report('whole page rendered once', renders)
+    print('%-40s %8.3fs' % ('whole page rendered for every page', percentile(renders, 0.5) * clients))
+    main.events.close()
+    for key in list(selector.get_map().values()):
+        selector.unregister(key.fileobj)
+        key.fileobj.close()
+    server.shutdown()
+
+def serve_for_benchmark(mode: str, port: int, alarms_per_second: float, duration: float) -> None:
+    """Serves the application with alarms going off while the serving benchmark runs
+
+    The briefings are served from primed caches and spoken by a silent backend, so
+    alarms do the same work as usual without reaching the APIs or the speakers.
+
+    Keyword arguments:
+    mode -- 'wsgi' for the threaded development server or 'asgi' for uvicorn
+    port -- port the application is served on
+    alarms_per_second -- how often an alarm goes off
+    duration -- seconds over which the alarms go off
+    """
+    import main
+    directory = tempfile.mkdtemp()
+    main.storage = AlarmStorage(os.path.join(directory, 'alarms.db'))
+    main.speech = SpeechPipeline(NullBackend(), os.path.join(directory, 'tts_cache'))
+    main.speech_queue = SpeechQueue(main.speech)
+    main.covid_cache.get('covid', lambda: {'date': '2020-12-04', 'new_cases': 16298, 'new_cases_yesterday': 14879,
+        'cum_cases': 1690432, 'new_deaths_yesterday': 414, 'cum_deaths_yesterday': 61014,
+        'cases_change': 1419, 'seven_day_average': 15120.0, 'threshold_level': 'Red - Not safe'})
+    main.news_cache.get('news', lambda: {'title': 'Benchmark news', 'content': 'Nothing has happened'})
+    with open('weather_test.json', 'r') as f:
+        weather = json.load(f)
+    main.weather_cache.get(main.config["location"], lambda: weather)
+    count = int(alarms_per_second * duration)
+    for i in range(count):
+        alarm = {'title': 'serving %d' % i, 'content': '', 'date': main.current_time(), 'time': '00:00',
+                 'news': True, 'weather': True, 'schedule': None}
+        main.alarms.add(alarm)
+        main.alarms.set_schedule(alarm, main.s.enter(1 + i / alarms_per_second, 1, main.read_announcment, (alarm,)))
+    main.speech_queue.start()
+    main.s.start()
+    if mode == 'asgi':
+        import uvicorn
+        from asgi import AsgiApp
+        uvicorn.run(AsgiApp(main.app, main.events, main.page_state), host='127.0.0.1', port=port, log_level='warning')
+    else:
+        make_server('127.0.0.1', port, main.app, threaded=True).serve_forever()
+
+def benchmark_serving(duration: float = 10, clients: int = 32, pages: int = 200, alarms_per_second: float = 10) -> None:
+    """Measures requests per second and latency while alarms are going off
+
+    The threaded development server and the ASGI mode are run in turn in their own
+    process, with pages connected to /events and clients requesting the page and
+    the JSON API as fast as they can.
+
+    Keyword arguments:
+    duration -- seconds each server is measured for
+    clients -- number of clients making requests at the same time
+    pages -- number of pages connected to /events
+    alarms_per_second -- how often an alarm goes off
+    """
+    print('serving (%d clients, %d open pages, %g alarms/s)' % (clients, pages, alarms_per_second))
+    raise_file_limit(2 * pages + 256)
+    for mode in ('wsgi', 'asgi'):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        server = multiprocessing.Process(target=serve_for_benchmark, args=(mode, port, alarms_per_second, duration + 5), daemon=True)
+        server.start()
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port)).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        connections = []
+        for i in range(pages):
+            connection = socket.create_connection(('127.0.0.1', port))
+            connection.sendall(b'GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            connections.append(connection)
+        latencies = []
+        errors = []
+        stop = time.monotonic() + duration
+        def client(number):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            paths = ('/', '/api/alarms?per_page=20')
+            while time.monotonic() < stop:
+                start = time.perf_counter()
+                try:
+                    connection.request('GET', paths[len(latencies) % 2])
+                    connection.getresponse().read()
+                except (OSError, http.client.HTTPException):
+                    errors.append(number)
+                    connection.close()
+                    continue
+                latencies.append(time.perf_counter() - start)
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for connection in connections:
+            connection.close()
+        server.terminate()
+        server.join()
+        print('%-40s %8.0f requests/s  %d errors' % (mode, len(latencies) / duration, len(errors)))
+        report(mode + ' latency', latencies)
+
+def benchmark_cluster(alarms: int = 2000, processes: tuple = (1, 2, 4), work: float = 0.005) -> None:
+    """Measures how fast alarms sharing a database are fired as processes are added
+
+    Each alarm takes work seconds to fire, standing in for the announcement.
+    """
+    from tests.support import run_cluster
+    titles = ['alarm %d' % i for i in range(alarms)]
+    for count in processes:
+        fired, elapsed = run_cluster(count, titles, work=work, timeout=120)
+        duplicates = len(fired) - len({title for title, owner in fired})
+        print('%-40s %8.0f alarms/s  %d fired twice' % ('%d processes' % count, alarms / elapsed, duplicates))
+
+def benchmark_metrics(calls: int = 200000) -> None:
+    """Measures the cost of recording measurements and of log calls that are disabled"""
+    metrics = Registry()
+    histogram = metrics.histogram('benchmark_seconds', 'benchmark', ('source',))
+    start = time.perf_counter()
+    for i in range(calls):
+        histogram.observe(i / calls, ('news',))
+    print('%-40s %8.0f ns' % ('histogram observe', (time.perf_counter() - start) / calls * 1e9))
+    start = time.perf_counter()
+    for i in range(calls // 10):
+        with histogram.time(('news',)):
+            pass
+    print('%-40s %8.0f ns' % ('histogram timer', (time.perf_counter() - start) / (calls // 10) * 1e9))
+    for source in range(100):
+        for i in range(100):
+            histogram.observe(i / 100, (str(source),))
+    start = time.perf_counter()
+    text = metrics.render()
+    print('%-40s %8.3f ms  %d lines' % ('render 100 histograms', (time.perf_counter() - start) * 1000, text.count('\n')))
+    logger = logging.getLogger('benchmark')
+    logger.setLevel(logging.INFO)
+    alarm = {'title': 'benchmark', 'content': str(['2020-12-04', '07:00']), 'date': '2020-12-04', 'time': '07:00',
+             'news': True, 'weather': True, 'location': None, 'schedule': None}
+    start = time.perf_counter()
+    for i in range(calls):
+        logger.debug('alarm value is: ' + str(alarm))
+    print('%-40s %8.0f ns' % ('disabled debug log, concatenated', (time.perf_counter() - start) / calls * 1e9))
+    start = time.perf_counter()
+    for i in range(calls):
+        logger.debug('alarm value is: %s', alarm)
+    print('%-40s %8.0f ns' % ('disabled debug log, lazy', (time.perf_counter() - start) / calls * 1e9))
+
+def benchmark_recurrence(rules: int = 100000) -> None:
+    """Measures finding the next occurrence of many recurring alarms
+
+    Keyword arguments:
+    rules -- number of recurring alarms, each with its own time of day
+    """
+    recurrences = ('daily', 'weekdays', 'weekends', '*/15 9-17 * * mon-fri', '0 7 1 * *', '30 6 * * 1-5')
+    tz = zone('Europe/London')
+    texts = [(recurrences[i % len(recurrences)], '%02d:%02d' % (i // 60 % 24, i % 60)) for i in range(rules)]
+    start = time.perf_counter()
+    parsed = [parse_rule(text, at) for text, at in texts]
+    print('%-40s %8.3f ms  %d distinct rules' % ('parse %d recurrences' % rules, (time.perf_counter() - start) * 1000,
+                                                 compile_rule.cache_info().currsize))
+    now = time.time()
+    start = time.perf_counter()
+    for rule in parsed:
+        rule.next_after(now, tz)
+    elapsed = time.perf_counter() - start
+    print('%-40s %8.3f ms  %6.2f us each' % ('next occurrence of %d rules' % rules, elapsed * 1000, elapsed / rules * 1e6))
+    spring = datetime(2021, 3, 27, 12, tzinfo=tz).timestamp()
+    start = time.perf_counter()
+    for rule in parsed:
+        rule.next_after(spring, tz)
+    elapsed = time.perf_counter() - start
+    print('%-40s %8.3f ms  %6.2f us each' % ('across the clocks going forward', elapsed * 1000, elapsed / rules * 1e6))
+
+STARTUP_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import main
+imported = time.perf_counter() - start
+print(imported, ','.join(name for name in ('requests', 'numpy', 'pyttsx3', 'uk_covid19') if name in sys.modules), flush=True)
+main.NEWS_URL, main.WEATHER_URL, main.COVID_URL = sys.argv[3:6]
+main.start_background_tasks()
+from werkzeug.serving import make_server
+make_server('127.0.0.1', int(sys.argv[2]), main.app, threaded=True).serve_forever()
+'''
+
+def benchmark_startup(root: str = None, runs: int = 5) -> None:
+    """Measures how long the program takes to import main and to answer its first request
+
+    Each run starts a new Python process in an empty folder, as python main.py would,
+    with the APIs answered by a local stub server. The time to the first request is
+    from starting the process until the page has been served.
+
+    Keyword arguments:
+    root -- folder of the version of the program to measure, such as an older
+            checkout to compare with, this folder if None
+    runs -- number of processes started, the fastest is reported
+    """
+    from tests.support import api_routes
+    from tests.support import start_stub_server
+    root = os.path.abspath(root or os.path.dirname(os.path.abspath(__file__)))
+    stub = start_stub_server(api_routes())
+    url = 'http://127.0.0.1:%d/' % stub.server_address[1]
+    imports = []
+    first_requests = []
+    for run in range(runs):
+        with tempfile.TemporaryDirectory() as directory, socket.socket() as probe:
+            shutil.copy(os.path.join(root, 'config.json'), directory)
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+            probe.close()
+            start = time.perf_counter()
+            process = subprocess.Popen([sys.executable, '-c', STARTUP_SCRIPT, root, str(port), url + 'news', url + 'weather', url + 'covid'],
+                                       cwd=directory, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            try:
+                while True:
+                    try:
+                        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                        connection.request('GET', '/')
+                        response = connection.getresponse()
+                        response.read()
+                        connection.close()
+                        if response.status == 200:
+                            break
+                    except OSError:
+                        time.sleep(0.002)
+                first_requests.append(time.perf_counter() - start)
+                imported, heavy = process.stdout.readline().split(' ')
+                imports.append(float(imported))
+            finally:
+                process.terminate()
+                process.wait()
+    stub.shutdown()
+    stub.server_close()
+    print('startup of %s' % root)
+    print('%-40s %8.1f ms  slow modules imported: %s' % ('import main', min(imports) * 1000, heavy.strip() or 'none'))
+    print('%-40s %8.1f ms' % ('process start to first request', min(first_requests) * 1000))
+
+if __name__ == '__main__':
+    benchmark_alarm_engine()
+    benchmark_alarm_registry()
+    benchmark_config()
+    benchmark_speech()
+    benchmark_recovery()
+    benchmark_news_filter()
+    benchmark_alarm_api()
+    benchmark_weather()
+    benchmark_push()
+    benchmark_serving()
+    benchmark_cluster()
+    benchmark_metrics()
+    benchmark_recurrence()
+    benchmark_startup(sys.argv[1] if len(sys.argv) > 1 else None) #an older checkout to compare with can be given
@@ -0,0 +1,44 @@
+"""
+This module fetches the information read out in an alarm's briefing. Every source
+is fetched at the same time so the briefing is ready as soon as the slowest source
+has answered, and a single timeout bounds how long the alarm waits.
+"""
+
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+import time
+
+BRIEFING_TIMEOUT = 10
+executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='briefing')
+
+
+def fetch_briefing(sources: dict, timeout: float = BRIEFING_TIMEOUT, pool: ThreadPoolExecutor = None) -> dict:
+    """Runs every source at once and returns their results by name
+
+    A source that raises an error or has not answered when the timeout expires
+    is given the value None, so one slow or broken API never holds up the rest.
+
+    Keyword arguments:
+    sources -- functions taking no arguments, keyed by the name of the source
+    timeout -- seconds to wait for all sources together
+    pool -- threads the sources are run on, the briefing threads if not given
+    """
+    start = time.monotonic()
+    pool = pool or executor
+    futures = {name: pool.submit(fetch) for name, fetch in sources.items()}
+    wait(futures.values(), timeout=timeout)
+    results = {}
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            logging.warning('%s briefing timed out after %s seconds', name, timeout)
+            results[name] = None
+        elif future.exception() is not None:
+            logging.warning('%s briefing failed: %r', name, future.exception())
+            results[name] = None
+        else:
+            results[name] = future.result()
+    logging.info('briefing fetched in %.3f seconds', time.monotonic() - start)
+    return results
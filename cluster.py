@@ -0,0 +1,191 @@
+"""
+This module lets several processes serve the same alarms. The processes share the
+SQLite database the alarms are saved in and take a lease on an alarm before firing
+it, so every alarm goes off exactly once whichever process it was set in. Each
+process records a heartbeat, and alarms are partitioned between the live processes
+so the work of firing them is spread out. An alarm whose process has stopped is
+taken over by another process after a short delay.
+"""
+
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+import zlib
+from storage import connect
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS members (
+    owner TEXT PRIMARY KEY,
+    seen REAL NOT NULL
+);
+'''
+
+#a lease can be taken if nobody holds it, if it has expired or if this process already holds it
+ACQUIRE = '''
+INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?)
+ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires
+WHERE leases.done = 0 AND (leases.expires <= ? OR leases.owner = excluded.owner)
+'''
+
+FIRE = 'fire'
+WAIT = 'wait'
+DONE = 'done'
+
+
+def member_name() -> str:
+    """Returns a name for this process that is unique across every machine in the cluster"""
+    return '%s-%d-%s' % (socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+
+
+class Cluster:
+    """Coordinates the processes that share an alarm database
+
+    Keyword arguments:
+    path -- location of the database shared by the processes
+    owner -- name of this process, generated if not given
+    lease_time -- seconds a lease is held before another process may take it
+    member_timeout -- seconds without a heartbeat before a process is treated as stopped
+    timefunc -- function returning the current time in seconds since the epoch
+    """
+
+    def __init__(self, path: str, owner: str = None, lease_time: float = 30, member_timeout: float = 10, timefunc=time.time):
+        self.path = path
+        self.owner = owner or member_name()
+        self.lease_time = lease_time
+        self.member_timeout = member_timeout
+        self.timefunc = timefunc
+        self.acquired = 0
+        self.taken_over = 0
+        self._members = [self.owner]
+        self._local = threading.local()
+        self._heartbeat = None
+        self._stop = threading.Event()
+        self.connection.executescript(SCHEMA)
+
+    @property
+    def connection(self):
+        """The calling thread's connection to the database"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = connect(self.path)
+        return connection
+
+    def heartbeat(self) -> list:
+        """Records that this process is alive and returns the names of the live processes"""
+        now = self.timefunc()
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO members VALUES (?, ?)', (self.owner, now))
+            rows = self.connection.execute('SELECT owner FROM members WHERE seen > ? ORDER BY owner',
+                                           (now - self.member_timeout,)).fetchall()
+        self._members = [owner for owner, in rows] or [self.owner]
+        return list(self._members)
+
+    def start(self, interval: float = 1) -> None:
+        """Starts a background thread that records a heartbeat every interval seconds
+
+        The heartbeat has its own thread so that alarms taking a long time to fire
+        never make the other processes think this one has stopped.
+        """
+        if self._heartbeat is not None:
+            return
+        self.heartbeat()
+        self._stop.clear()
+        def beat():
+            while not self._stop.wait(interval):
+                try:
+                    self.heartbeat()
+                except Exception:
+                    logging.exception('cluster heartbeat failed')
+        self._heartbeat = threading.Thread(target=beat, name='cluster-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    def leave(self) -> None:
+        """Removes this process from the live processes, so its alarms are taken over straight away"""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        with self.connection:
+            self.connection.execute('DELETE FROM members WHERE owner = ?', (self.owner,))
+            self.connection.execute('DELETE FROM leases WHERE owner = ? AND done = 0', (self.owner,))
+
+    def owner_of(self, name: str) -> str:
+        """Returns the live process that a lease is partitioned to, as of the last heartbeat"""
+        members = self._members
+        return members[zlib.crc32(name.encode('utf-8')) % len(members)]
+
+    def prefers(self, name: str) -> bool:
+        """Checks whether a lease is partitioned to this process"""
+        return self.owner_of(name) == self.owner
+
+    def acquire(self, name: str, lease_time: float = None) -> bool:
+        """Takes a lease, returns False if another process holds it or it is done
+
+        Keyword arguments:
+        name -- identifies the work the lease is for
+        lease_time -- seconds the lease is held for, the cluster's lease time if None
+        """
+        now = self.timefunc()
+        with self.connection:
+            cursor = self.connection.execute(ACQUIRE, (name, self.owner, now + (lease_time or self.lease_time), now))
+        if cursor.rowcount != 1:
+            return False
+        self.acquired += 1
+        return True
+
+    def complete(self, name: str) -> None:
+        """Marks a lease held by this process as done, so it can never be taken again"""
+        with self.connection:
+            self.connection.execute('UPDATE leases SET done = 1 WHERE name = ? AND owner = ?', (name, self.owner))
+
+    def lease(self, name: str) -> tuple:
+        """Returns the owner, expiry time and whether a lease is done, or None if nobody has taken it"""
+        row = self.connection.execute('SELECT owner, expires, done FROM leases WHERE name = ?', (name,)).fetchone()
+        return None if row is None else (row[0], row[1], bool(row[2]))
+
+    def claim(self, name: str, due: float, takeover_delay: float) -> tuple:
+        """Decides whether this process should do the work a lease is for
+
+        The process the lease is partitioned to takes it when the work is due. The
+        others wait takeover_delay seconds, then take it only if the work has not been
+        done, for example because that process has stopped.
+
+        Returns (FIRE, None) if this process has taken the lease, (DONE, None) if the
+        work has been done and (WAIT, time) if this process should ask again at time.
+
+        Keyword arguments:
+        name -- identifies the work the lease is for
+        due -- time the work is due in seconds since the epoch
+        takeover_delay -- seconds a process waits before taking over another's work
+        """
+        now = self.timefunc()
+        if not self.prefers(name) and now < due + takeover_delay:
+            return WAIT, due + takeover_delay
+        if self.acquire(name):
+            if not self.prefers(name):
+                self.taken_over += 1
+                logging.info('%s taken over from %s', name, self.owner_of(name))
+            return FIRE, None
+        lease = self.lease(name)
+        if lease is None: #the holder left between the two queries
+            return WAIT, now
+        if lease[2]:
+            return DONE, None
+        return WAIT, lease[1] #another process holds the lease and may still stop before finishing
+
+    def prune(self, age: float = 86400) -> None:
+        """Deletes leases that were done and processes that stopped more than age seconds ago"""
+        before = self.timefunc() - age
+        with self.connection:
+            self.connection.execute('DELETE FROM leases WHERE done = 1 AND expires < ?', (before,))
+            self.connection.execute('DELETE FROM members WHERE seen < ?', (before,))
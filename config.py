@@ -0,0 +1,145 @@
+"""
+This module loads the settings in config.json. The file is parsed and checked once,
+and can be watched so that any changes are applied without restarting the program.
+"""
+
+
+import json
+import logging
+import os
+import threading
+from recurrence import zone
+
+#a logger of its own, as logging through the root logger before main.py has set up the
+#log would set up a log on the console instead
+log = logging.getLogger(__name__)
+
+
+class ConfigError(ValueError):
+    """Raised when config.json is missing a setting or a setting has the wrong type"""
+
+
+def validate_config(settings: dict) -> dict:
+    """Checks that the settings contain every key the program needs
+
+    Keyword arguments:
+    settings -- the parsed contents of config.json
+    """
+    if not isinstance(settings, dict):
+        raise ConfigError('config must be a JSON object')
+    keys = settings.get("API-keys")
+    if not isinstance(keys, dict):
+        raise ConfigError('"API-keys" must be an object')
+    for name in ("news", "weather"):
+        if not isinstance(keys.get(name), str):
+            raise ConfigError('"API-keys" must contain a "%s" key' % name)
+    if not isinstance(settings.get("location"), str):
+        raise ConfigError('"location" must be a string')
+    cache_ttl = settings.get("cache-ttl", {})
+    if not isinstance(cache_ttl, dict):
+        raise ConfigError('"cache-ttl" must be an object of seconds keyed by cache')
+    for name, ttl in cache_ttl.items():
+        if not isinstance(ttl, (int, float)) or ttl < 0:
+            raise ConfigError('"cache-ttl" for %s must be a positive number' % name)
+    news_filter = settings.get("news-filter", {})
+    if not isinstance(news_filter, dict):
+        raise ConfigError('"news-filter" must be an object of keywords and sources')
+    for name, values in news_filter.items():
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            raise ConfigError('"news-filter" %s must be a list of strings' % name)
+    if settings.get("log-level", "INFO") not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"):
+        raise ConfigError('"log-level" must be one of DEBUG, INFO, WARNING, ERROR or CRITICAL')
+    try:
+        timezone = settings.get("timezone", "UTC")
+        zone(timezone if isinstance(timezone, str) else repr(timezone))
+    except ValueError:
+        raise ConfigError('"timezone" must be the name of a time zone, such as Europe/London') from None
+    cluster = settings.get("cluster", {})
+    if not isinstance(cluster, dict) or not isinstance(cluster.get("enabled", False), bool):
+        raise ConfigError('"cluster" must be an object with "enabled" set to true or false')
+    for name, seconds in cluster.items():
+        if name != "enabled" and (not isinstance(seconds, (int, float)) or seconds <= 0):
+            raise ConfigError('"cluster" %s must be a positive number of seconds' % name)
+    return settings
+
+
+class Config:
+    """The current settings from a config file
+
+    Keyword arguments:
+    path -- location of the config file
+    """
+
+    def __init__(self, path: str = 'config.json'):
+        self.path = path
+        self.loads = 0
+        self._settings = {}
+        self._mtime = None
+        self._listeners = []
+        self._watcher = None
+        self._stop = threading.Event()
+        self.load()
+
+    def load(self) -> None:
+        """Parses and validates the config file, raises ConfigError if it is invalid"""
+        self._mtime = os.stat(self.path).st_mtime_ns #an invalid file is only reported once
+        with open(self.path, 'r') as f: #acceses config.json file
+            try:
+                settings = json.load(f)
+            except ValueError as error:
+                raise ConfigError('config is not valid JSON: %s' % error)
+        self._settings = validate_config(settings)
+        self.loads += 1
+        log.info('config loaded from %s', self.path)
+        for listener in self._listeners:
+            listener(self)
+
+    def __getitem__(self, key: str):
+        return self._settings[key]
+
+    def get(self, key: str, default=None):
+        """Returns a setting, or the default if it is not set"""
+        return self._settings.get(key, default)
+
+    def add_listener(self, listener) -> None:
+        """Registers a function to be called with the config every time it is loaded"""
+        self._listeners.append(listener)
+
+    def reload_if_changed(self) -> bool:
+        """Reloads the config if the file has been modified, returns True if it was
+
+        An invalid file is logged and ignored so the last good settings stay in use.
+        """
+        try:
+            if os.stat(self.path).st_mtime_ns == self._mtime:
+                return False
+            self.load()
+            return True
+        except (OSError, ConfigError) as error:
+            log.warning('config not reloaded: %s', error)
+            return False
+
+    def watch(self, interval: float = 2) -> None:
+        """Starts a background thread that reloads the config when the file changes
+
+        Keyword arguments:
+        interval -- seconds between checks of the file's modification time
+        """
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+        def poll():
+            while not self._stop.wait(interval):
+                try:
+                    self.reload_if_changed()
+                except Exception: #such as a listener failing, the config is still watched
+                    log.exception('config reload failed')
+        self._watcher = threading.Thread(target=poll, name='config-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        """Stops the background thread started by watch"""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
@@ -0,0 +1,134 @@
+"""
+This module keeps a local copy of the Covid-19 figures for England. The figures are
+held as a memory-mapped NumPy array on disk with one row per day, and only the days
+newer than the last stored day are requested from the API. Threshold levels, seven
+day averages and day to day changes are computed over whole columns at once.
+"""
+
+
+import logging
+import os
+import threading
+import numpy as np
+
+DTYPE = np.dtype([
+    ('day', 'i4'),
+    ('newCasesByPublishDate', 'f8'),
+    ('cumCasesByPublishDate', 'f8'),
+    ('newDeathsByDeathDate', 'f8'),
+    ('cumDeathsByDeathDate', 'f8')])
+COLUMNS = DTYPE.names[1:]
+THRESHOLDS = ((15000, 'Red - Not safe'), (10000, 'Yellow - Be careful'))
+SAFE = 'Green - safe'
+
+
+def day_number(date: str) -> int:
+    """Converts a date formatted as YYYY-MM-DD into days since the epoch"""
+    return int(np.datetime64(date, 'D').astype(np.int64))
+
+def day_date(day: int) -> str:
+    """Converts days since the epoch into a date formatted as YYYY-MM-DD"""
+    return str(np.datetime64(int(day), 'D'))
+
+def threshold_levels(cases: np.ndarray) -> np.ndarray:
+    """Returns the threshold level for every value in an array of new cases"""
+    conditions = [cases > limit for limit, level in THRESHOLDS]
+    return np.select(conditions, [level for limit, level in THRESHOLDS], default=SAFE)
+
+def rolling_average(values: np.ndarray, days: int = 7) -> np.ndarray:
+    """Returns the average of each value and the values of the days before it
+
+    The first days, which do not have enough days before them, are NaN.
+    """
+    averages = np.full(len(values), np.nan)
+    if len(values) >= days:
+        totals = np.cumsum(np.insert(values, 0, 0.0))
+        averages[days - 1:] = (totals[days:] - totals[:-days]) / days
+    return averages
+
+
+class CovidStore:
+    """Daily Covid-19 figures stored in a memory-mapped file
+
+    Keyword arguments:
+    path -- location of the .npy file the figures are kept in
+    """
+
+    def __init__(self, path: str = os.path.join('covid_data', 'england.npy')):
+        self.path = path
+        self._lock = threading.Lock()
+        self.series = np.empty(0, dtype=DTYPE)
+        if os.path.exists(path):
+            self.series = np.load(path, mmap_mode='r')
+
+    def __len__(self) -> int:
+        return len(self.series)
+
+    def last_date(self) -> str:
+        """Returns the date of the newest stored day, or None if nothing is stored"""
+        return day_date(self.series['day'][-1]) if len(self.series) else None
+
+    def ingest(self, records: list) -> int:
+        """Adds days from API records to the store and returns how many were added
+
+        Records for days that are already stored replace them, so figures that
+        have been revised by the API are kept up to date.
+
+        Keyword arguments:
+        records -- dictionaries in the format returned by the Covid-19 API
+        """
+        if not records:
+            return 0
+        rows = np.empty(len(records), dtype=DTYPE)
+        rows['day'] = [day_number(record['date']) for record in records]
+        for column in COLUMNS:
+            rows[column] = [np.nan if record.get(column) is None else record[column] for record in records]
+        rows = rows[np.argsort(rows['day'], kind='stable')]
+        rows = rows[np.append(rows['day'][1:] != rows['day'][:-1], True)] #the last record for a day is kept
+        with self._lock:
+            stored = len(self.series)
+            kept = self.series[self.series['day'] < rows['day'][0]]
+            series = np.concatenate([kept, rows])
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            partial = self.path + '.part.npy'
+            np.save(partial, series)
+            self.series = series #releases the old memory map so the file can be replaced
+            os.replace(partial, self.path) #the store is never left half written
+            self.series = np.load(self.path, mmap_mode='r')
+        logging.info('%d days of Covid-19 figures stored', len(rows))
+        return len(series) - stored
+
+    def update(self, fetch) -> int:
+        """Fetches the days newer than the last stored day and adds them to the store
+
+        Keyword arguments:
+        fetch -- function taking the last stored date, or None, and returning the
+                 API records for the days after it
+        """
+        return self.ingest(fetch(self.last_date()))
+
+    def summary(self) -> dict:
+        """Returns the latest figures and the figures computed from them
+
+        The latest day's deaths by death date are usually not reported yet, so
+        deaths are given for the day before.
+        """
+        if len(self.series) < 2:
+            raise ValueError('at least two days of Covid-19 figures are needed')
+        recent = np.array(self.series[-8:]) #only the last week is read from disk
+        cases = recent['newCasesByPublishDate']
+        averages = rolling_average(cases)
+        changes = np.diff(cases)
+        levels = threshold_levels(cases)
+        today, yesterday = recent[-1], recent[-2]
+        figure = lambda row, column: int(np.nan_to_num(row[column]))
+        return {
+            'date': day_date(today['day']),
+            'new_cases': figure(today, 'newCasesByPublishDate'),
+            'new_cases_yesterday': figure(yesterday, 'newCasesByPublishDate'),
+            'cum_cases': figure(today, 'cumCasesByPublishDate'),
+            'new_deaths_yesterday': figure(yesterday, 'newDeathsByDeathDate'),
+            'cum_deaths_yesterday': figure(yesterday, 'cumDeathsByDeathDate'),
+            'cases_change': int(np.nan_to_num(changes[-1])),
+            'seven_day_average': None if np.isnan(averages[-1]) else float(averages[-1]),
+            'threshold_level': str(levels[-1])}
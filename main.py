@@ -1,429 +1,1089 @@
-"""
-This is a module that runs an interactive alarm clock that can retreive information
-about the current Covid-19 crisis and can supply updates on the news and weather. 
-The program uses an html application that can run as long a desired. The user can create
-and delete alarms as they please using this application.
-"""
-
-
-import requests
-import json
-import sched
-import time
-import pyttsx3
-from flask import Flask
-from flask import request
-from flask import render_template
-import logging
-s = sched.scheduler(time.time, time.sleep)
-app = Flask(__name__)
-logging.basicConfig(filename='pysys.log', level=logging.DEBUG)
-logging.info('Log is working')
-alarms = []
-notifications = []
-
-def minutes_to_seconds( minutes: str ) -> int:
-    """Converts minutes to seconds"""
-    return int(minutes)*60
-
-def hours_to_minutes( hours: str ) -> int:
-    """Converts hours to minutes"""
-    return int(hours)*60
-
-def hhmm_to_seconds( hhmm: str ) -> int:
-    """Converts hours and minutes into seconds"""
-    if len(hhmm.split(':')) != 2:
-        print('Incorrect format. Argument must be formatted as HH:MM')
-        return None
-    return minutes_to_seconds(hours_to_minutes(hhmm.split(':')[0])) + \
-        minutes_to_seconds(hhmm.split(':')[1])
-
-def round_to_integer(number: float) -> int:
-    """Round input to nearest whole number
-    
-    Keyword arguments:
-    number -- input number to be rounded
-    """
-    number_value = str(number).split('.')
-    decimal_value = number_value[1]
-    decimal_value = list(decimal_value)
-    if len(decimal_value) > 0:
-        if int(decimal_value[0]) > 4: 
-            number_value = int(number_value[0]) + 1
-        else:
-            number_value = int(number_value[0])
-    else:
-        number_value = int(number_value[0])
-    return number_value
-
-def news_api_request() -> dict:
-    """Makes an news API request and returns info"""
-    logging.info('pending news API request')
-    with open('config.json', 'r') as f: #acceses config.json file
-        json_file = json.load(f)
-    keys = json_file["API-keys"] #API key is extracted from config.json
-    api_key_news = keys["news"]
-    base_url = "https://newsapi.org/v2/top-headlines?"
-    country = "gb"
-    complete_url = base_url + "country=" + country + "&apiKey=" + api_key_news
-    response = requests.get(complete_url) #requests API information from url
-    news_json = response.json()
-    return news_json
-
-def format_news_notification(api_request: dict) -> dict:
-    """
-    filters and formats information retreived form an API request to return a news notification
-    
-    Keyword arguments:
-    api_request -- The information retrieved from an API request
-    """
-    notification ={}
-    articles = api_request["articles"]
-    for article in articles: #title and description of first relevant article are extracted
-        source = article["source"]
-        if "Covid" in article["title"]:
-            notification["title"] = article["title"]
-            notification["content"] = article["description"]
-            break
-        elif source["name"] == "BBC News":
-            notification["title"] = article["title"]
-            notification["content"] = article["description"]
-            break
-    logging.info('notification ' + notification['title'] + ' has been created')
-    return notification
-
-def check_news_api() -> dict:
-    '''Makes an news API request and returns a notification
-    
-    Information on the latest news is requested and is then
-    filtered so that only relevant articles are considered to be
-    added as notifications.
-    The information on the latest relevant article is returned in
-    dictionary format.
-    '''
-    information = news_api_request()
-    notification = format_news_notification(information)
-    return notification
-    
-def weather_api_request() -> dict:
-    """Makes a weather API request and returns info"""
-    logging.info('pending weather API request')
-    with open('config.json', 'r') as f: #Acceses config.json file
-        json_file = json.load(f)
-    keys = json_file["API-keys"] #API key is extracted from config.json
-    api_key_weather = keys["weather"]
-    base_url = "http://api.openweathermap.org/data/2.5/weather?"
-    city_name = json_file["location"] #Area location is extracted from config.json
-    complete_url = base_url + "appid=" + api_key_weather + "&q=" + city_name
-    response = requests.get(complete_url) #requests API information from url
-    weather_json = response.json()
-    return weather_json
-
-def format_weather_notification(api_request: dict) -> dict:
-    """
-    filters and formats information retreived form an API request to return a weather notification
-    
-    Keyword arguments:
-    api_request -- The information retrieved from an API request
-    """
-    notification ={}
-    with open('config.json', 'r') as f: #Acceses config.json file
-        json_file = json.load(f)
-    city_name = json_file["location"] #Area location is extracted from config.json
-    current_time_hhmm = str(time.gmtime().tm_hour) + ":" + str(time.gmtime().tm_min) #Current time is calculated
-    weather = api_request["weather"] #information on weather is extracted
-    weather = weather[0]
-    temperature = api_request["main"]
-    weather_description = weather["description"] #weather description extracted
-    temperature_temp = float(temperature["temp"]) - 273.15 #temperature is extracted and rounded
-    temperature_temp = round_to_integer(temperature_temp)
-    # feels like temperature is extracted and rounded
-    temperature_feels_like = float(temperature["feels_like"]) - 273.15 
-    temperature_feels_like = round_to_integer(temperature_feels_like)
-    #information is formatted into an appropriate dictionary format
-    notification["title"] = 'Weather - ' + city_name + ' - ' + current_time_hhmm
-    notification["content"] =("Weather: " + weather_description + ". Temperature: ") + (str(temperature_temp) + "°C Feels like: " + str(temperature_feels_like) + "°C")
-    logging.info('notification ' + notification['title'] + ' has been created')
-    return notification
-    
-def check_weather_api() -> dict:
-    '''Makes a weather API request and returns a notification
-    
-    Information on the current weather is requested and is then
-    filtered so that only weather description and temperature
-    are extracted. This information is then along with the 
-    current time and are name and is returned in
-    dictionary format.
-    '''
-    information = weather_api_request()
-    notification = format_weather_notification(information)
-    return notification
-
-def covid_api_request() -> dict:
-    """Makes a weather API request and returns info"""
-    logging.info('pending Covid-19 API request')
-    from uk_covid19 import Cov19API #imports API key
-    #filters are defined
-    england_only = ['areaType=nation','areaName=England']
-    cases_and_deaths = {
-    "date": "date",
-    "newCasesByPublishDate": "newCasesByPublishDate",
-    "cumCasesByPublishDate": "cumCasesByPublishDate",
-    "newDeathsByDeathDate": "newDeathsByDeathDate",
-    "cumDeathsByDeathDate": "cumDeathsByDeathDate"}
-    api = Cov19API(filters=england_only, structure=cases_and_deaths)
-    covid_data = api.get_json() #requests API information
-    return covid_data
-    
-def format_covid_notification(api_request: dict) -> dict:
-    """
-    Formats and computes information retreived form an API request to return a covid notification
-    
-    Keyword arguments:
-    api_request -- The information retrieved from an API request
-    """
-    notification = {}
-    covid_data_details = api_request["data"]
-    covid_data_details_today = covid_data_details[0] 
-    covid_data_details_yesterday = covid_data_details[1]
-    #Threshold level is calculated
-    if int(covid_data_details_today['newCasesByPublishDate']) > 10000:
-        if int(covid_data_details_today['newCasesByPublishDate']) > 15000:
-            threshold_level = 'Red - Not safe'
-        else:
-            threshold_level = 'Yellow - Be careful'
-    else:
-        threshold_level = 'Green - safe'
-    #information is formatted into an appropriate dictionary format
-    notification['title'] = "Covid-19 report - England " + covid_data_details_today['date']
-    notification['content'] = ''.join(("New cases today: ", 
-    str(covid_data_details_today["newCasesByPublishDate"]),
-    " New cases yesterday: ",
-    str(covid_data_details_yesterday["newCasesByPublishDate"]),
-    ", Total cases: ",
-    str(covid_data_details_today["cumCasesByPublishDate"]),
-    ", Yesterday's deaths: ",
-    str(covid_data_details_yesterday["newDeathsByDeathDate"]),
-    ", Total deaths: ",
-    str(covid_data_details_yesterday["cumDeathsByDeathDate"]), ' Threshold level is ',
-    threshold_level))
-    logging.info('notification ' + notification['title'] + ' has been created')
-    return notification
-
-def check_covid_api() -> dict:
-    '''Makes a covid API request and returns a notification
-    
-    Information on the current covid cases is requested and is then
-    filtered so that only relavent information is extracted.
-    This information is then computed so that a threshold level
-    can be calculated based on the number of cases. Threshold level
-    and covid cases information are then returned in
-    dictionary format.
-    '''
-    information = covid_api_request()
-    notification = format_covid_notification(information)
-    return notification
-
-
-def current_time() -> str:
-    """imports and formats the current date"""
-    current_day = str(time.gmtime().tm_mday)
-    current_month = str(time.gmtime().tm_mon)
-    current_year = str(time.gmtime().tm_year)
-    #adds "0"s where nessesary so that the date is readable by other functions
-    if len(current_day) == 1:
-        current_day = '0' + current_day
-    if current_month == 1:
-        current_month = '0' + current_month
-    print(current_month)
-    #formats the date
-    return current_year + "-" + current_month + "-" + current_day
-
-def tts_request(announcement="Text to speech example announcement!") -> None:
-    """Converts text to speech
-    
-    Keyword arguments:
-    announcement -- text that is to be converted to speech
-    """
-    engine = pyttsx3.init()
-    engine.say(announcement)
-    engine.runAndWait()
-    
-def create_announcment(alarm: dict) -> list:
-    """Creates a list of announcements to be announcement when an alarm goes off
-    
-    Information is extracted from APIs and the alarm input to construct an 
-    announcement based on the set alarm.
-    
-    Keyword arguments 
-    alarm -- the alarm from where information is extracted for the announcement
-    """
-    logging.info('alarm ' + alarm['title'] + ' is going off')
-    #information is formatted and punctionation is removed so the announcement is ready to be read
-    punctuation = '!"#$%&`()*+,-./:;'
-    news_announcment = (check_news_api())
-    news_announcment = news_announcment['title']
-    covid_announcment = check_covid_api()
-    covid_announcment = covid_announcment['content']
-    weather_announcement = check_weather_api()
-    weather_announcement = weather_announcement['content']
-    weather_announcement = weather_announcement.replace('°C', 'degrees celcius')
-    for character in punctuation:
-        news_announcment = news_announcment.replace(character, ' ')
-        covid_announcment = covid_announcment.replace(character, ' ')
-        weather_announcement = weather_announcement.replace(character, ' ')
-    #the default announcement list is defined
-    announcement_list = [('alarm ' + alarm['title'] + ' has gone off'), ('covid report is ' + covid_announcment)]
-    #Checks if user requested new breifing
-    if alarm['news'] == True:
-        announcement_list.append('lastest news is ' + news_announcment)
-    #Checks if user requested weather breifing
-    if alarm['weather'] == True:
-        announcement_list.append('weather report is ' + weather_announcement)
-    #Alarm is removed from the list of set alarms after it has gone off
-    if alarm in alarms:
-        alarms.remove(alarm)
-        logging.info('alarm ' + alarm['title'] + ' has been deleted from alarms')
-    return announcement_list
-
-
-def read_announcment(alarm: dict) -> None:
-    """ Reads the announcement created by the create_announcment function
-    
-    Keyword arguments 
-    alarm -- the alarm from where information is extracted for the announcement
-    """
-    announcement_list = create_announcment(alarm)
-    for announcement in announcement_list:
-        tts_request(announcement)
-    #Alarm is removed from the list of set alarms after it has gone off
-    if alarm in alarms:
-        alarms.remove(alarm)
-        logging.info('alarm ' + alarm['title'] + ' has been deleted from alarms')
-    
-@app.route('/')
-def index():
-    """The home page of the application"""
-    s.run(blocking=False) #prevents scheduler from sleeping
-    #renders the html template
-    return render_template('index.html', title='Daily update', notifications=notifications, alarms=alarms, image='image.png')
-
-@app.route('/index')
-def schedule_event():
-    """Checks for user input to set alarms and to delete alarms and notifications"""
-    s.run(blocking=False) #prevents scheduler from sleeping
-    alarm_details = request.args.get("alarm")
-    alarm_close = request.args.get("alarm_item")
-    notification_close = request.args.get("notif")
-    news_briefing = request.args.get("news")
-    weather_briefing = request.args.get("weather")
-    #current time is calculated
-    current_time_hhmm = str(time.gmtime().tm_hour) + ":" + str(time.gmtime().tm_min)
-    current_time_ddmmyyyy = current_time()
-    alarm_title_list = []
-    current_time()
-    for alarm in alarms:
-        alarm_title_list.append(alarm['title'])
-    if alarm_details:
-        #checks for user imput and sets an alarm
-        logging.info('pending atempt to create alarm')
-        alarm_details = str(alarm_details)
-        alarm_time = alarm_details.split('T')
-        alarm_name = request.args.get("two")
-        alarm = {}
-        #alarm information is defined
-        alarm['title'] = alarm_name
-        alarm['content'] = str(alarm_time)
-        alarm['date'] = alarm_time[0]
-        alarm['time'] = alarm_time[1]
-        if news_briefing:
-            #checks if news briefing is requested
-            logging.info('news briefing has been requested for alarm ' + alarm['title'])
-            alarm['news'] = True
-        else:    
-            alarm['news'] = False
-        if weather_briefing:
-            #checks is weather briefing is requested
-            logging.info('weather briefing has been requested for alarm ' + alarm['title'])
-            alarm['weather'] = True
-        else:
-            alarm['weather'] = False
-        if alarm['title'] not in alarm_title_list:
-            #checks for duplicate alarms and schedules unique ones
-            if alarm['date'] == current_time_ddmmyyyy: #checks if the alarm is to be scheduled today
-                #delay is calculated and alarm is scheduled
-                delay = hhmm_to_seconds(alarm['time']) - hhmm_to_seconds(current_time_hhmm)
-                alarm['schedule'] = s.enter(int(delay), 1, read_announcment,(alarm,))
-                logging.info('alarm ' + alarm['title'] + ' has been scheduled for ' + alarm['time'] + ' on date ' + alarm['date'])
-            else:
-                alarm['schedule'] = None
-                logging.info('alarm ' + alarm['title'] + ' is scheduled for another day (' + alarm['date'] + ')')
-                logging.info('alarm ' + alarm['title'] + ' will not be scheduled now')
-            alarms.append(alarm) #alarm added to list of alarms
-            logging.info('alarm "' + alarm['title'] + '" has been added to alarms')
-            logging.info('alarm value is: ' + str(alarm))
-        else:
-            logging.warning('alarm ' + alarm['title'] + ' is a duplicate, it is not added to alarms')
-    if alarm_close: #deletes an alarm if a user requests it
-        logging.info('pending attempt to delete alarm')
-        for i in range(len(alarms)): #searches and deletes alarm to be deleted
-            alarm = alarms[i]
-            if alarm["title"] == alarm_close:
-                for event in s.queue: #deletes the alarm from the scheduler
-                    if event == alarm['schedule']:
-                        s.cancel(event)
-                        logging.info('alarm ' + alarm['title'] + ' has been deleted from scheduler')
-                alarms.remove(alarm) #deletes alarm from list of alarms
-                logging.info('alarm ' + alarm['title'] + ' has been deleted from alarms')
-                break
-    if notification_close: #deletes a notification if a user requests it
-        logging.info('pending attempt to delete alarm')
-        for i in range(len(notifications)): #searches and deletes notification to be deleted
-            notification = notifications[i]
-            if notification["title"] == notification_close:
-                notifications.remove(notification)
-                logging.info('notification ' + notification['title'] + ' has been deleted from notifications')
-                break
-    return index()
-    
-
-def update_notif() -> None:
-    """updates notifications every four hours"""
-    s.enter(14400, 1, update_notif,())
-    logging.info('notifications updating')
-    notifications.append(check_news_api())
-    logging.info('news notification added to notifications')
-    notifications.append(check_weather_api())
-    logging.info('weather notification added to notifications')
-    notifications.append(check_covid_api())
-    logging.info('Covid-19 notification added to notifications')
-    
-def update_alarm_schedule() -> None:
-    """Checks when the date has changed and schedules alarms for that day"""
-    s.enter(60, 1, update_alarm_schedule,())
-    current_time_hhmm = str(time.gmtime().tm_hour) + ":" + str(time.gmtime().tm_min)
-    if current_time_hhmm == "0:0": #checks that it's midnight
-        logging.info('alarm schedule updating')
-        for alarm in alarms: #searchs alarms to be scheduled for the new day
-            if alarm['date'] == current_time_ddmmyyyy:
-                #alarm scheduled and added to list
-                delay = hhmm_to_seconds(alarm['time']) - hhmm_to_seconds(current_time_hhmm)
-                alarm['schedule'] = s.enter(int(delay), 1, read_announcment,(alarm,))
-                logging.info('alarm ' + alarm[title] + ' has been added to schedule')
-
-import test_mod
-
-if __name__ == '__main__':
-    logging.info('test routine starting')
-    print('test routine starting')
-    try:
-        test_mod.test_functions()
-    except AssertionError as message:
-        print(message)
-        logging.warning(message)
-    logging.info('test routine completed')
-    #lauches the application
-    s.enter(1, 1, update_notif,())
-    s.enter(1, 2, update_alarm_schedule,())
-    app.run()
-    
+"""
+This is a module that runs an interactive alarm clock that can retreive information
+about the current Covid-19 crisis and can supply updates on the news and weather. 
+The program uses an html application that can run as long a desired. The user can create
+and delete alarms as they please using this application.
+"""
+
+
+import math
+import time
+from datetime import datetime
+from datetime import timedelta
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from functools import partial
+from flask import Flask
+from flask import request
+from flask import render_template
+from flask import Response
+from flask import jsonify
+from flask import url_for
+import logging
+from alarm_engine import AlarmEngine
+from alarm_store import AlarmRegistry
+from briefing import fetch_briefing
+from api_cache import ApiCache
+from config import Config
+from api_client import ApiClient
+from speech import ALARM_PRIORITY
+from speech import SpeechPipeline
+from speech import SpeechQueue
+from storage import AlarmStorage
+from storage import ALARM_FIELDS
+from news_filter import NewsMatcher
+from news_filter import find_article
+from news_filter import iter_articles
+from push import EventBroker
+from cluster import Cluster
+from cluster import FIRE
+from cluster import WAIT
+from metrics import registry
+from recurrence import local_epoch
+from recurrence import parse_rule
+from recurrence import zone
+s = AlarmEngine()
+app = Flask(__name__)
+alarms = AlarmRegistry()
+notifications = []
+config = Config('config.json')
+news_cache = ApiCache('news', 600)
+weather_cache = ApiCache('weather', 600, max_entries=1024) #one entry for each location
+covid_cache = ApiCache('covid', 3600)
+news_client = ApiClient('news')
+WEATHER_WORKERS = 16 #weather fetches at the same time, each with its own keep-alive connection
+weather_client = ApiClient('weather', pool_size=WEATHER_WORKERS)
+covid_client = ApiClient('covid')
+#the speech pipeline, cluster and storage make files and threads, so they are only created by create_services
+speech = None
+speech_queue = None
+cluster_settings = config.get("cluster", {}) #only read at startup
+cluster = None
+storage = None
+last_change = 0 #the last change made by another process that has been applied
+covid_store = None #created the first time the Covid-19 figures are needed, as NumPy is slow to import
+events = EventBroker()
+PRERENDER_LEAD = 120 #seconds before an alarm that its announcement is prepared
+TAKEOVER_DELAY = cluster_settings.get("takeover-delay", 5) #seconds before another process fires an alarm whose process has stopped
+CLUSTER_INTERVAL = cluster_settings.get("poll-interval", 1) #seconds between checks for changes made by other processes
+TIMEZONE = zone(config.get("timezone", "UTC")) #alarm dates and times are wall clock times here, only read at startup
+NEWS_URL = "https://newsapi.org/v2/top-headlines"
+WEATHER_URL = "http://api.openweathermap.org/data/2.5/weather"
+COVID_URL = "https://api.coronavirus.data.gov.uk/v1/data"
+WEATHER_WINDOW = 300 #seconds of upcoming alarms whose weather is fetched together
+weather_pool = ThreadPoolExecutor(max_workers=WEATHER_WORKERS, thread_name_prefix='weather')
+notification_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notifications') #refreshes never overlap
+notification_refresh = None #the latest refresh of the notifications
+announcement_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='announcements') #briefings are fetched and rendered off the engine thread
+API_PAGE_SIZE = 100 #alarms listed per page by the JSON API unless asked otherwise
+API_MAX_PAGE_SIZE = 1000
+API_MAX_BATCH = 10000 #most alarms created or deleted by one JSON API request
+#values the JSON API accepts for whether a briefing is wanted, 1 and 0 match True and False
+API_FLAGS = {None: False, False: False, True: True, '': False, 'false': False, 'true': True, '0': False, '1': True}
+ALARM_LAG = registry.histogram('alarm_lag_seconds', 'Seconds between when an alarm was due and when it went off')
+
+def apply_log_level(config: Config) -> None:
+    """Sets how detailed pysys.log is whenever config.json is loaded"""
+    logging.getLogger().setLevel(config.get("log-level", "INFO"))
+
+config.add_listener(apply_log_level)
+
+def configure_logging() -> None:
+    """Sends the log to pysys.log, done when the program starts rather than when main is imported"""
+    logging.basicConfig(filename='pysys.log')
+    apply_log_level(config)
+    logging.info('Log is working')
+
+def apply_cache_ttl(config: Config) -> None:
+    """Updates the cache lifetimes whenever config.json is loaded"""
+    cache_ttl = config.get("cache-ttl", {})
+    news_cache.ttl = cache_ttl.get("news", 600)
+    weather_cache.ttl = cache_ttl.get("weather", 600)
+    covid_cache.ttl = cache_ttl.get("covid", 3600)
+
+apply_cache_ttl(config)
+config.add_listener(apply_cache_ttl)
+
+def apply_news_filter(config: Config) -> None:
+    """Rebuilds the news matcher whenever config.json is loaded"""
+    global news_matcher
+    news_matcher = NewsMatcher.from_config(config)
+
+apply_news_filter(config)
+config.add_listener(apply_news_filter)
+
+def cache_stats() -> dict:
+    """Returns the statistics of every cache, keyed by the cache's name"""
+    stats = {cache.name: cache.stats() for cache in (news_cache, weather_cache, covid_cache)}
+    if speech is not None:
+        stats['tts'] = {'hits': speech.cached, 'misses': speech.rendered, 'hit_ratio': speech.hit_ratio()}
+    return stats
+
+registry.gauge('queue_depth', 'Items waiting in each queue', lambda: {
+    ('scheduler',): len(s), ('speech',): len(speech_queue) if speech_queue is not None else 0,
+    ('storage',): storage.pending() if storage is not None else 0}, ('queue',))
+registry.gauge('event_subscribers', 'Pages receiving events', lambda: len(events))
+registry.gauge('cache_hit_ratio', 'Fraction of lookups answered without fetching', lambda: {
+    (name,): stats['hit_ratio'] for name, stats in cache_stats().items()}, ('cache',))
+registry.gauge('cache_lookups', 'Lookups in each cache since the program started', lambda: {
+    (name, result): stats[result] for name, stats in cache_stats().items() for result in ('hits', 'misses')},
+    ('cache', 'result'))
+
+def minutes_to_seconds( minutes: str ) -> int:
+    """Converts minutes to seconds"""
+    return int(minutes)*60
+
+def hours_to_minutes( hours: str ) -> int:
+    """Converts hours to minutes"""
+    return int(hours)*60
+
+def hhmm_to_seconds( hhmm: str ) -> int:
+    """Converts hours and minutes into seconds"""
+    if len(hhmm.split(':')) != 2:
+        print('Incorrect format. Argument must be formatted as HH:MM')
+        return None
+    return minutes_to_seconds(hours_to_minutes(hhmm.split(':')[0])) + \
+        minutes_to_seconds(hhmm.split(':')[1])
+
+def round_to_integer(number: float) -> int:
+    """Round input to nearest whole number
+    
+    Keyword arguments:
+    number -- input number to be rounded
+    """
+    return math.floor(number + 0.5) #halves are rounded up, unlike round which rounds them to even
+
+def news_url() -> str:
+    """Returns the url of the news API request"""
+    keys = config["API-keys"] #API key is extracted from config.json
+    api_key_news = keys["news"]
+    base_url = NEWS_URL + "?"
+    country = "gb"
+    return base_url + "country=" + country + "&apiKey=" + api_key_news
+
+def news_api_request() -> dict:
+    """Makes an news API request and returns info"""
+    logging.debug('pending news API request')
+    news_json = news_client.get_json(news_url()) #requests API information from url
+    return news_json
+
+def stream_news_articles():
+    """Makes a news API request and yields its articles as they are received"""
+    logging.debug('pending news API request')
+    with news_client.stream(news_url()) as response: #the connection is closed if reading stops early
+        yield from iter_articles(response.iter_content(8192))
+
+def format_news_notification(api_request: dict) -> dict:
+    """
+    filters and formats information retreived form an API request to return a news notification
+
+    The articles are only read until a relevant enough article is found, so they
+    can be a stream of articles that are still being received. None is returned
+    if no article is relevant.
+
+    Keyword arguments:
+    api_request -- The information retrieved from an API request
+    """
+    article = find_article(api_request["articles"], news_matcher)
+    if article is None:
+        logging.warning('no relevant news article was found')
+        return None
+    #title and description of the most relevant article are extracted
+    notification = {"title": article["title"], "content": article["description"]}
+    logging.info('notification %s has been created', notification['title'])
+    return notification
+
+def fetch_news_notification() -> dict:
+    """Streams the latest news and returns a notification of the most relevant article"""
+    articles = stream_news_articles()
+    try:
+        return format_news_notification({"articles": articles})
+    finally:
+        articles.close()
+
+def check_news_api() -> dict:
+    '''Makes an news API request and returns a notification
+    
+    Information on the latest news is requested and is then
+    filtered so that only relevant articles are considered to be
+    added as notifications.
+    The information on the latest relevant article is returned in
+    dictionary format.
+    '''
+    notification = news_cache.get('news', fetch_news_notification) #recent notifications are shared by every caller
+    return notification
+    
+def weather_api_request(city: str = None) -> dict:
+    """Makes a weather API request and returns info
+
+    Keyword arguments:
+    city -- the location to request the weather for, the one in config.json if None
+    """
+    logging.debug('pending weather API request for %s', city or config["location"])
+    keys = config["API-keys"] #API key is extracted from config.json
+    api_key_weather = keys["weather"]
+    city_name = city or config["location"] #Area location is extracted from config.json
+    weather_json = weather_client.get_json(WEATHER_URL, params={"appid": api_key_weather, "q": city_name}) #requests API information from url
+    return weather_json
+
+def format_weather_notification(api_request: dict, city: str = None) -> dict:
+    """
+    filters and formats information retreived form an API request to return a weather notification
+    
+    Keyword arguments:
+    api_request -- The information retrieved from an API request
+    city -- the location the weather is for, the one in config.json if None
+    """
+    notification ={}
+    city_name = city or config["location"] #Area location is extracted from config.json
+    now = datetime.now(TIMEZONE)
+    current_time_hhmm = str(now.hour) + ":" + str(now.minute) #Current time is calculated
+    weather = api_request["weather"] #information on weather is extracted
+    weather = weather[0]
+    temperature = api_request["main"]
+    weather_description = weather["description"] #weather description extracted
+    temperature_temp = kelvin_to_celsius(temperature["temp"]) #temperature is extracted and rounded
+    # feels like temperature is extracted and rounded
+    temperature_feels_like = kelvin_to_celsius(temperature["feels_like"])
+    #information is formatted into an appropriate dictionary format
+    notification["title"] = 'Weather - ' + city_name + ' - ' + current_time_hhmm
+    notification["content"] =("Weather: " + weather_description + ". Temperature: ") + (str(temperature_temp) + "°C Feels like: " + str(temperature_feels_like) + "°C")
+    logging.info('notification %s has been created', notification['title'])
+    return notification
+    
+def kelvin_to_celsius(kelvin: float) -> int:
+    """Converts a temperature in kelvin to the nearest whole degree celsius"""
+    return round_to_integer(float(kelvin) - 273.15)
+
+def fetch_weather(city: str = None) -> dict:
+    """Returns the weather API response for a location, from the cache if it is recent
+
+    Keyword arguments:
+    city -- the location to request the weather for, the one in config.json if None
+    """
+    city = city or config["location"]
+    return weather_cache.get(city, partial(weather_api_request, city)) #each location is cached separately
+
+def fetch_weather_batch(cities) -> dict:
+    """Starts fetching the weather for many locations at the same time, each location only once
+
+    Returns the fetches keyed by location without waiting for them. Each one can be
+    waited on for the API response, which is None if it could not be fetched.
+
+    Keyword arguments:
+    cities -- the locations to fetch, repeats are fetched once
+    """
+    return {city: weather_pool.submit(run_logged, fetch_weather, city) for city in set(cities)}
+
+def check_weather_api(city: str = None) -> dict:
+    '''Makes a weather API request and returns a notification
+    
+    Information on the current weather is requested and is then
+    filtered so that only weather description and temperature
+    are extracted. This information is then along with the 
+    current time and are name and is returned in
+    dictionary format.
+
+    Keyword arguments:
+    city -- the location to report the weather for, the one in config.json if None
+    '''
+    information = fetch_weather(city) #recent responses are shared by every caller
+    notification = format_weather_notification(information, city)
+    return notification
+
+def covid_api_request(since: str = None) -> dict:
+    """Makes a Covid-19 API request and returns info
+
+    Days are returned newest first, a page at a time, and no more pages are
+    requested once a page reaches the since date.
+
+    Keyword arguments:
+    since -- date formatted as YYYY-MM-DD, only days after it are returned
+    """
+    logging.debug('pending Covid-19 API request')
+    from uk_covid19 import Cov19API #imports API key
+    #filters are defined
+    england_only = ['areaType=nation','areaName=England']
+    cases_and_deaths = {
+    "date": "date",
+    "newCasesByPublishDate": "newCasesByPublishDate",
+    "cumCasesByPublishDate": "cumCasesByPublishDate",
+    "newDeathsByDeathDate": "newDeathsByDeathDate",
+    "cumDeathsByDeathDate": "cumDeathsByDeathDate"}
+    api = Cov19API(filters=england_only, structure=cases_and_deaths)
+    params = api.api_params
+    params['format'] = 'json'
+    params['page'] = 1
+    covid_data = []
+    while True: #requests API information one page at a time
+        page = covid_client.get_json(COVID_URL, params=params)
+        if not page or not page['data']:
+            break
+        covid_data.extend(day for day in page['data'] if since is None or day['date'] > since)
+        if since is not None and page['data'][-1]['date'] <= since:
+            break
+        params['page'] += 1
+    return {'data': covid_data}
+    
+def format_covid_notification(api_request: dict) -> dict:
+    """
+    Formats and computes information retreived form an API request to return a covid notification
+    
+    Keyword arguments:
+    api_request -- The information retrieved from an API request
+    """
+    notification = {}
+    covid_data_details = api_request["data"]
+    covid_data_details_today = covid_data_details[0] 
+    covid_data_details_yesterday = covid_data_details[1]
+    #Threshold level is calculated
+    if int(covid_data_details_today['newCasesByPublishDate']) > 10000:
+        if int(covid_data_details_today['newCasesByPublishDate']) > 15000:
+            threshold_level = 'Red - Not safe'
+        else:
+            threshold_level = 'Yellow - Be careful'
+    else:
+        threshold_level = 'Green - safe'
+    #information is formatted into an appropriate dictionary format
+    notification['title'] = "Covid-19 report - England " + covid_data_details_today['date']
+    notification['content'] = ''.join(("New cases today: ", 
+    str(covid_data_details_today["newCasesByPublishDate"]),
+    " New cases yesterday: ",
+    str(covid_data_details_yesterday["newCasesByPublishDate"]),
+    ", Total cases: ",
+    str(covid_data_details_today["cumCasesByPublishDate"]),
+    ", Yesterday's deaths: ",
+    str(covid_data_details_yesterday["newDeathsByDeathDate"]),
+    ", Total deaths: ",
+    str(covid_data_details_yesterday["cumDeathsByDeathDate"]), ' Threshold level is ',
+    threshold_level))
+    logging.info('notification %s has been created', notification['title'])
+    return notification
+
+def check_covid_api() -> dict:
+    '''Makes a covid API request and returns a notification
+    
+    Information on the current covid cases is requested and is then
+    filtered so that only relavent information is extracted.
+    This information is then computed so that a threshold level
+    can be calculated based on the number of cases. Threshold level
+    and covid cases information are then returned in
+    dictionary format.
+    '''
+    information = covid_cache.get('covid', update_covid_store) #recent responses are shared by every caller
+    notification = format_covid_summary(information)
+    return notification
+
+def update_covid_store() -> dict:
+    """Requests the days missing from the local Covid-19 figures and summarises them"""
+    global covid_store
+    if covid_store is None:
+        from covid_store import CovidStore
+        covid_store = CovidStore()
+    covid_store.update(lambda since: covid_api_request(since)['data'])
+    return covid_store.summary()
+
+def format_covid_summary(summary: dict) -> dict:
+    """
+    Formats a summary of the stored Covid-19 figures to return a covid notification
+
+    Keyword arguments:
+    summary -- the summary returned by CovidStore.summary
+    """
+    notification = {}
+    notification['title'] = "Covid-19 report - England " + summary['date']
+    notification['content'] = ''.join(("New cases today: ",
+    str(summary['new_cases']),
+    " New cases yesterday: ",
+    str(summary['new_cases_yesterday']),
+    ", Cases ",
+    'down' if summary['cases_change'] < 0 else 'up', #read out, as the minus sign is removed from announcements
+    " by ",
+    str(abs(summary['cases_change'])),
+    " since yesterday, Total cases: ",
+    str(summary['cum_cases']),
+    ", Yesterday's deaths: ",
+    str(summary['new_deaths_yesterday']),
+    ", Total deaths: ",
+    str(summary['cum_deaths_yesterday']),
+    ", Seven day average: ",
+    'unknown' if summary['seven_day_average'] is None else str(round(summary['seven_day_average'])),
+    ' Threshold level is ',
+    summary['threshold_level']))
+    logging.info('notification %s has been created', notification['title'])
+    return notification
+
+
+def current_time() -> str:
+    """imports and formats the current date"""
+    #the date is formatted with "0"s where nessesary so that it is readable by other functions
+    return datetime.now(TIMEZONE).strftime('%Y-%m-%d')
+
+def alarm_epoch(alarm: dict) -> float:
+    """Returns the time an alarm is set for in seconds since the epoch
+
+    Keyword arguments:
+    alarm -- the alarm whose date and time, in the configured time zone, are converted
+    """
+    return local_epoch(alarm['date'], alarm['time'], TIMEZONE)
+
+def next_midnight(now: float) -> float:
+    """Returns the time of the next midnight in the configured time zone in seconds since the epoch"""
+    tomorrow = datetime.fromtimestamp(now, TIMEZONE).date() + timedelta(days=1)
+    return datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=TIMEZONE).timestamp()
+
+def next_occurrence(repeat: str, at: str, after: float) -> tuple:
+    """Returns the date and time of the first occurrence of a recurrence later than a time
+
+    Raises ValueError if the recurrence is not valid or never goes off.
+
+    Keyword arguments:
+    repeat -- daily, weekdays, weekends or a cron expression
+    at -- the time formatted as HH:MM that daily, weekdays and weekends go off at
+    after -- seconds since the epoch
+    """
+    wall = parse_rule(repeat, at).next_after(after, TIMEZONE)
+    return wall.strftime('%Y-%m-%d'), wall.strftime('%H:%M')
+
+def tts_request(announcement="Text to speech example announcement!") -> None:
+    """Queues text to be converted to speech
+    
+    Keyword arguments:
+    announcement -- text that is to be converted to speech
+    """
+    speech_queue.say([announcement])
+    
+def format_announcement(notification: dict, key: str) -> str:
+    """Removes punctuation from part of a notification so that it is ready to be read
+
+    Keyword arguments:
+    notification -- the notification to be read, or None if it could not be fetched
+    key -- the part of the notification to be read
+    """
+    if notification is None:
+        return 'unavailable'
+    punctuation = '!"#$%&`()*+,-./:;'
+    announcement = notification[key].replace('°C', 'degrees celcius')
+    for character in punctuation:
+        announcement = announcement.replace(character, ' ')
+    return announcement
+
+def create_announcment(alarm: dict) -> list:
+    """Creates a list of announcements to be announcement when an alarm goes off
+    
+    Information is extracted from APIs and the alarm input to construct an 
+    announcement based on the set alarm.
+    
+    Keyword arguments 
+    alarm -- the alarm from where information is extracted for the announcement
+    """
+    logging.info('alarm %s is going off', alarm['title'])
+    #only the requested briefings are fetched, all at the same time
+    sources = {'covid': check_covid_api}
+    if alarm['news'] == True:
+        sources['news'] = check_news_api
+    if alarm['weather'] == True:
+        sources['weather'] = partial(check_weather_api, alarm.get('location'))
+    briefing = fetch_briefing(sources)
+    #the default announcement list is defined
+    announcement_list = [('alarm ' + alarm['title'] + ' has gone off'), ('covid report is ' + format_announcement(briefing['covid'], 'content'))]
+    #Checks if user requested new breifing
+    if 'news' in briefing:
+        announcement_list.append('lastest news is ' + format_announcement(briefing['news'], 'title'))
+    #Checks if user requested weather breifing
+    if 'weather' in briefing:
+        announcement_list.append('weather report is ' + format_announcement(briefing['weather'], 'content'))
+    return announcement_list
+
+def prepare_announcment(alarm: dict) -> None:
+    """Creates an alarm's announcement and renders it to audio before the alarm goes off
+
+    Keyword arguments
+    alarm -- the alarm whose announcement is prepared
+    """
+    occurrence = firing_lease(alarm)
+    if cluster is not None and not cluster.prefers(occurrence):
+        return #the announcement is prepared by the process that will fire the alarm
+    announcement_list = create_announcment(alarm)
+    speech.prerender(announcement_list)
+    if firing_lease(alarm) == occurrence: #a recurring alarm that went off meanwhile is not given a stale announcement
+        alarm['announcement'] = announcement_list
+    logging.info('announcement for alarm %s is ready', alarm['title'])
+
+def queue_preparation(alarm: dict) -> None:
+    """Hands an alarm's announcement to the announcement threads to be prepared
+
+    Fetching the briefings and rendering them takes seconds, so the engine thread
+    only hands the work over and is free to fire the alarms that are due meanwhile.
+
+    Keyword arguments
+    alarm -- the alarm whose announcement is prepared
+    """
+    announcement_pool.submit(run_logged, prepare_announcment, alarm)
+
+def announce(alarm: dict) -> None:
+    """Creates an alarm's announcement and queues it to be read, for alarms that went off unprepared
+
+    Keyword arguments
+    alarm -- the alarm that has gone off
+    """
+    speech_queue.say(create_announcment(alarm), ALARM_PRIORITY)
+
+def run_logged(task, *args):
+    """Runs a task handed to a worker thread and returns its result, or None if it raised an error
+
+    Any error is logged, as nothing may wait on the task to see it.
+
+    Keyword arguments
+    task -- the function to run
+    args -- the arguments it is called with
+    """
+    try:
+        return task(*args)
+    except Exception:
+        logging.exception('%s failed', task.__name__)
+        return None
+
+def read_announcment(alarm: dict) -> None:
+    """ Reads the announcement created by the create_announcment function
+    
+    Keyword arguments 
+    alarm -- the alarm from where information is extracted for the announcement
+    """
+    if cluster is not None and not claim_alarm(alarm):
+        return
+    lease = firing_lease(alarm) #taken before a recurring alarm moves on to its next occurrence
+    ALARM_LAG.observe(max(0.0, time.time() - alarm_epoch(alarm)))
+    #the prepared announcement is used if there is one, otherwise it is created on an announcement thread
+    announcement_list = alarm.pop('announcement', None)
+    if announcement_list:
+        speech_queue.say(announcement_list, ALARM_PRIORITY) #the briefing is read by the speech worker, before any on demand speech
+    else:
+        announcement_pool.submit(run_logged, announce, dict(alarm)) #a copy, as a recurring alarm moves on
+    if alarm.get('repeat'):
+        advance_alarm(alarm)
+    #Alarm is removed from the list of set alarms after it has gone off
+    elif alarms.discard(alarm):
+        storage.delete_alarm(alarm['title'])
+        events.publish('alarm_fired', {'title': alarm['title']})
+        logging.info('alarm %s has been deleted from alarms', alarm['title'])
+    if cluster is not None:
+        cluster.complete(lease)
+
+def advance_alarm(alarm: dict, save: bool = True) -> None:
+    """Moves a recurring alarm on to its next occurrence once it has gone off
+
+    The next occurrence is the first after both the one that went off and the
+    current time, so occurrences missed while the program was not running do not
+    go off one after another. Only the next occurrence is ever scheduled.
+
+    Keyword arguments
+    alarm -- the recurring alarm that has gone off
+    save -- False when the process that fired the alarm saves its next occurrence
+    """
+    if not alarms.discard(alarm):
+        return #the alarm was deleted while it was going off
+    s.cancel(alarm.get('prepare'))
+    events.publish('alarm_fired', {'title': alarm['title']})
+    alarm['date'], alarm['time'] = next_occurrence(alarm['repeat'], alarm['time'], max(time.time(), alarm_epoch(alarm)))
+    alarm['content'] = str([alarm['date'], alarm['time']])
+    alarm['schedule'] = None
+    add_alarms([alarm], save=save)
+    logging.info('alarm %s will go off again at %s on %s', alarm['title'], alarm['time'], alarm['date'])
+
+def firing_lease(alarm: dict) -> str:
+    """Returns the name of the lease a process takes to fire an alarm"""
+    return 'alarm ' + alarm['title'] + ' ' + alarm['date'] + ' ' + alarm['time']
+
+def claim_alarm(alarm: dict) -> bool:
+    """Checks whether this process fires an alarm when several processes share the alarms
+
+    If another process fires it, the alarm is forgotten, or moved on to its next
+    occurrence if it is recurring. If another process may still fire it, the alarm
+    is rescheduled for when this process should check again.
+
+    Keyword arguments
+    alarm -- the alarm that is due
+    """
+    decision, retry = cluster.claim(firing_lease(alarm), alarm_epoch(alarm), TAKEOVER_DELAY)
+    if decision == FIRE:
+        return True
+    if decision == WAIT:
+        alarms.set_schedule(alarm, s.enterabs(retry, 1, read_announcment, (alarm,)))
+    elif alarm.get('repeat'):
+        advance_alarm(alarm, save=False)
+    elif alarms.discard(alarm):
+        s.cancel(alarm.get('prepare'))
+        events.publish('alarm_fired', {'title': alarm['title']})
+        logging.info('alarm %s was fired by another process', alarm['title'])
+    return False
+    
+def public_alarm(alarm: dict) -> dict:
+    """Returns the fields of an alarm that are shown on the page"""
+    return {field: alarm.get(field) for field in ALARM_FIELDS}
+
+def upcoming_alarms(start: float, end: float) -> list:
+    """Returns the alarms due from the start time up to the end time
+
+    Keyword arguments:
+    start -- seconds since the epoch
+    end -- seconds since the epoch, less than a day after the start
+    """
+    dates = {datetime.fromtimestamp(start, TIMEZONE).strftime('%Y-%m-%d'), datetime.fromtimestamp(end, TIMEZONE).strftime('%Y-%m-%d')}
+    return [alarm for date in dates for alarm in alarms.on_date(date) if start <= alarm_epoch(alarm) < end]
+
+def prefetch_weather() -> dict:
+    """Fetches the weather for the upcoming alarms, once for each of their locations
+
+    Runs every WEATHER_WINDOW seconds. The alarms that want a weather briefing and
+    are due before the next run, or whose announcement is prepared before then, are
+    grouped by location so each location is requested once however many alarms are
+    set there. The responses wait in the weather cache for the alarms to use, so the
+    engine thread only starts the fetches and returns them without waiting.
+    """
+    now = time.time()
+    s.enterabs(now + WEATHER_WINDOW, 2, prefetch_weather,())
+    due = [alarm for alarm in upcoming_alarms(now, now + WEATHER_WINDOW + PRERENDER_LEAD)
+           if alarm['weather'] and (cluster is None or cluster.prefers(firing_lease(alarm)))]
+    weather = fetch_weather_batch(alarm.get('location') or config["location"] for alarm in due)
+    if due:
+        logging.info('weather for %d alarms is being fetched from %d locations', len(due), len(weather))
+    return weather
+
+def schedule_alarm(alarm: dict) -> None:
+    """Schedules an alarm to go off and its announcement to be prepared shortly before
+
+    An alarm whose time has already passed goes off straight away.
+
+    Keyword arguments
+    alarm -- the alarm to be scheduled
+    """
+    schedule_alarms([alarm])
+
+def schedule_alarms(alarm_list: list) -> None:
+    """Schedules many alarms, adding all of their events to the scheduler in one pass
+
+    Keyword arguments
+    alarm_list -- the alarms to be scheduled
+    """
+    entries = []
+    for alarm in alarm_list:
+        due = alarm_epoch(alarm)
+        entries.append((due, 1, read_announcment, (alarm,)))
+        entries.append((due - PRERENDER_LEAD, 0, queue_preparation, (alarm,)))
+    scheduled = s.enterabs_many(entries)
+    for alarm, event, prepare in zip(alarm_list, scheduled[0::2], scheduled[1::2]):
+        alarms.set_schedule(alarm, event)
+        alarm['prepare'] = prepare
+
+def add_alarms(new_alarms: list, save: bool = True) -> list:
+    """Adds alarms, schedules the ones due today and saves them, returns the ones added
+
+    Alarms for later days wait in the alarm registry until promote_alarms schedules
+    them. Alarms whose title is already taken are not added.
+
+    Keyword arguments
+    new_alarms -- the alarms to be added, with their schedule set to None
+    save -- False for alarms that have already been saved by another process
+
+    Raises ValueError, without adding any of the alarms, if one has an invalid date or time.
+    """
+    due = {id(alarm): alarm_epoch(alarm) for alarm in new_alarms} #raises before any alarm is added
+    added = alarms.add_many(new_alarms)
+    midnight = next_midnight(time.time())
+    schedule_alarms([alarm for alarm in added if due[id(alarm)] < midnight])
+    if save:
+        storage.save_alarms(added)
+    if len(added) == 1:
+        events.publish('alarm_added', public_alarm(added[0]))
+    elif added: #a batch is sent to the page as a single event
+        events.publish('alarms_added', [public_alarm(alarm) for alarm in added])
+    return added
+
+def remove_alarms(titles: list, save: bool = True) -> list:
+    """Deletes alarms and cancels their scheduled events, returns the ones deleted
+
+    Keyword arguments
+    titles -- the titles of the alarms to be deleted
+    save -- False for alarms that have already been deleted by another process
+    """
+    removed = []
+    for title in titles:
+        alarm = alarms.pop(title)
+        if alarm is not None:
+            s.cancel(alarm.get('prepare'))
+            s.cancel(alarm['schedule'])
+            removed.append(alarm)
+    if save:
+        storage.delete_alarms([alarm['title'] for alarm in removed])
+    if len(removed) == 1:
+        events.publish('alarm_removed', {'title': removed[0]['title']})
+    elif removed:
+        events.publish('alarms_removed', [alarm['title'] for alarm in removed])
+    return removed
+
+def parse_alarm(data) -> dict:
+    """Builds an alarm from the JSON API's representation of it
+
+    Raises ValueError if the alarm is not valid.
+
+    Keyword arguments
+    data -- object with a title, a date formatted as YYYY-MM-DD, a time formatted
+            as HH:MM and optionally whether news and weather briefings are wanted,
+            the location of the weather briefing and how the alarm repeats
+    """
+    if not isinstance(data, dict):
+        raise ValueError('an alarm must be an object')
+    title = data.get('title')
+    if not isinstance(title, str) or not title:
+        raise ValueError('an alarm must have a title')
+    date = data.get('date')
+    alarm_time = data.get('time')
+    repeat = data.get('repeat')
+    if repeat is not None:
+        #a recurring alarm is set for its first occurrence from its date and time, today if it has no date
+        try:
+            if not isinstance(repeat, str):
+                raise ValueError('a recurrence must be text')
+            start = local_epoch(str(date or current_time()), str(alarm_time or '00:00'), TIMEZONE)
+            date, alarm_time = next_occurrence(repeat, str(alarm_time), max(time.time(), start) - 1)
+        except ValueError as error:
+            raise ValueError('alarm ' + title + ' must repeat daily, weekdays, weekends or on a cron expression'
+                             ' from a date formatted as YYYY-MM-DD and a time formatted as HH:MM: ' + str(error)) from None
+    try:
+        time.strptime(str(date) + ' ' + str(alarm_time), '%Y-%m-%d %H:%M')
+    except ValueError:
+        raise ValueError('alarm ' + title + ' must have a date formatted as YYYY-MM-DD and a time formatted as HH:MM') from None
+    location = data.get('location')
+    if location is not None and (not isinstance(location, str) or not location):
+        raise ValueError('alarm ' + title + ' must have a location that is a name, or none')
+    briefings = {}
+    for name in ('news', 'weather'):
+        value = data.get(name)
+        if isinstance(value, str):
+            value = value.strip().lower()
+        if not isinstance(value, (bool, int, str, type(None))) or value not in API_FLAGS:
+            raise ValueError('alarm ' + title + ' must have ' + name + ' set to true or false')
+        briefings[name] = API_FLAGS[value]
+    return {'title': title, 'content': str([date, alarm_time]), 'date': date, 'time': alarm_time,
+            'news': briefings['news'], 'weather': briefings['weather'],
+            'location': location, 'repeat': repeat, 'schedule': None}
+
+def api_error(message: str, status: int = 400, **details):
+    """Returns a JSON error response"""
+    return jsonify(error=message, **details), status
+
+@app.route('/')
+def index():
+    """The home page of the application"""
+    #renders the html template
+    return render_template('index.html', title='Daily update', notifications=notifications, alarms=alarms, image='image.png')
+
+def page_state() -> dict:
+    """Returns the alarms and notifications shown on the page"""
+    return {'alarms': [public_alarm(alarm) for alarm in alarms], 'notifications': list(notifications)}
+
+@app.route('/events')
+def stream_events():
+    """Streams changes to the alarms and notifications to the page as Server-Sent Events
+
+    The page is sent the current alarms and notifications first, then an event for
+    every alarm added, fired or removed and every notification added or removed.
+    """
+    subscription = events.subscribe(page_state) #the state is read once the page is subscribed
+    return Response(subscription.messages(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/index')
+def schedule_event():
+    """Checks for user input to set alarms and to delete alarms and notifications"""
+    alarm_details = request.args.get("alarm")
+    alarm_close = request.args.get("alarm_item")
+    notification_close = request.args.get("notif")
+    news_briefing = request.args.get("news")
+    weather_briefing = request.args.get("weather")
+    if alarm_details:
+        #checks for user imput and sets an alarm
+        logging.debug('pending atempt to create alarm')
+        alarm_details = str(alarm_details)
+        alarm_time = alarm_details.split('T')
+        alarm_name = request.args.get("two")
+        alarm = {}
+        #alarm information is defined
+        alarm['title'] = alarm_name
+        alarm['content'] = str(alarm_time)
+        alarm['date'] = alarm_time[0]
+        alarm['time'] = alarm_time[1]
+        if news_briefing:
+            #checks if news briefing is requested
+            logging.debug('news briefing has been requested for alarm %s', alarm['title'])
+            alarm['news'] = True
+        else:    
+            alarm['news'] = False
+        if weather_briefing:
+            #checks is weather briefing is requested
+            logging.debug('weather briefing has been requested for alarm %s', alarm['title'])
+            alarm['weather'] = True
+        else:
+            alarm['weather'] = False
+        alarm['location'] = request.args.get("location") or None #the location in config.json is used if none is given
+        alarm['repeat'] = request.args.get("repeat") or None
+        alarm['schedule'] = None
+        try:
+            if alarm['repeat']:
+                #a recurring alarm is set for its first occurrence from the time given, it is not added if it never recurs
+                start = max(time.time(), alarm_epoch(alarm)) - 1
+                alarm['date'], alarm['time'] = next_occurrence(alarm['repeat'], alarm['time'], start)
+                alarm['content'] = str([alarm['date'], alarm['time']])
+            added = add_alarms([alarm])
+        except ValueError as error: #such as a date that does not exist or a recurrence that is not valid
+            logging.warning('alarm %s is not valid, it is not added to alarms: %s', alarm['title'], error)
+        else:
+            if added:
+                #duplicate alarms are not added, unique ones are scheduled if they are due today
+                if alarm['schedule'] is not None:
+                    logging.info('alarm %s has been scheduled for %s on date %s', alarm['title'], alarm['time'], alarm['date'])
+                else:
+                    logging.info('alarm %s is scheduled for another day (%s)', alarm['title'], alarm['date'])
+                    logging.debug('alarm %s will not be scheduled until that day', alarm['title'])
+                logging.info('alarm "%s" has been added to alarms', alarm['title'])
+                logging.debug('alarm value is: %s', alarm)
+            else:
+                logging.warning('alarm %s is a duplicate, it is not added to alarms', alarm['title'])
+    if alarm_close: #deletes an alarm if a user requests it
+        logging.debug('pending attempt to delete alarm')
+        for alarm in remove_alarms([alarm_close]): #finds and deletes alarm from alarms and the scheduler
+            logging.info('alarm %s has been deleted from alarms', alarm['title'])
+    if notification_close: #deletes a notification if a user requests it
+        logging.debug('pending attempt to delete notification')
+        if remove_notification(notification_close) is not None:
+            logging.info('notification %s has been deleted from notifications', notification_close)
+    if request.headers.get('X-Requested-With') == 'fetch':
+        #the page sent the form itself and is updated by the events, so no page is rendered
+        return '', 204
+    return index()
+    
+
+@app.route('/metrics')
+def serve_metrics():
+    """Serves the program's metrics in the Prometheus text format"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/alarms', methods=['GET'])
+def list_alarms():
+    """Lists the alarms as JSON, a page at a time, in the order they were added
+
+    The page and per_page query parameters choose the page. The response links to
+    the next page, if there is one.
+    """
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', API_PAGE_SIZE, type=int)
+    if page < 1 or not 1 <= per_page <= API_MAX_PAGE_SIZE:
+        return api_error('page must be at least 1 and per_page between 1 and ' + str(API_MAX_PAGE_SIZE))
+    start = (page - 1) * per_page
+    total = len(alarms)
+    more = start + per_page < total
+    return jsonify(alarms=[public_alarm(alarm) for alarm in alarms.page(start, per_page)],
+                   page=page, per_page=per_page, total=total,
+                   next=url_for('list_alarms', page=page + 1, per_page=per_page) if more else None)
+
+@app.route('/api/alarms', methods=['POST'])
+def create_alarms():
+    """Creates a batch of alarms from a JSON list, or an object with an alarms list
+
+    Nothing is created if any alarm is invalid. Alarms whose title is already taken
+    are skipped and listed in the response.
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('alarms')
+    if not isinstance(data, list):
+        return api_error('expected a list of alarms')
+    if len(data) > API_MAX_BATCH:
+        return api_error('at most ' + str(API_MAX_BATCH) + ' alarms can be created at once', 413)
+    new_alarms = []
+    for index, item in enumerate(data):
+        try:
+            new_alarms.append(parse_alarm(item))
+        except ValueError as error:
+            return api_error(str(error), index=index)
+    added = {id(alarm) for alarm in add_alarms(new_alarms)}
+    duplicates = [alarm['title'] for alarm in new_alarms if id(alarm) not in added]
+    logging.info('%d alarms created through the API, %d duplicates skipped', len(added), len(duplicates))
+    return jsonify(created=len(added), duplicates=duplicates), 201
+
+@app.route('/api/alarms', methods=['DELETE'])
+def delete_alarms():
+    """Deletes a batch of alarms given an object with a titles list"""
+    data = request.get_json(silent=True)
+    titles = data.get('titles') if isinstance(data, dict) else None
+    if not isinstance(titles, list) or not all(isinstance(title, str) for title in titles):
+        return api_error('expected an object with a list of titles')
+    if len(titles) > API_MAX_BATCH:
+        return api_error('at most ' + str(API_MAX_BATCH) + ' alarms can be deleted at once', 413)
+    removed = {alarm['title'] for alarm in remove_alarms(titles)}
+    missing = [title for title in titles if title not in removed]
+    logging.info('%d alarms deleted through the API', len(removed))
+    return jsonify(deleted=len(removed), missing=missing)
+
+def update_notif() -> Future:
+    """updates notifications every four hours
+
+    The APIs are requested on a thread of their own, so alarms still go off on time
+    and requests are still answered while they are slow to respond. Returns the
+    refresh, which can be waited on.
+    """
+    global notification_refresh
+    s.enter(14400, 1, update_notif,())
+    notification_refresh = notification_pool.submit(refresh_notifications)
+    return notification_refresh
+
+def refresh_notifications() -> None:
+    """Requests the news, weather and Covid-19 notifications and adds them
+
+    Any error is logged, as nothing waits on the refresh to see it.
+    """
+    if cluster is not None and not cluster.acquire('notifications ' + str(int(time.time() // 14400)), 14400):
+        logging.info('notifications are being updated by another process')
+        return
+    logging.info('notifications updating')
+    try:
+        add_notification(check_news_api())
+        logging.info('news notification added to notifications')
+        add_notification(check_weather_api())
+        logging.info('weather notification added to notifications')
+        add_notification(check_covid_api())
+        logging.info('Covid-19 notification added to notifications')
+    except Exception:
+        logging.exception('notifications could not be updated')
+
+def add_notification(notification: dict, save: bool = True) -> None:
+    """Adds a notification to the list of notifications and saves it"""
+    if notification is None:
+        return
+    notifications.append(notification)
+    if save:
+        storage.save_notification(notification)
+    events.publish('notification_added', notification)
+
+def remove_notification(title: str, save: bool = True) -> dict:
+    """Deletes the oldest notification with a title and returns it, or None if there is none"""
+    for notification in notifications: #searches and deletes notification to be deleted
+        if notification["title"] == title:
+            notifications.remove(notification)
+            if save:
+                storage.delete_notification(title)
+            events.publish('notification_removed', {'title': title})
+            return notification
+    return None
+
+def sync_cluster() -> None:
+    """Applies the changes made by the other processes sharing the alarms
+
+    Runs every CLUSTER_INTERVAL seconds.
+    """
+    global last_change
+    s.enter(CLUSTER_INTERVAL, 2, sync_cluster,())
+    for change, kind, title in storage.changes_since(last_change):
+        last_change = change
+        if kind == 'alarm_saved':
+            alarm = storage.load_alarm(title)
+            if alarm is not None: #the alarm may have been deleted again since
+                alarm['schedule'] = None
+                remove_alarms([title], save=False) #a recurring alarm is saved again when it moves on
+                add_alarms([alarm], save=False)
+        elif kind == 'alarm_deleted':
+            remove_alarms([title], save=False)
+        elif kind == 'notification_saved':
+            add_notification(storage.load_notification(title), save=False)
+        elif kind == 'notification_deleted':
+            remove_notification(title, save=False)
+
+def prune_cluster() -> None:
+    """Deletes old leases and logged changes once an hour"""
+    s.enter(3600, 2, prune_cluster,())
+    cluster.prune()
+    storage.prune_changes()
+
+def restore_state() -> None:
+    """Loads the saved alarms and notifications
+
+    The alarms are only scheduled once their day comes, by promote_alarms.
+    """
+    global last_change
+    last_change = storage.last_change() #changes made before the alarms are loaded are already in them
+    for alarm in storage.load_alarms():
+        alarm['schedule'] = None
+        alarms.add(alarm)
+    notifications.extend(storage.load_notifications())
+    logging.info('%d alarms and %d notifications restored', len(alarms), len(notifications))
+    
+def promote_alarms() -> None:
+    """Schedules the alarms for every day that has begun and waits for the next midnight
+
+    Alarms for future days are held in the alarm registry's date index and are only
+    added to the scheduler when their day begins. Days that were missed while the
+    program was asleep or not running are promoted too, so their alarms go off late
+    rather than not at all.
+    """
+    s.enterabs(next_midnight(time.time()), 1, promote_alarms,())
+    for date in alarms.pop_dates_until(current_time()):
+        for alarm in alarms.on_date(date):
+            if alarm['schedule'] is None:
+                schedule_alarm(alarm)
+                logging.debug('alarm %s has been added to schedule', alarm['title'])
+
+def create_services() -> None:
+    """Creates the speech pipeline, the cluster and the storage unless they already exist
+
+    They are not created when main is imported, as they make the tts_cache folder,
+    open alarms.db and start the storage's writer thread.
+    """
+    global speech, speech_queue, cluster, storage
+    if speech is None:
+        speech = SpeechPipeline()
+        speech_queue = SpeechQueue(speech)
+    if cluster is None and cluster_settings.get("enabled"): #several processes share the alarms in alarms.db
+        cluster = Cluster('alarms.db', lease_time=cluster_settings.get("lease-time", 30),
+                          member_timeout=3 * cluster_settings.get("poll-interval", 1) + 2)
+    if storage is None:
+        storage = AlarmStorage('alarms.db', owner=cluster and cluster.owner)
+
+def start_background_tasks() -> None:
+    """Restores the saved state and starts the threads the application needs
+
+    The notifications are first refreshed in the background, so the application
+    serves requests without waiting for the APIs to answer.
+    """
+    configure_logging()
+    create_services()
+    restore_state()
+    update_notif()
+    s.enter(1, 2, prefetch_weather,())
+    if cluster is not None:
+        cluster.start(CLUSTER_INTERVAL) #keeps this process's share of the alarms
+        s.enter(CLUSTER_INTERVAL, 2, sync_cluster,())
+        s.enter(3600, 2, prune_cluster,())
+    promote_alarms()
+    config.watch() #changes to config.json are applied without a restart
+    speech_queue.start()
+    s.start() #alarms are fired by the engine's own thread
+
+def stop_background_tasks() -> None:
+    """Stops the background threads and writes any unsaved changes"""
+    events.close()
+    s.stop()
+    config.stop_watching()
+    speech_queue.stop()
+    if notification_refresh is not None and not notification_refresh.cancel():
+        wait([notification_refresh], timeout=10) #a refresh under way is given time to save its notifications
+    storage.close()
+    if cluster is not None:
+        cluster.leave() #the other processes take over this process's alarms straight away
+
+if __name__ == '__main__':
+    #lauches the application
+    start_background_tasks()
+    app.run()
+    
@@ -0,0 +1,237 @@
+"""
+This module collects measurements of how the program is performing, such as how
+long the APIs take to answer, how late alarms go off and how full the queues are.
+Recording a measurement only updates a few numbers under a lock, so it can be done
+on every request and every alarm. The measurements are served from /metrics in the
+Prometheus text format.
+"""
+
+
+import bisect
+import math
+import threading
+import time
+
+#upper bounds in seconds of the histogram buckets, from a few milliseconds to minutes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    """Formats label names and values as they appear after a metric's name
+
+    Keyword arguments:
+    names -- the names of the labels
+    values -- the value of each label
+    extra -- an already formatted label added at the end, such as a bucket's bound
+    """
+    pairs = ['%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def format_value(value: float) -> str:
+    """Formats a number as Prometheus expects it"""
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """A count that only goes up, such as the number of failed requests
+
+    Keyword arguments:
+    name -- name of the metric
+    documentation -- what the metric counts
+    labels -- names of the labels the count is split by
+    """
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, labels: tuple = ()) -> None:
+        """Adds to the count for the given label values"""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: tuple = ()) -> float:
+        """Returns the count for the given label values"""
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        """Yields the lines of the metric in the text format"""
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield '%s%s %s' % (self.name, format_labels(self.labels, labels), format_value(value))
+
+
+class Gauge:
+    """A value read when the metrics are collected, such as the length of a queue
+
+    Keyword arguments:
+    name -- name of the metric
+    documentation -- what the metric measures
+    read -- function taking no arguments returning the value, or a dictionary of
+            values keyed by a tuple of label values
+    labels -- names of the labels, if read returns a dictionary
+    """
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, read, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.labels = tuple(labels)
+
+    def samples(self):
+        """Yields the lines of the metric in the text format"""
+        values = self.read()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            yield '%s%s %s' % (self.name, format_labels(self.labels, labels), format_value(value))
+
+
+class _Series:
+    """The bucket counts of a histogram for one set of label values"""
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * buckets
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """Counts measurements, such as durations, in buckets of increasing size
+
+    Keyword arguments:
+    name -- name of the metric
+    documentation -- what the metric measures
+    labels -- names of the labels the measurements are split by
+    buckets -- upper bound of each bucket, in increasing order
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        """Records one measurement for the given label values"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = _Series(len(self.buckets))
+            series.counts[index] += 1
+            series.sum += value
+            series.count += 1
+
+    def time(self, labels: tuple = ()):
+        """Returns a context manager that records how many seconds its body takes"""
+        return _Timer(self, labels)
+
+    def count(self, labels: tuple = ()) -> int:
+        """Returns the number of measurements recorded for the given label values"""
+        series = self._series.get(labels)
+        return 0 if series is None else series.count
+
+    def total(self, labels: tuple = ()) -> float:
+        """Returns the sum of the measurements recorded for the given label values"""
+        series = self._series.get(labels)
+        return 0.0 if series is None else series.sum
+
+    def samples(self):
+        """Yields the lines of the metric in the text format, with cumulative buckets"""
+        with self._lock:
+            series = sorted((labels, list(s.counts), s.sum, s.count) for labels, s in self._series.items())
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                yield '%s_bucket%s %d' % (self.name, format_labels(self.labels, labels, 'le="%s"' % format_value(bound)), cumulative)
+            yield '%s_sum%s %s' % (self.name, format_labels(self.labels, labels), format_value(total))
+            yield '%s_count%s %d' % (self.name, format_labels(self.labels, labels), count)
+
+
+class _Timer:
+    """Records the time taken by the body of a with statement in a histogram"""
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, self.labels)
+
+
+class Registry:
+    """Holds the metrics of the program and renders them for /metrics
+
+    Creating a metric with a name already in the registry returns the existing
+    metric, so a module can be imported more than once without error.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if existing.kind != metric.kind:
+                    raise ValueError('metric %s is already a %s' % (metric.name, existing.kind))
+                if metric.kind == 'gauge':
+                    existing.read = metric.read
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()) -> Counter:
+        """Returns the counter with a name, creating it if needed"""
+        return self._add(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        """Returns the histogram with a name, creating it if needed"""
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name: str, documentation: str, read, labels: tuple = ()) -> Gauge:
+        """Registers a gauge whose value is read by a function, replacing any with the same name"""
+        return self._add(Gauge(name, documentation, read, labels))
+
+    def get(self, name: str):
+        """Returns the metric with a name, or None if there is none"""
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.documentation))
+            lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry() #the metrics served from /metrics
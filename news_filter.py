@@ -0,0 +1,152 @@
+"""
+This module picks the news article used for news notifications. Articles are decoded
+one at a time as the response arrives, so the rest of the response does not have to
+be downloaded or parsed once a relevant article has been found. Relevance is scored
+with a matcher built from the keywords and sources set in config.json.
+"""
+
+
+import codecs
+import json
+import re
+
+DEFAULT_KEYWORDS = ("Covid",)
+DEFAULT_SOURCES = ("BBC News",)
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'\s*')
+
+
+class _Reader:
+    """Decodes JSON values from a stream of text or byte chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.position = 0
+
+    def _more(self) -> bool:
+        """Adds the next chunk to the buffer, returns False if there are none left"""
+        for chunk in self.chunks:
+            if isinstance(chunk, bytes):
+                chunk = self.decoder.decode(chunk)
+            if chunk:
+                self.buffer = self.buffer[self.position:] + chunk #consumed text is dropped
+                self.position = 0
+                return True
+        return False
+
+    def peek(self) -> str:
+        """Returns the next character that is not whitespace, or '' at the end"""
+        while True:
+            self.position = _whitespace.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._more():
+                return ''
+
+    def expect(self, character: str) -> None:
+        """Consumes a character, raising ValueError if it is not the next one"""
+        if self.peek() != character:
+            raise ValueError('expected %r at position %d' % (character, self.position))
+        self.position += 1
+
+    def value(self):
+        """Decodes and consumes the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.position)
+                if end < len(self.buffer) or not isinstance(value, (int, float)):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                pass
+            if not self._more(): #the value may continue in the next chunk
+                value, self.position = _decoder.raw_decode(self.buffer, self.position)
+                return value
+
+
+def iter_articles(chunks):
+    """Yields the articles of a news API response as they are decoded
+
+    Keyword arguments:
+    chunks -- the response body as an iterable of text or byte chunks
+    """
+    reader = _Reader(chunks)
+    reader.expect('{')
+    while reader.peek() not in ('}', ''):
+        key = reader.value()
+        reader.expect(':')
+        if key != 'articles':
+            reader.value() #other values such as the status are skipped
+        else:
+            reader.expect('[')
+            while reader.peek() not in (']', ''):
+                yield reader.value()
+                if reader.peek() == ',':
+                    reader.expect(',')
+            reader.expect(']')
+        if reader.peek() == ',':
+            reader.expect(',')
+
+
+class NewsMatcher:
+    """Scores how relevant an article is
+
+    A keyword in the title scores 2, a keyword in the description scores 1 and an
+    article from one of the sources scores 1. Keywords are matched as whole words,
+    ignoring case.
+
+    Keyword arguments:
+    keywords -- words that make an article relevant
+    sources -- names of news sources whose articles are relevant
+    """
+
+    def __init__(self, keywords=DEFAULT_KEYWORDS, sources=DEFAULT_SOURCES):
+        self.keywords = tuple(keywords)
+        self.sources = frozenset(sources)
+        pattern = '|'.join(re.escape(keyword) for keyword in self.keywords) or r'(?!)'
+        self.pattern = re.compile(r'\b(?:' + pattern + r')\b', re.IGNORECASE)
+
+    @classmethod
+    def from_config(cls, config) -> 'NewsMatcher':
+        """Builds a matcher from the news-filter settings in config.json"""
+        settings = config.get("news-filter", {})
+        return cls(settings.get("keywords", DEFAULT_KEYWORDS), settings.get("sources", DEFAULT_SOURCES))
+
+    def score(self, article: dict) -> int:
+        """Returns how relevant an article is, 0 if it is not relevant at all"""
+        score = 0
+        if self.pattern.search(article.get("title") or ''):
+            score += 2
+        if self.pattern.search(article.get("description") or ''):
+            score += 1
+        if (article.get("source") or {}).get("name") in self.sources:
+            score += 1
+        return score
+
+
+def find_article(articles, matcher: NewsMatcher, good_enough: int = 2) -> dict:
+    """Returns the most relevant article, stopping at the first one that is good enough
+
+    If no article reaches the good_enough score, the most relevant one is returned,
+    or None if no article is relevant. With the default of 2 the search stops at the
+    first article with a keyword in its title. An article that only has a keyword
+    in its description, or only comes from one of the sources, does not stop it, as
+    an article with the keyword in its title may follow, so when no title has a
+    keyword every article is read.
+
+    Keyword arguments:
+    articles -- iterable of articles, only read as far as needed
+    matcher -- scores the articles
+    good_enough -- score at which the search stops
+    """
+    best, best_score = None, 0
+    for article in articles:
+        score = matcher.score(article)
+        if score > best_score:
+            best, best_score = article, score
+            if score >= good_enough:
+                break
+    return best
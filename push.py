@@ -0,0 +1,192 @@
+"""
+This module pushes changes to the alarms and notifications to every open page using
+Server-Sent Events. Each change is sent as a small event describing what changed, so
+pages are kept up to date without refreshing or rendering the whole page again.
+"""
+
+
+import asyncio
+import itertools
+import json
+import logging
+import queue
+import threading
+
+
+def format_event(event_id: int, kind: str, data) -> bytes:
+    """Formats an event as a Server-Sent Events message"""
+    return ('id: %d\nevent: %s\ndata: %s\n\n' % (event_id, kind, json.dumps(data))).encode('utf-8')
+
+
+class Subscription:
+    """The queue of events waiting to be sent to one page
+
+    Keyword arguments:
+    broker -- the broker the subscription receives events from
+    maxsize -- number of events that can wait before the page is disconnected
+    """
+
+    def __init__(self, broker: 'EventBroker', maxsize: int):
+        self.broker = broker
+        self.queue = queue.Queue(maxsize)
+
+    def put_nowait(self, message: bytes) -> None:
+        """Queues a message, raising queue.Full if the page has fallen too far behind"""
+        self.queue.put_nowait(message)
+
+    def end(self) -> None:
+        """Queues the end of the stream, making room for it if the queue is full"""
+        try:
+            if self.queue.full():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+        except (queue.Empty, queue.Full):
+            pass
+
+    def messages(self, heartbeat: float = 15):
+        """Yields messages to send to the page until it is disconnected
+
+        A comment is sent when there have been no events for the heartbeat interval
+        so that connections to pages that have been closed are noticed.
+        """
+        try:
+            while True:
+                try:
+                    message = self.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    message = b': keep-alive\n\n'
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.broker.unsubscribe(self)
+
+
+class AsyncSubscription(Subscription):
+    """The queue of events waiting to be sent to one page by an asyncio event loop
+
+    Events can be published from any thread, they are handed to the loop that
+    streams them so the page does not need a thread of its own.
+
+    Keyword arguments:
+    broker -- the broker the subscription receives events from
+    maxsize -- number of events that can wait before the page is disconnected
+    loop -- the event loop the messages are read on
+    """
+
+    def __init__(self, broker: 'EventBroker', maxsize: int, loop: asyncio.AbstractEventLoop):
+        self.broker = broker
+        self.maxsize = maxsize
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def put_nowait(self, message: bytes) -> None:
+        if self.queue.qsize() >= self.maxsize:
+            raise queue.Full
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, message)
+        except RuntimeError: #the loop has been closed, so the page is treated as fallen behind
+            raise queue.Full from None
+
+    def end(self) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+        except RuntimeError:
+            pass
+
+    async def messages(self, heartbeat: float = 15):
+        """Yields messages to send to the page until it is disconnected"""
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(self.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    message = b': keep-alive\n\n'
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """Sends each published event to every subscribed page
+
+    A page that falls too far behind is disconnected instead of slowing down the
+    others; the browser reconnects by itself and is sent the current state again.
+
+    Keyword arguments:
+    maxsize -- number of events that can wait for a page before it is disconnected
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.published = 0
+        self.disconnected = 0
+        self._ids = itertools.count(1)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, snapshot=None, loop: asyncio.AbstractEventLoop = None) -> Subscription:
+        """Subscribes a page, optionally queueing an event with the current state
+
+        The page is subscribed before the snapshot is taken, so no change made
+        meanwhile is missed. Events published while the snapshot is being taken
+        may reach the page before it; the snapshot replaces whatever they showed.
+
+        Keyword arguments:
+        snapshot -- function returning the data sent to the page as a 'snapshot' event, or the data itself
+        loop -- event loop the messages are read on, if they are not read by a thread
+        """
+        if loop is None:
+            subscription = Subscription(self, self.maxsize)
+        else:
+            subscription = AsyncSubscription(self, self.maxsize, loop)
+        with self._lock:
+            self._subscribers.add(subscription)
+        if snapshot is not None:
+            data = snapshot() if callable(snapshot) else snapshot
+            try:
+                subscription.put_nowait(format_event(next(self._ids), 'snapshot', data))
+            except queue.Full: #so many changes were made while the snapshot was taken that the page fell behind
+                self._disconnect(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Stops sending events to a page"""
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, kind: str, data) -> None:
+        """Sends an event to every subscribed page
+
+        Keyword arguments:
+        kind -- name of the event, for example 'alarm_added'
+        data -- information about the change, which must be JSON serialisable
+        """
+        message = format_event(next(self._ids), kind, data) #formatted once for every page
+        with self._lock:
+            subscribers = list(self._subscribers)
+        self.published += 1
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(message)
+            except queue.Full:
+                logging.warning('page fell behind and was disconnected from events')
+                self.disconnected += 1
+                self._disconnect(subscription)
+
+    def _disconnect(self, subscription: Subscription) -> None:
+        """Unsubscribes a page and ends its stream of messages"""
+        self.unsubscribe(subscription)
+        subscription.end()
+
+    def close(self) -> None:
+        """Disconnects every subscribed page"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            self._disconnect(subscription)
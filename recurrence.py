@@ -0,0 +1,206 @@
+"""
+This module works out when recurring alarms go off. A recurrence rule is kept as the
+short text the user gave, such as "weekdays" or "30 6 * * 1-5", and is only expanded
+to its next occurrence when that is needed, so a rule never fills the scheduler with
+future occurrences. Times are wall clock times in a time zone, so an alarm set for
+07:00 still goes off at 07:00 after the clocks change.
+"""
+
+
+from datetime import datetime
+from datetime import timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+from zoneinfo import ZoneInfoNotFoundError
+
+#the presets give the day of month, month and day of week fields, the alarm's time gives the rest
+PRESETS = {'daily': '* * *', 'weekdays': '* * 1-5', 'weekends': '* * 0,6'}
+#name, lowest and highest value of each field of a cron expression
+FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day of month', 1, 31), ('month', 1, 12), ('day of week', 0, 7))
+NAMES = {
+    'month': {name: number for number, name in enumerate(
+        ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1)},
+    'day of week': {name: number for number, name in enumerate(('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'))},
+}
+SEARCH_DAYS = 366 * 8 + 2 #long enough for a rule that only matches on the 29th of February
+CLOCK_CHANGE = 3600 #seconds the clocks move forward by, at most, in the time zones in use
+
+
+def lowest_bit(mask: int) -> int:
+    """Returns the position of the lowest bit set in a mask"""
+    return (mask & -mask).bit_length() - 1
+
+def parse_field(text: str, name: str, low: int, high: int) -> int:
+    """Converts one field of a cron expression into a mask with a bit set for each value it matches
+
+    Raises ValueError if the field is not valid.
+
+    Keyword arguments:
+    text -- the field, made of comma separated values, ranges like 1-5, * and steps like */15
+    name -- name of the field, used in error messages and to look up month and day names
+    low -- lowest value the field can have
+    high -- highest value the field can have
+    """
+    names = NAMES.get(name, {})
+    mask = 0
+    for part in text.lower().split(','):
+        values, _, step = part.partition('/')
+        try:
+            step = int(step) if step else 1
+            if values == '*':
+                first, last = low, high
+            else:
+                first, dash, last = values.partition('-')
+                first = names[first] if first in names else int(first)
+                last = (names[last] if last in names else int(last)) if dash else first
+        except ValueError:
+            raise ValueError('%s "%s" is not a number, a range or *' % (name, part)) from None
+        if not low <= first <= last <= high or step < 1:
+            raise ValueError('%s "%s" must be between %d and %d' % (name, part, low, high))
+        for value in range(first, last + 1, step):
+            mask |= 1 << value
+    return mask
+
+
+class Rule:
+    """When a recurring alarm goes off, held as a mask of the values each field matches
+
+    Rules are shared by every alarm with the same recurrence, see parse_rule.
+
+    Keyword arguments:
+    minutes -- mask of the minutes of the hour matched
+    hours -- mask of the hours of the day matched
+    days -- mask of the days of the month matched
+    months -- mask of the months matched
+    weekdays -- mask of the days of the week matched, Sunday being 0
+    any_day -- True if the day of month field started with *
+    any_weekday -- True if the day of week field started with *
+    """
+
+    __slots__ = ('minutes', 'hours', 'days', 'months', 'weekdays', 'any_day', 'any_weekday')
+
+    def __init__(self, minutes: int, hours: int, days: int, months: int, weekdays: int,
+                 any_day: bool = False, any_weekday: bool = False):
+        self.minutes = minutes
+        self.hours = hours
+        self.days = days
+        self.months = months
+        self.weekdays = weekdays
+        self.any_day = any_day
+        self.any_weekday = any_weekday
+
+    def matches_day(self, day) -> bool:
+        """Checks whether the rule goes off at some time on a date
+
+        As in cron, a day matches either of the day of month and day of week
+        fields when both are given, and has to match the one given otherwise.
+        """
+        if not self.months >> day.month & 1:
+            return False
+        on_day = self.days >> day.day & 1
+        on_weekday = self.weekdays >> day.isoweekday() % 7 & 1
+        if self.any_day or self.any_weekday:
+            return bool(on_day and on_weekday)
+        return bool(on_day or on_weekday)
+
+    def next_time(self, hour: int, minute: int) -> tuple:
+        """Returns the earliest hour and minute the rule matches at or after a time of day, or None"""
+        if self.hours >> hour & 1:
+            later = self.minutes >> minute
+            if later:
+                return hour, minute + lowest_bit(later)
+            hour += 1
+        later = self.hours >> hour
+        if not later:
+            return None
+        return hour + lowest_bit(later), lowest_bit(self.minutes)
+
+    def next_after(self, after: float, tz: ZoneInfo) -> datetime:
+        """Returns the wall clock time of the first occurrence later than a time
+
+        A time skipped when the clocks go forward goes off as far after the skipped
+        time as the clocks moved, and a time repeated when they go back goes off only
+        the first time round.
+
+        Raises ValueError if the rule never matches, such as on the 31st of February.
+
+        Keyword arguments:
+        after -- seconds since the epoch
+        tz -- the time zone the rule's times are in
+        """
+        local = datetime.fromtimestamp(after, tz)
+        earlier = datetime.fromtimestamp(after - CLOCK_CHANGE, tz)
+        if earlier.utcoffset() < local.utcoffset():
+            local = earlier #the clocks have just gone forward, so a skipped time may still be due
+        day = local.date()
+        hour, minute = local.hour, local.minute
+        for _ in range(SEARCH_DAYS):
+            if self.matches_day(day):
+                found = self.next_time(hour, minute)
+                while found is not None:
+                    wall = datetime(day.year, day.month, day.day, found[0], found[1], tzinfo=tz)
+                    if wall.timestamp() > after:
+                        return wall
+                    found = self.next_time(found[0], found[1] + 1)
+            day += timedelta(days=1)
+            hour, minute = 0, 0
+        raise ValueError('the recurrence never goes off')
+
+
+def parse_rule(text: str, at: str = None) -> Rule:
+    """Converts a recurrence into a rule, the same rule being returned for the same recurrence
+
+    Raises ValueError if the recurrence is not valid.
+
+    Keyword arguments:
+    text -- daily, weekdays, weekends or a cron expression of the minute, hour,
+            day of month, month and day of week, such as "30 6 * * 1-5"
+    at -- the time formatted as HH:MM the presets go off at, not used by cron expressions
+    """
+    if not isinstance(text, str):
+        raise ValueError('a recurrence must be daily, weekdays, weekends or a cron expression')
+    preset = PRESETS.get(text.strip().lower())
+    if preset is not None:
+        try:
+            hour, minute = (int(value) for value in str(at).split(':'))
+        except ValueError:
+            raise ValueError('a %s recurrence needs a time formatted as HH:MM' % text.strip()) from None
+        text = '%d %d %s' % (minute, hour, preset)
+    return compile_rule(' '.join(text.lower().split()))
+
+@lru_cache(maxsize=65536)
+def compile_rule(expression: str) -> Rule:
+    """Converts a cron expression into a rule, every alarm with the same expression sharing one rule"""
+    fields = expression.split()
+    if len(fields) != len(FIELDS):
+        raise ValueError('a recurrence must be daily, weekdays, weekends or a cron expression with five fields')
+    masks = [parse_field(field, *spec) for field, spec in zip(fields, FIELDS)]
+    weekdays = masks[4]
+    if weekdays >> 7 & 1: #Sunday can be written as 7 as well as 0
+        weekdays = (weekdays | 1) & 0x7f
+    return Rule(masks[0], masks[1], masks[2], masks[3], weekdays,
+                any_day=fields[2].startswith('*'), any_weekday=fields[4].startswith('*'))
+
+@lru_cache(maxsize=None)
+def zone(name: str) -> ZoneInfo:
+    """Returns a time zone from its name, such as Europe/London
+
+    Raises ValueError if there is no time zone with that name.
+    """
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        raise ValueError('there is no time zone called %s' % name) from None
+
+def local_epoch(date: str, wall_time: str, tz: ZoneInfo) -> float:
+    """Returns the seconds since the epoch of a wall clock time in a time zone
+
+    A time skipped or repeated when the clocks change is treated the same way
+    as Rule.next_after treats it.
+
+    Keyword arguments:
+    date -- the date formatted as YYYY-MM-DD
+    wall_time -- the time formatted as HH:MM
+    tz -- the time zone of the date and time
+    """
+    return datetime.strptime(date + ' ' + wall_time, '%Y-%m-%d %H:%M').replace(tzinfo=tz).timestamp()
@@ -0,0 +1,273 @@
+"""
+This module turns announcements into speech. A single text to speech engine is kept
+for the life of the program and announcements are rendered to audio files ahead of
+time, so when an alarm goes off it only has to play audio that already exists.
+Rendered audio is stored in a cache named after a hash of the text, so phrases that
+are repeated, such as an alarm's title, are only ever synthesised once.
+Announcements are spoken by a worker thread fed from a queue, so nothing that
+schedules or serves alarms ever waits for audio to finish.
+"""
+
+
+import hashlib
+import itertools
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import wave
+from metrics import registry
+
+#command line players tried in turn when simpleaudio is not installed, the file is added to the end
+PLAYERS = (('afplay',), ('aplay', '-q'), ('paplay',), ('ffplay', '-nodisp', '-autoexit', '-loglevel', 'quiet'))
+ALARM_PRIORITY = 0 #alarm briefings are read before, and cut short, speech asked for on demand
+REQUEST_PRIORITY = 1
+SYNTHESIS_SECONDS = registry.histogram('tts_synthesis_seconds', 'Seconds taken to synthesise an announcement that was not cached')
+
+
+class Pyttsx3Backend:
+    """Synthesises speech with pyttsx3 and plays the rendered audio files
+
+    Audio is played with winsound on Windows, simpleaudio if it is installed or
+    otherwise the first of the PLAYERS found, such as aplay on Linux or afplay on
+    macOS. Without any of them, the text is spoken directly by the engine instead.
+
+    Keyword arguments:
+    player -- command that plays an audio file given after it, found on the PATH if None
+    """
+
+    def __init__(self, player: list = None):
+        self._engine = None
+        self._lock = threading.Lock() #the engine cannot render and speak at the same time
+        self.player = player if player is not None else next(
+            (list(command) for command in PLAYERS if shutil.which(command[0])), None)
+
+    @property
+    def engine(self):
+        """The text to speech engine, started the first time it is needed"""
+        if self._engine is None:
+            import pyttsx3 #slow to import, so only imported once speech is needed
+            self._engine = pyttsx3.init()
+        return self._engine
+
+    def render(self, text: str, path: str) -> None:
+        """Synthesises text into an audio file"""
+        with self._lock:
+            self.engine.save_to_file(text, path)
+            self.engine.runAndWait()
+
+    def play(self, path: str, text: str) -> None:
+        """Plays an audio file, waiting until it has finished"""
+        if sys.platform == 'win32':
+            import winsound
+            winsound.PlaySound(path, winsound.SND_FILENAME)
+            return
+        try:
+            import simpleaudio
+        except ImportError:
+            simpleaudio = None
+        if simpleaudio is not None:
+            simpleaudio.WaveObject.from_wave_file(path).play().wait_done()
+        elif self.player:
+            subprocess.run(self.player + [path], check=False)
+        else:
+            with self._lock: #a briefing being rendered ahead of time waits until this is spoken
+                self.engine.say(text)
+                self.engine.runAndWait()
+
+
+class NullBackend:
+    """A backend that produces silent audio and plays nothing
+
+    Used when there is no audio device, such as on a headless server or in tests.
+    The texts that would have been played are recorded in the played list.
+    """
+
+    def __init__(self):
+        self.played = []
+
+    def render(self, text: str, path: str) -> None:
+        """Writes an empty audio file"""
+        with wave.open(path, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(22050)
+
+    def play(self, path: str, text: str) -> None:
+        """Records the text instead of playing it"""
+        self.played.append(text)
+
+
+class SpeechPipeline:
+    """Renders announcements to a cache of audio files and plays them
+
+    Keyword arguments:
+    backend -- object with render(text, path) and play(path, text) methods
+    cache_dir -- directory the rendered audio files are kept in
+    max_files -- number of audio files kept before the oldest are deleted
+    """
+
+    def __init__(self, backend=None, cache_dir: str = 'tts_cache', max_files: int = 500):
+        self.backend = backend or Pyttsx3Backend()
+        self.cache_dir = cache_dir
+        self.max_files = max_files
+        self.rendered = 0
+        self.cached = 0
+        self._lock = threading.Lock() #the engine can only synthesise one text at a time
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def audio_path(self, text: str) -> str:
+        """Returns where the audio for a text is stored in the cache"""
+        return os.path.join(self.cache_dir, hashlib.sha256(text.encode('utf-8')).hexdigest() + '.wav')
+
+    def render(self, text: str) -> str:
+        """Renders text to audio unless it is already cached and returns the file's path"""
+        path = self.audio_path(text)
+        if os.path.exists(path):
+            os.utime(path) #marks the file as recently used
+            self.cached += 1
+            return path
+        with self._lock:
+            if not os.path.exists(path):
+                partial = path + '.part.wav'
+                with SYNTHESIS_SECONDS.time():
+                    self.backend.render(text, partial)
+                os.replace(partial, path) #the file only appears in the cache once it is complete
+                self.rendered += 1
+        return path
+
+    def hit_ratio(self) -> float:
+        """Returns the fraction of texts whose audio was already in the cache"""
+        lookups = self.cached + self.rendered
+        return self.cached / lookups if lookups else 0.0
+
+    def prerender(self, texts: list) -> list:
+        """Renders every text ahead of time and returns the paths of the audio files"""
+        paths = [self.render(text) for text in texts]
+        self.prune()
+        logging.info('%d announcements rendered ahead of time', len(paths))
+        return paths
+
+    def speak(self, texts: list) -> None:
+        """Plays every text in order, rendering any that are not cached yet"""
+        for text in texts:
+            self.backend.play(self.render(text), text)
+
+    def prune(self) -> None:
+        """Deletes the least recently used audio files over the cache's limit"""
+        files = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith('.wav')]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda path: os.stat(path).st_mtime)
+        for path in files[:len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def merge_briefings(briefings: list) -> list:
+    """Combines the announcements of alarms that went off together into one briefing
+
+    The first announcement of each alarm, which says that it has gone off, is read
+    first and every other announcement is only read once.
+
+    Keyword arguments:
+    briefings -- lists of announcements, one for each alarm
+    """
+    merged = [briefing[0] for briefing in briefings if briefing]
+    for briefing in briefings:
+        for announcement in briefing[1:]:
+            if announcement not in merged:
+                merged.append(announcement)
+    return merged
+
+
+class SpeechQueue:
+    """Speaks announcements one briefing at a time on a worker thread
+
+    Briefings are queued by priority, a lower number being more urgent. Briefings
+    waiting in the queue when the worker becomes free are merged into one, and a
+    briefing that is being read is cut short when a briefing of the same or a
+    more urgent priority is queued.
+
+    Keyword arguments:
+    pipeline -- the speech pipeline used to render and play the announcements
+    maxsize -- number of briefings that can wait before new ones are dropped
+    """
+
+    def __init__(self, pipeline: SpeechPipeline, maxsize: int = 16):
+        self.pipeline = pipeline
+        self.interrupted = 0
+        self.dropped = 0
+        self._queue = queue.PriorityQueue(maxsize)
+        self._sequence = itertools.count()
+        self._thread = None
+
+    def say(self, announcements: list, priority: int = REQUEST_PRIORITY) -> bool:
+        """Queues a briefing without waiting, returns False if the queue is full
+
+        Keyword arguments:
+        announcements -- the texts to be read, in order
+        priority -- ALARM_PRIORITY for an alarm's briefing, REQUEST_PRIORITY for speech asked for on demand
+        """
+        try:
+            self._queue.put_nowait((priority, next(self._sequence), list(announcements)))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logging.warning('speech queue is full, briefing dropped')
+            return False
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def _preempted(self, priority: int) -> bool:
+        """Checks whether a briefing at least as urgent is waiting"""
+        with self._queue.mutex:
+            waiting = self._queue.queue
+            return bool(waiting) and waiting[0][0] <= priority
+
+    def _run(self) -> None:
+        """Main loop of the worker thread"""
+        while True:
+            priority, sequence, announcements = self._queue.get()
+            if announcements is None:
+                return
+            briefings = [announcements]
+            while True: #briefings that queued up while the worker was busy are merged
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item[2] is None:
+                    self._queue.put(item)
+                    break
+                priority = min(priority, item[0])
+                briefings.append(item[2])
+            for announcement in merge_briefings(briefings):
+                if self._preempted(priority):
+                    self.interrupted += 1
+                    logging.info('briefing cut short by a new alarm')
+                    break
+                try:
+                    self.pipeline.speak([announcement])
+                except Exception:
+                    logging.exception('announcement could not be spoken')
+
+    def start(self) -> None:
+        """Starts the worker thread if it is not already running"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='speech', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Stops the worker thread, cutting short any briefing being read"""
+        if self._thread is None:
+            return
+        self._queue.put((-1, next(self._sequence), None))
+        self._thread.join(timeout)
+        self._thread = None
@@ -0,0 +1,236 @@
+"""
+This module stores alarms and notifications in an SQLite database so that they survive
+a restart. The database runs in write-ahead logging mode and changes are written in
+batches by a background thread, so saving an alarm never waits for the disk.
+"""
+
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+ALARM_FIELDS = ('title', 'content', 'date', 'time', 'news', 'weather', 'location', 'repeat')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS alarms (
+    title TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    news INTEGER NOT NULL,
+    weather INTEGER NOT NULL,
+    location TEXT,
+    repeat TEXT
+);
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    title TEXT NOT NULL,
+    time REAL NOT NULL
+);
+'''
+
+INSERT_ALARM = 'INSERT OR REPLACE INTO alarms (%s) VALUES (%s)' % (', '.join(ALARM_FIELDS), ', '.join('?' * len(ALARM_FIELDS)))
+
+
+def alarm_from_row(row: tuple) -> dict:
+    """Converts a row of the alarms table into an alarm"""
+    alarm = dict(zip(ALARM_FIELDS, row))
+    alarm['news'] = bool(alarm['news'])
+    alarm['weather'] = bool(alarm['weather'])
+    return alarm
+
+def connect(path: str, shared: bool = False) -> sqlite3.Connection:
+    """Opens the database in write-ahead logging mode and creates its tables
+
+    Keyword arguments:
+    path -- location of the database file
+    shared -- True for a connection used by several threads, which must take turns
+    """
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=not shared)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    columns = [row[1] for row in connection.execute('PRAGMA table_info(alarms)')]
+    if 'location' not in columns: #databases saved before alarms had their own location
+        connection.execute('ALTER TABLE alarms ADD COLUMN location TEXT')
+    if 'repeat' not in columns: #databases saved before alarms could repeat
+        connection.execute('ALTER TABLE alarms ADD COLUMN repeat TEXT')
+    return connection
+
+
+class AlarmStorage:
+    """Saves alarms and notifications to a database in batches
+
+    When an owner is given, every change is also recorded in a log that other
+    processes sharing the database read to pick up the change.
+
+    A change is written at most flush_interval seconds after it is queued, so the
+    changes made in that time are lost if the program crashes. Calling flush waits
+    until they are written. Reads use one connection kept open for the life of the
+    storage, so they do not set up the database again each time.
+
+    Keyword arguments:
+    path -- location of the database file
+    batch_size -- number of changes that are written together
+    flush_interval -- most seconds a change waits before it is written
+    owner -- name of the process making the changes, if they are to be logged
+    """
+
+    def __init__(self, path: str = 'alarms.db', batch_size: int = 500, flush_interval: float = 0.5, owner: str = None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.owner = owner
+        self.batches = 0
+        self._reader = connect(path, shared=True)
+        self._read_lock = threading.Lock()
+        self._changes = queue.Queue()
+        self._writer = threading.Thread(target=self._write, name='storage', daemon=True)
+        self._writer.start()
+
+    def save_alarm(self, alarm: dict) -> None:
+        """Queues an alarm to be saved, replacing any saved alarm with the same title
+
+        An alarm without a location is saved with none, meaning it uses the location
+        set in config.json.
+        """
+        row = tuple(alarm.get(field) for field in ALARM_FIELDS)
+        self._changes.put((INSERT_ALARM, row))
+        self._log('alarm_saved', alarm['title'])
+
+    def save_alarms(self, alarms: list) -> None:
+        """Queues many alarms to be saved"""
+        for alarm in alarms:
+            self.save_alarm(alarm)
+
+    def delete_alarm(self, title: str) -> None:
+        """Queues an alarm to be deleted"""
+        self._changes.put(('DELETE FROM alarms WHERE title = ?', (title,)))
+        self._log('alarm_deleted', title)
+
+    def delete_alarms(self, titles: list) -> None:
+        """Queues many alarms to be deleted"""
+        for title in titles:
+            self.delete_alarm(title)
+
+    def save_notification(self, notification: dict) -> None:
+        """Queues a notification to be saved, one without any content being saved with an empty one"""
+        self._changes.put(('INSERT INTO notifications (title, content) VALUES (?, ?)',
+                           (notification['title'], notification.get('content') or '')))
+        self._log('notification_saved', notification['title'])
+
+    def delete_notification(self, title: str) -> None:
+        """Queues the oldest notification with a title to be deleted"""
+        self._changes.put(('DELETE FROM notifications WHERE id = (SELECT min(id) FROM notifications WHERE title = ?)', (title,)))
+        self._log('notification_deleted', title)
+
+    def _log(self, kind: str, title: str) -> None:
+        """Queues a record of a change for other processes, written in the same batch as the change"""
+        if self.owner is not None:
+            self._changes.put(('INSERT INTO changes (owner, kind, title, time) VALUES (?, ?, ?, ?)',
+                               (self.owner, kind, title, time.time())))
+
+    def prune_changes(self, age: float = 86400) -> None:
+        """Queues the changes logged more than age seconds ago to be deleted"""
+        self._changes.put(('DELETE FROM changes WHERE time < ?', (time.time() - age,)))
+
+    def _write(self) -> None:
+        """Main loop of the writer thread, commits the queued changes in batches"""
+        connection = connect(self.path)
+        while True:
+            batch = [self._changes.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and isinstance(batch[-1], tuple):
+                try:
+                    batch.append(self._changes.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                with connection: #every change in the batch is committed together
+                    for change in batch:
+                        if isinstance(change, tuple):
+                            connection.execute(*change)
+                self.batches += 1
+            except sqlite3.Error:
+                self._write_each(connection, batch) #so one bad change does not lose the rest
+            for change in batch:
+                if isinstance(change, threading.Event):
+                    change.set()
+            if batch[-1] is None:
+                connection.close()
+                return
+
+    def _write_each(self, connection: sqlite3.Connection, batch: list) -> None:
+        """Commits the changes of a batch that could not be committed together one at a time"""
+        for change in batch:
+            if not isinstance(change, tuple):
+                continue
+            try:
+                with connection:
+                    connection.execute(*change)
+            except sqlite3.Error:
+                logging.exception('change could not be saved: %s %r', *change)
+
+    def pending(self) -> int:
+        """Returns the number of queued changes that have not been written yet"""
+        return self._changes.qsize()
+
+    def flush(self, timeout: float = None) -> None:
+        """Waits until every queued change has been written"""
+        written = threading.Event()
+        self._changes.put(written)
+        written.wait(timeout)
+
+    def close(self) -> None:
+        """Writes the queued changes and stops the writer thread"""
+        self._changes.put(None)
+        self._writer.join()
+        with self._read_lock:
+            self._reader.close()
+
+    def _read(self, query: str, parameters: tuple = ()) -> list:
+        """Runs a query on the reader connection and returns every row"""
+        with self._read_lock:
+            return self._reader.execute(query, parameters).fetchall()
+
+    def load_alarms(self):
+        """Yields every saved alarm"""
+        for row in self._read('SELECT %s FROM alarms' % ', '.join(ALARM_FIELDS)):
+            yield alarm_from_row(row)
+
+    def load_alarm(self, title: str) -> dict:
+        """Returns the saved alarm with a title, or None if there is none"""
+        rows = self._read('SELECT %s FROM alarms WHERE title = ?' % ', '.join(ALARM_FIELDS), (title,))
+        return alarm_from_row(rows[0]) if rows else None
+
+    def load_notification(self, title: str) -> dict:
+        """Returns the newest saved notification with a title, or None if there is none"""
+        rows = self._read('SELECT title, content FROM notifications WHERE title = ? ORDER BY id DESC LIMIT 1', (title,))
+        return {'title': rows[0][0], 'content': rows[0][1]} if rows else None
+
+    def load_notifications(self) -> list:
+        """Returns every saved notification in the order they were added"""
+        rows = self._read('SELECT title, content FROM notifications ORDER BY id')
+        return [{'title': title, 'content': content} for title, content in rows]
+
+    def last_change(self) -> int:
+        """Returns the number of the latest change in the log, 0 if there are none"""
+        return self._read('SELECT coalesce(max(id), 0) FROM changes')[0][0]
+
+    def changes_since(self, change: int) -> list:
+        """Returns the changes made by other processes after a change in the log
+
+        Keyword arguments:
+        change -- number of the last change already applied
+        """
+        return self._read('SELECT id, kind, title FROM changes WHERE id > ? AND owner != ? ORDER BY id',
+                          (change, self.owner or ''))
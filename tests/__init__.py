@@ -0,0 +1,3 @@
+"""
+The tests of the alarm clock, run with python -m pytest from the repository's folder.
+"""
@@ -0,0 +1,146 @@
+"""
+Fixtures shared by the tests. No test reaches the real APIs or a speaker: the news,
+weather and Covid-19 APIs are answered by a local stub server and announcements are
+rendered by a fake text to speech backend. The tests run in a temporary folder holding
+a copy of config.json, so the database, log and caches main.py creates never end up
+in the repository.
+"""
+
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+import pytest
+from tests.support import ROOT
+from tests.support import FakeSpeechBackend
+from tests.support import api_routes
+from tests.support import start_stub_server
+
+WORKING_DIRECTORY = tempfile.mkdtemp(prefix='alarm-clock-tests-')
+shutil.copy(os.path.join(ROOT, 'config.json'), WORKING_DIRECTORY)
+os.chdir(WORKING_DIRECTORY) #main.py opens its files relative to the working folder
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import main
+from alarm_engine import AlarmEngine
+from alarm_store import AlarmRegistry
+from covid_store import CovidStore
+from push import EventBroker
+from speech import SpeechPipeline
+from speech import SpeechQueue
+from storage import AlarmStorage
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perf_baselines.json')
+
+
+@pytest.fixture(scope='session', autouse=True)
+def working_directory():
+    """Deletes the temporary folder the tests run in once they have finished"""
+    yield WORKING_DIRECTORY
+    os.chdir(ROOT)
+    shutil.rmtree(WORKING_DIRECTORY, ignore_errors=True)
+
+@pytest.fixture(scope='session')
+def api_server():
+    """A stub server answering like the news, weather and Covid-19 APIs"""
+    server = start_stub_server(api_routes())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def stub_apis(api_server, monkeypatch):
+    """Points main.py at the stub server, with empty caches and no requests recorded yet"""
+    url = 'http://127.0.0.1:%d/' % api_server.server_address[1]
+    monkeypatch.setattr(main, 'NEWS_URL', url + 'news')
+    monkeypatch.setattr(main, 'WEATHER_URL', url + 'weather')
+    monkeypatch.setattr(main, 'COVID_URL', url + 'covid')
+    for cache in (main.news_cache, main.weather_cache, main.covid_cache):
+        cache.invalidate()
+    del api_server.requested[:]
+    yield api_server
+    for cache in (main.news_cache, main.weather_cache, main.covid_cache):
+        cache.invalidate()
+
+@pytest.fixture
+def fake_speech(monkeypatch, tmp_path):
+    """Gives main.py a speech pipeline and queue that use the fake backend
+
+    The queue's worker is not started, so queued briefings wait in the queue.
+    """
+    backend = FakeSpeechBackend()
+    pipeline = SpeechPipeline(backend, cache_dir=str(tmp_path / 'tts_cache'))
+    monkeypatch.setattr(main, 'speech', pipeline)
+    monkeypatch.setattr(main, 'speech_queue', SpeechQueue(pipeline))
+    return backend
+
+@pytest.fixture
+def app_state(monkeypatch, tmp_path):
+    """Gives main.py empty alarms, notifications, scheduler, events and storage
+
+    The scheduler's thread is not started, so tests run due events themselves.
+    """
+    monkeypatch.setattr(main, 's', AlarmEngine())
+    monkeypatch.setattr(main, 'alarms', AlarmRegistry())
+    monkeypatch.setattr(main, 'notifications', [])
+    monkeypatch.setattr(main, 'events', EventBroker())
+    monkeypatch.setattr(main, 'covid_store', CovidStore(str(tmp_path / 'england.npy')))
+    monkeypatch.setattr(main, 'last_change', 0)
+    storage = AlarmStorage(str(tmp_path / 'alarms.db'))
+    monkeypatch.setattr(main, 'storage', storage)
+    yield main
+    storage.close()
+
+
+class Performance:
+    """Times operations and compares them with the baselines in perf_baselines.json
+
+    An operation fails if it takes more than tolerance times its baseline. Setting
+    the UPDATE_PERF_BASELINES environment variable records new baselines instead.
+
+    Keyword arguments:
+    baselines -- microseconds each operation took when the baselines were recorded
+    tolerance -- how many times slower than its baseline an operation may be
+    update -- records the measurements as the new baselines instead of checking them
+    """
+
+    def __init__(self, baselines: dict, tolerance: float, update: bool):
+        self.baselines = baselines
+        self.tolerance = tolerance
+        self.update = update
+        self.measured = {}
+
+    def check(self, name: str, function, number: int = 1000, rounds: int = 5) -> float:
+        """Times a function and returns the microseconds a call took in the fastest round
+
+        Keyword arguments:
+        name -- name of the operation in perf_baselines.json
+        function -- function taking no arguments that performs the operation once
+        number -- calls made in each round
+        rounds -- rounds timed, the fastest is compared so other work on the machine matters less
+        """
+        took = min(timeit.Timer(function).repeat(rounds, number)) / number * 1e6
+        self.measured[name] = round(took, 3)
+        if self.update:
+            return took
+        baseline = self.baselines.get(name)
+        assert baseline is not None, '%s has no baseline, record one with UPDATE_PERF_BASELINES=1: FAILED' % name
+        assert took <= baseline * self.tolerance, '%s performance test: FAILED (%.2fus per call, baseline %.2fus)' % (name, took, baseline)
+        return took
+
+@pytest.fixture(scope='session')
+def performance():
+    """Checks operations against their recorded baselines"""
+    with open(BASELINES, 'r') as f:
+        baselines = json.load(f)
+    checker = Performance(baselines, float(os.environ.get('PERF_TOLERANCE', 3)), bool(os.environ.get('UPDATE_PERF_BASELINES')))
+    yield checker
+    if checker.update and checker.measured:
+        baselines.update(checker.measured)
+        with open(BASELINES, 'w') as f:
+            json.dump(baselines, f, indent=4, sort_keys=True)
+            f.write('\n')
@@ -0,0 +1,200 @@
+"""
+This module holds the stand-ins the tests and benchmarks use instead of the real APIs
+and speakers: a local HTTP server answering with the saved API responses, a text to
+speech backend that writes text instead of audio and the processes of a cluster running main.py.
+"""
+
+
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from alarm_engine import AlarmEngine
+from alarm_store import AlarmRegistry
+from cluster import Cluster
+from storage import AlarmStorage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fixture_path(name: str) -> str:
+    """Returns the location of one of the saved API responses, such as news_test.json"""
+    return os.path.join(ROOT, name)
+
+def load_fixture(name: str) -> dict:
+    """Returns the decoded contents of one of the saved API responses"""
+    with open(fixture_path(name), 'r') as f:
+        return json.load(f)
+
+
+def wall_clock(seconds: float, tz) -> tuple:
+    """Returns the date formatted as YYYY-MM-DD and the time formatted as HH:MM of a time in a time zone
+
+    Keyword arguments:
+    seconds -- seconds since the epoch
+    tz -- the time zone, main.TIMEZONE for the alarms of main.py
+    """
+    local = datetime.fromtimestamp(seconds, tz)
+    return local.strftime('%Y-%m-%d'), local.strftime('%H:%M')
+
+
+def start_stub_server(routes: dict) -> ThreadingHTTPServer:
+    """Starts a local HTTP server that stands in for the APIs
+
+    The path and query parameters of every request are recorded in the server's
+    requested list.
+
+    Keyword arguments:
+    routes -- functions keyed by path, each taking the handler and returning
+              the status code and the body of the response
+    """
+    requested = []
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path, _, query = self.path.partition('?')
+            requested.append((path, dict(urllib.parse.parse_qsl(query))))
+            route = routes.get(path)
+            status, body = route(self) if route else (404, b'{}')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def log_message(self, *args):
+            pass
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.requested = requested
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def delayed_route(delay: float, body: dict):
+    """Returns a stub server route that answers with a JSON body after a delay"""
+    def route(handler):
+        time.sleep(delay)
+        return 200, json.dumps(body).encode()
+    return route
+
+def query(handler) -> dict:
+    """Returns the query parameters of the request a stub server route is answering"""
+    return dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(handler.path).query))
+
+def api_routes() -> dict:
+    """Returns stub server routes answering like the news, weather and Covid-19 APIs
+
+    /news answers with news_test.json. /weather answers with weather_test.json for
+    whichever location is asked for. /covid answers with covid_test.json as its
+    first page and no days on any later page.
+    """
+    with open(fixture_path('news_test.json'), 'rb') as f:
+        news = f.read()
+    weather = load_fixture('weather_test.json')
+    covid = load_fixture('covid_test.json')
+    def weather_route(handler):
+        return 200, json.dumps(dict(weather, name=query(handler).get('q'))).encode()
+    def covid_route(handler):
+        page = int(query(handler).get('page', 1))
+        return 200, json.dumps({'data': covid['data'] if page == 1 else []}).encode()
+    return {'/news': lambda handler: (200, news), '/weather': weather_route, '/covid': covid_route}
+
+
+class FakeSpeechBackend:
+    """A text to speech backend that writes the text instead of audio"""
+    def __init__(self):
+        self.rendered = []
+        self.played = []
+    def render(self, text, path):
+        self.rendered.append(text)
+        with open(path, 'w') as f:
+            f.write(text)
+    def play(self, path, text):
+        with open(path) as f:
+            self.played.append(f.read())
+
+
+def cluster_worker(path: str, owner: str, titles: list, due: float, results, members: int,
+                   work: float = 0, crash: bool = False) -> None:
+    """Runs one process of a cluster that fires a shared set of alarms with main.py
+
+    The alarms are fired by main.read_announcment and main.claim_alarm against the
+    shared database, with the speech queue replaced by one that puts the title of
+    every alarm fired on the results queue with the owner's name. The processes
+    wait for each other to join before any alarm is due.
+
+    Keyword arguments:
+    path -- the database shared by the processes
+    owner -- name of this process
+    titles -- titles of the alarms, which are all due at the same time
+    due -- when the alarms are due in seconds since the epoch
+    results -- multiprocessing queue the fired alarms are put on
+    members -- number of processes in the cluster
+    work -- seconds reading each alarm's briefing takes
+    crash -- stops the process as soon as it has taken its first alarm
+    """
+    import main
+    class Announcer:
+        def say(self, announcements, priority=1):
+            if crash:
+                os._exit(1)
+            time.sleep(work)
+            results.put((announcements[0], owner))
+    main.cluster = Cluster(path, owner, lease_time=1, member_timeout=1)
+    main.storage = AlarmStorage(path, owner=owner)
+    main.speech_queue = Announcer()
+    main.s = AlarmEngine()
+    main.alarms = AlarmRegistry()
+    main.cluster.start(0.1)
+    deadline = time.time() + 10
+    while len(main.cluster.heartbeat()) < members and time.time() < deadline:
+        time.sleep(0.05)
+    date, due_time = wall_clock(due, main.TIMEZONE)
+    alarms = [{'title': title, 'content': '', 'date': date, 'time': due_time, 'news': False, 'weather': False,
+               'location': None, 'repeat': None, 'schedule': None, 'announcement': [title]} for title in titles]
+    #alarm times are whole minutes, so the takeover delay is counted from when the alarms are really due
+    main.TAKEOVER_DELAY = due - main.alarm_epoch(alarms[0]) + 0.5
+    for alarm in main.alarms.add_many(alarms):
+        main.alarms.set_schedule(alarm, main.s.enterabs(due, 1, main.read_announcment, (alarm,)))
+    main.s.start()
+    time.sleep(60)
+
+def run_cluster(processes: int, titles: list, work: float = 0, crashes: int = 0, timeout: float = 30) -> tuple:
+    """Fires alarms with several processes sharing one database and returns what each fired
+
+    Returns the (title, owner) pairs of every alarm fired and the seconds from the
+    alarms being due until the last one was fired.
+
+    Keyword arguments:
+    processes -- number of processes in the cluster
+    titles -- titles of the alarms
+    work -- seconds firing each alarm takes
+    crashes -- number of processes that stop as soon as they take an alarm
+    timeout -- most seconds to wait for the alarms to be fired
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cluster.db')
+        Cluster(path) #the tables are created before the processes start
+        results = multiprocessing.Queue()
+        due = time.time() + 2
+        workers = [multiprocessing.Process(target=cluster_worker, daemon=True,
+                                           args=(path, 'worker %d' % i, titles, due, results, processes, work, i < crashes))
+                   for i in range(processes)]
+        for worker in workers:
+            worker.start()
+        fired = []
+        try:
+            while len(fired) < len(titles):
+                fired.append(results.get(timeout=max(0, due + timeout - time.time())))
+            elapsed = time.time() - due
+            time.sleep(1.5) #any alarm fired twice would arrive by now
+            while not results.empty():
+                fired.append(results.get())
+        finally:
+            for worker in workers:
+                worker.terminate()
+                worker.join()
+    return fired, elapsed
@@ -0,0 +1,104 @@
+"""
+Tests of several processes sharing the alarms
+"""
+
+import os
+import tempfile
+import time
+from cluster import Cluster
+from cluster import DONE
+from cluster import FIRE
+from cluster import WAIT
+from storage import AlarmStorage
+from tests.support import run_cluster
+from tests.support import wall_clock
+import main
+
+
+def test_cluster() -> None:
+    """this function tests that alarms shared by several processes are fired exactly once"""
+    clock = [1000.0]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'alarms.db')
+        first = Cluster(path, 'a', lease_time=10, timefunc=lambda: clock[0])
+        second = Cluster(path, 'b', lease_time=10, timefunc=lambda: clock[0])
+        assert first.acquire('job') and not second.acquire('job'), 'cluster lease test: FAILED'
+        clock[0] += 11
+        assert second.acquire('job') and not first.acquire('job'), 'cluster lease expiry test: FAILED'
+        second.complete('job')
+        clock[0] += 100
+        assert not first.acquire('job') and first.lease('job')[2], 'cluster lease done test: FAILED'
+        assert first.heartbeat() == ['a'] and second.heartbeat() == ['a', 'b'], 'cluster members test: FAILED'
+        first.heartbeat()
+        names = ['alarm %d' % i for i in range(100)]
+        assert sum(first.prefers(name) for name in names) + sum(second.prefers(name) for name in names) == 100, 'cluster partition test: FAILED'
+        name = next(name for name in names if second.prefers(name))
+        assert first.claim(name, clock[0], 5) == (WAIT, clock[0] + 5), 'cluster claim wait test: FAILED'
+        assert second.claim(name, clock[0], 5) == (FIRE, None), 'cluster claim fire test: FAILED'
+        second.complete(name)
+        clock[0] += 5
+        assert first.claim(name, clock[0] - 5, 5) == (DONE, None), 'cluster claim done test: FAILED'
+        storage = AlarmStorage(path, owner='a')
+        storage.save_alarm({'title': 'shared', 'content': '', 'date': '2020-12-04', 'time': '07:00', 'news': False, 'weather': True})
+        storage.flush()
+        other = AlarmStorage(path, owner='b')
+        assert [kind for change, kind, title in other.changes_since(0)] == ['alarm_saved'], 'cluster change log test: FAILED'
+        assert storage.changes_since(0) == [] and other.load_alarm('shared')['weather'] is True, 'cluster change log owner test: FAILED'
+        storage.close()
+        other.close()
+    titles = ['alarm %d' % i for i in range(60)]
+    fired, elapsed = run_cluster(3, titles, work=0.01, crashes=1)
+    assert sorted(title for title, owner in fired) == sorted(titles), 'cluster exactly once test: FAILED'
+    assert {owner for title, owner in fired} == {'worker 1', 'worker 2'}, 'cluster takeover test: FAILED'
+
+def test_main_cluster(app_state, fake_speech, monkeypatch, tmp_path) -> None:
+    """this function tests that main.py fires its share of the alarms and applies other processes' changes"""
+    path = str(tmp_path / 'shared.db')
+    cluster = Cluster(path, 'main', lease_time=10)
+    other = Cluster(path, 'other', lease_time=10)
+    cluster.heartbeat()
+    other.heartbeat()
+    cluster.heartbeat()
+    storage = AlarmStorage(path, owner='main')
+    other_storage = AlarmStorage(path, owner='other')
+    monkeypatch.setattr(main, 'cluster', cluster)
+    monkeypatch.setattr(main, 'storage', storage)
+    date, due = wall_clock(time.time() - 60, main.TIMEZONE)
+    def alarm(title):
+        return {'title': title, 'content': '', 'date': date, 'time': due,
+                'news': False, 'weather': False, 'location': None, 'schedule': None, 'announcement': [title]}
+    titles = ['shared %d' % i for i in range(20)]
+    mine = next(alarm(title) for title in titles if cluster.prefers(main.firing_lease(alarm(title))))
+    theirs = next(alarm(title) for title in titles if not cluster.prefers(main.firing_lease(alarm(title))))
+    assert main.firing_lease(mine) == 'alarm %s %s %s' % (mine['title'], mine['date'], mine['time']), 'firing_lease test: FAILED'
+    main.alarms.add(mine)
+    main.read_announcment(mine)
+    assert len(main.speech_queue) == 1 and cluster.lease(main.firing_lease(mine))[2], 'cluster fire test: FAILED'
+    assert other.claim(main.firing_lease(mine), time.time() - 60, 5)[0] == DONE, 'cluster fired once test: FAILED'
+    assert other.acquire(main.firing_lease(theirs))
+    other.complete(main.firing_lease(theirs))
+    main.alarms.add(theirs)
+    assert not main.claim_alarm(theirs) and 'announcement' in theirs, 'claim_alarm test: FAILED'
+    assert theirs['title'] not in main.alarms and len(main.speech_queue) == 1, 'claim_alarm done test: FAILED'
+    recurring = next(dict(alarm(title), repeat='daily') for title in titles
+                     if title != theirs['title'] and not cluster.prefers(main.firing_lease(alarm(title))))
+    assert other.acquire(main.firing_lease(recurring))
+    other.complete(main.firing_lease(recurring))
+    main.alarms.add(recurring)
+    assert not main.claim_alarm(recurring) and main.alarms.get(recurring['title']) is recurring, 'claim_alarm recurring test: FAILED'
+    assert main.alarm_epoch(recurring) > time.time() and recurring['time'] == due, 'claim_alarm recurring next test: FAILED'
+    other_storage.save_alarm(dict(alarm('synced'), date=wall_clock(time.time() + 86400, main.TIMEZONE)[0]))
+    other_storage.save_notification({'title': 'synced note', 'content': 'from another process'})
+    other_storage.flush()
+    main.sync_cluster()
+    assert 'synced' in main.alarms and main.notifications[-1]['title'] == 'synced note', 'sync_cluster test: FAILED'
+    other_storage.delete_alarm('synced')
+    other_storage.delete_notification('synced note')
+    other_storage.flush()
+    main.sync_cluster()
+    assert 'synced' not in main.alarms and main.notifications == [], 'sync_cluster delete test: FAILED'
+    main.prune_cluster()
+    actions = [event.action for event in main.s.queue]
+    assert main.sync_cluster in actions and main.prune_cluster in actions, 'prune_cluster test: FAILED'
+    storage.close()
+    other_storage.close()
@@ -0,0 +1,68 @@
+"""
+Tests of the engine that fires scheduled events and the registry that holds the alarms
+"""
+
+import time
+from alarm_engine import AlarmEngine
+from alarm_store import AlarmRegistry
+
+
+def test_alarm_engine() -> None:
+    """this function tests that the alarm engine fires events in order without polling"""
+    engine = AlarmEngine()
+    fired = []
+    engine.enter(0.2, 1, fired.append, ('third',))
+    engine.enter(0.1, 1, fired.append, ('second',))
+    engine.enter(0.05, 1, fired.append, ('first',))
+    cancelled = engine.enter(0.1, 1, fired.append, ('cancelled',))
+    assert engine.cancel(cancelled), 'alarm engine cancel test: FAILED'
+    assert not engine.cancel(cancelled), 'alarm engine cancel test: FAILED'
+    assert len(engine) == 3, 'alarm engine queue test: FAILED'
+    engine.start()
+    time.sleep(0.5)
+    engine.stop()
+    assert fired == ['first', 'second', 'third'], 'alarm engine firing test: FAILED'
+    assert engine.empty(), 'alarm engine queue test: FAILED'
+
+def test_alarm_engine_cancel_due() -> None:
+    """this function tests that an event cancelled by another event due at the same time does not fire"""
+    engine = AlarmEngine()
+    fired = []
+    due = time.time() + 0.05
+    second = []
+    engine.enterabs(due, 1, lambda: fired.append(engine.cancel(second[0])))
+    second.append(engine.enterabs(due, 1, fired.append, ('cancelled',)))
+    engine.start()
+    time.sleep(0.3)
+    engine.stop()
+    assert fired == [True], 'alarm engine due cancel test: FAILED'
+    assert len(engine) == 0 and engine.empty(), 'alarm engine due cancel count test: FAILED'
+
+def test_alarm_engine_batch() -> None:
+    """this function tests that a batch of events is scheduled in the right order"""
+    engine = AlarmEngine()
+    engine.enter(0.5, 1, print, ('existing',))
+    events = engine.enterabs_many((100 - i, 1, print, (i,)) for i in range(50))
+    assert [event.argument for event in events] == [(i,) for i in range(50)], 'enterabs_many order test: FAILED'
+    assert len(engine) == 51 and engine.next_deadline() == 51, 'enterabs_many heap test: FAILED'
+    assert [event.time for event in engine.queue] == sorted(event.time for event in engine.queue), 'enterabs_many queue test: FAILED'
+    engine.enterabs_many([(10, 1, print, ('one more',))])
+    assert engine.next_deadline() == 10, 'enterabs_many push test: FAILED'
+
+def test_alarm_registry() -> None:
+    """this function tests that alarms can be found by title and date"""
+    registry = AlarmRegistry()
+    alarm = {'title': 'fun', 'date': '2020-12-04', 'time': '10:44', 'schedule': 'event'}
+    assert registry.add(alarm), 'alarm registry add test: FAILED'
+    assert not registry.add(dict(alarm)), 'alarm registry duplicate test: FAILED'
+    assert 'fun' in registry and registry.get('fun') is alarm, 'alarm registry lookup test: FAILED'
+    assert registry.on_date('2020-12-04') == [alarm], 'alarm registry date test: FAILED'
+    later = {'title': 'later', 'date': '2020-12-05', 'time': '07:00', 'schedule': None}
+    registry.add(later)
+    assert registry.page(0, 1) == [alarm] and registry.page(1, 5) == [later] and registry.page(2, 5) == [], 'alarm registry page test: FAILED'
+    registry.discard(later)
+    registry.set_schedule(alarm, 'new event')
+    assert alarm['schedule'] == 'new event', 'alarm registry schedule test: FAILED'
+    assert not registry.discard(dict(alarm)), 'alarm registry discard test: FAILED'
+    assert registry.discard(alarm), 'alarm registry discard test: FAILED'
+    assert len(registry) == 0 and registry.on_date('2020-12-04') == [], 'alarm registry delete test: FAILED'
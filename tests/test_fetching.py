@@ -0,0 +1,181 @@
+"""
+Tests of the API client, the cache of API responses and the fetching of briefings,
+news and Covid-19 figures
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+import numpy as np
+import requests
+from api_cache import ApiCache
+from api_client import ApiClient
+from api_client import CircuitBreaker
+from api_client import CircuitOpenError
+from briefing import fetch_briefing
+from covid_store import CovidStore
+from covid_store import threshold_levels
+from main import format_covid_summary
+from news_filter import NewsMatcher
+from news_filter import find_article
+from news_filter import iter_articles
+from tests.support import delayed_route
+from tests.support import fixture_path
+from tests.support import load_fixture
+from tests.support import start_stub_server
+
+
+def test_fetch_briefing() -> None:
+    """this function tests that briefing sources are fetched at the same time"""
+    server = start_stub_server({
+        '/news': delayed_route(0.3, {'title': 'news'}),
+        '/weather': delayed_route(0.3, {'title': 'weather'}),
+        '/covid': delayed_route(0.3, {'title': 'covid'}),
+        '/hung': delayed_route(2, {'title': 'hung'})})
+    url = 'http://127.0.0.1:%d/' % server.server_address[1]
+    def source(path):
+        return lambda: json.load(urllib.request.urlopen(url + path))
+    start = time.monotonic()
+    briefing = fetch_briefing({name: source(name) for name in ('news', 'weather', 'covid')}, timeout=1)
+    assert time.monotonic() - start < 0.8, 'fetch_briefing parallel test: FAILED'
+    assert briefing == {'news': {'title': 'news'}, 'weather': {'title': 'weather'}, 'covid': {'title': 'covid'}}, 'fetch_briefing test: FAILED'
+    start = time.monotonic()
+    briefing = fetch_briefing({'covid': source('covid'), 'hung': source('hung'), 'missing': source('missing')}, timeout=0.6)
+    assert time.monotonic() - start < 1, 'fetch_briefing timeout test: FAILED'
+    assert briefing == {'covid': {'title': 'covid'}, 'hung': None, 'missing': None}, 'fetch_briefing timeout test: FAILED'
+    server.shutdown()
+
+def test_api_cache() -> None:
+    """this function tests expiry, eviction, coalescing and stale responses of the API cache"""
+    clock = [0.0]
+    calls = []
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return len(calls)
+    cache = ApiCache('test', ttl=60, max_entries=2, timefunc=lambda: clock[0])
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('weather', fetch))) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [1] * 10 and len(calls) == 1, 'api cache coalescing test: FAILED'
+    assert cache.get('weather', fetch) == 1, 'api cache hit test: FAILED'
+    clock[0] = 61
+    assert cache.get('weather', fetch) == 2, 'api cache expiry test: FAILED'
+    clock[0] = 200
+    def broken():
+        raise ConnectionError('upstream is down')
+    assert cache.get('weather', broken) == 2, 'api cache stale test: FAILED'
+    try:
+        cache.get('news', broken)
+        assert False, 'api cache error test: FAILED'
+    except ConnectionError:
+        pass
+    cache.get('news', lambda: 'news')
+    cache.get('covid', lambda: 'covid')
+    assert len(cache) == 2, 'api cache eviction test: FAILED'
+    stats = cache.stats()
+    assert stats['hits'] + stats['coalesced'] == 10, 'api cache stats test: FAILED'
+    assert (stats['stale'], stats['errors']) == (1, 2), 'api cache stats test: FAILED'
+
+def test_api_client() -> None:
+    """this function tests the API client against slow, flaky and dead servers"""
+    attempts = []
+    def flaky(handler):
+        attempts.append(1)
+        return (503, b'{}') if len(attempts) < 3 else (200, b'{"cod": 200}')
+    server = start_stub_server({'/flaky': flaky, '/slow': delayed_route(1, {'cod': 200}),
+                                '/fine': delayed_route(0, {'cod': 200})})
+    url = 'http://127.0.0.1:%d/' % server.server_address[1]
+    client = ApiClient('test', read_timeout=0.2, retries=3, backoff=0.01)
+    assert client.get_json(url + 'flaky') == {'cod': 200} and len(attempts) == 3, 'api client retry test: FAILED'
+    start = time.monotonic()
+    try:
+        client.get_json(url + 'slow')
+        assert False, 'api client timeout test: FAILED'
+    except requests.exceptions.Timeout:
+        pass
+    assert time.monotonic() - start < 2, 'api client timeout test: FAILED'
+    try:
+        client.get_json(url + 'missing')
+        assert False, 'api client error test: FAILED'
+    except requests.exceptions.HTTPError:
+        pass
+    server.shutdown()
+    server.server_close()
+    clock = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, timefunc=lambda: clock[0])
+    client = ApiClient('test', retries=5, backoff=0.01, breaker=breaker)
+    try:
+        client.get_json(url + 'fine')
+        assert False, 'api client dead server test: FAILED'
+    except CircuitOpenError:
+        pass
+    assert breaker.state == 'open' and breaker.failures == 2, 'api client circuit breaker test: FAILED'
+    server = start_stub_server({'/fine': delayed_route(0, {'cod': 200}), '/garbled': lambda handler: (200, b'<html>')})
+    url = 'http://127.0.0.1:%d/' % server.server_address[1]
+    clock[0] = 31
+    assert breaker.state == 'half-open', 'api client circuit breaker test: FAILED'
+    try:
+        client.get_json(url + 'garbled')
+        assert False, 'api client bad body test: FAILED'
+    except ValueError:
+        pass
+    assert breaker.state == 'open', 'api client bad trial test: FAILED'
+    clock[0] = 62
+    assert client.get_json(url + 'fine') == {'cod': 200}, 'api client recovery test: FAILED'
+    assert breaker.state == 'closed', 'api client circuit breaker test: FAILED'
+    server.shutdown()
+
+def test_news_filter() -> None:
+    """this function tests that news articles are streamed and matched"""
+    with open(fixture_path('news_test.json'), 'rb') as f:
+        raw = f.read()
+    articles = json.loads(raw)['articles']
+    for size in (1, 7, 4096):
+        chunks = [raw[i:i + size] for i in range(0, len(raw), size)]
+        assert list(iter_articles(chunks)) == articles, 'iter_articles test: FAILED'
+    read = []
+    def counted(chunks):
+        for chunk in chunks:
+            read.append(chunk)
+            yield chunk
+    matcher = NewsMatcher(["Covid"], ["BBC News"])
+    article = find_article(iter_articles(counted([raw[i:i + 256] for i in range(0, len(raw), 256)])), matcher)
+    assert article['title'].startswith('London Covid: Why Heathrow'), 'find_article test: FAILED'
+    assert len(read) * 256 < len(raw) / 2, 'find_article early stop test: FAILED'
+    assert find_article(articles, NewsMatcher(["nothing"], [])) is None, 'find_article no match test: FAILED'
+    server = start_stub_server({'/news': lambda handler: (200, raw)})
+    client = ApiClient('test')
+    with client.stream('http://127.0.0.1:%d/news' % server.server_address[1]) as response:
+        article = find_article(iter_articles(response.iter_content(512)), matcher)
+    assert article['title'].startswith('London Covid: Why Heathrow'), 'news stream test: FAILED'
+    server.shutdown()
+
+def test_covid_store() -> None:
+    """this function tests that Covid-19 figures are fetched incrementally and summarised"""
+    fixture = load_fixture('covid_test.json')['data']
+    requested = []
+    def fetch(since):
+        requested.append(since)
+        return [day for day in fixture if since is None or day['date'] > since]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'england.npy')
+        store = CovidStore(path)
+        fixture, latest = fixture[2:], fixture[:2]
+        assert store.update(fetch) == 12 and store.last_date() == '2020-11-12', 'covid store ingest test: FAILED'
+        fixture = latest + fixture
+        store = CovidStore(path)
+        assert store.update(fetch) == 2 and requested == [None, '2020-11-12'], 'covid store incremental test: FAILED'
+        assert store.update(fetch) == 0 and len(store) == 14, 'covid store incremental test: FAILED'
+        summary = store.summary()
+    assert summary == {'date': '2020-11-14', 'new_cases': 20412, 'new_cases_yesterday': 24957, 'cum_cases': 1292373,
+                       'new_deaths_yesterday': 112, 'cum_deaths_yesterday': 49064, 'cases_change': -4545,
+                       'seven_day_average': 151904 / 7, 'threshold_level': 'Red - Not safe'}, 'covid store summary test: FAILED'
+    assert list(threshold_levels(np.array([547, 12000, 16000]))) == ['Green - safe', 'Yellow - Be careful', 'Red - Not safe'], 'threshold_levels test: FAILED'
+    assert format_covid_summary(summary)['content'] == "New cases today: 20412 New cases yesterday: 24957, Cases down by 4545 since yesterday, Total cases: 1292373, Yesterday's deaths: 112, Total deaths: 49064, Seven day average: 21701 Threshold level is Red - Not safe", 'format_covid_summary test: FAILED'
@@ -0,0 +1,399 @@
+"""
+Tests of the functions in main.py. The APIs are answered by the stub server and speech
+by the fake backend, so these tests need no network, API keys or speaker.
+"""
+
+import inspect
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from config import Config
+from speech import SpeechQueue
+from main import add_alarms
+from main import advance_alarm
+from main import add_notification
+from main import alarm_epoch
+from main import apply_cache_ttl
+from main import apply_log_level
+from main import apply_news_filter
+from main import check_covid_api
+from main import check_news_api
+from main import check_weather_api
+from main import configure_logging
+from main import create_services
+from main import covid_api_request
+from main import create_announcment
+from main import current_time
+from main import fetch_news_notification
+from main import fetch_weather
+from main import fetch_weather_batch
+from main import format_announcement
+from main import format_covid_notification
+from main import format_news_notification
+from main import format_weather_notification
+from main import hhmm_to_seconds
+from main import hours_to_minutes
+from main import kelvin_to_celsius
+from main import minutes_to_seconds
+from main import news_api_request
+from main import news_url
+from main import next_midnight
+from main import next_occurrence
+from main import page_state
+from main import parse_alarm
+from main import prefetch_weather
+from main import prepare_announcment
+from main import promote_alarms
+from main import public_alarm
+from main import queue_preparation
+from main import read_announcment
+from main import refresh_notifications
+from main import remove_alarms
+from main import remove_notification
+from main import restore_state
+from main import round_to_integer
+from main import schedule_alarm
+from main import schedule_alarms
+from main import start_background_tasks
+from main import stop_background_tasks
+from main import stream_news_articles
+from main import tts_request
+from main import update_covid_store
+from main import update_notif
+from main import upcoming_alarms
+from main import weather_api_request
+from tests.support import ROOT
+from tests.support import load_fixture
+from tests.support import wall_clock
+import main
+
+NEWS_NOTIFICATION = {'title': 'London Covid: Why Heathrow Airport will stay open during lockdown 2 - My London',
+                     'content': 'A small number of essential retailers and food and beverage outlets remain open at the airport'}
+
+
+def day(offset: int = 0) -> str:
+    """Returns the date a number of days from today formatted as YYYY-MM-DD"""
+    return wall_clock(time.time() + offset * 86400, main.TIMEZONE)[0]
+
+def test_conversions() -> None:
+    """this function tests the conversions between units, dates and times"""
+    assert minutes_to_seconds('5') == 300, 'minutes_to_seconds test: FAILED'
+    assert hours_to_minutes('5') == 300, 'hours_to_minutes test: FAILED'
+    assert hhmm_to_seconds('10:15') == 36900, 'hhmm_to_seconds test: FAILED'
+    assert hhmm_to_seconds('10') is None, 'hhmm_to_seconds format test: FAILED'
+    assert [round_to_integer(number) for number in (5.4, 7.5, 13.17, -2.6, -0.5)] == [5, 8, 13, -3, 0], 'round_to_integer test: FAILED'
+    assert kelvin_to_celsius(286.32) == 13 and kelvin_to_celsius('284.96') == 12, 'kelvin_to_celsius test: FAILED'
+    assert current_time() == day(), 'current_time test: FAILED'
+    assert alarm_epoch({'date': '2020-12-04', 'time': '10:44'}) == 1607078640, 'alarm_epoch test: FAILED'
+    assert next_midnight(1607078640) == 1607126400 and next_midnight(1607126400) == 1607212800, 'next_midnight test: FAILED'
+
+def test_news(stub_apis) -> None:
+    """this function tests that the news is requested, streamed, filtered and cached"""
+    assert news_url() == main.NEWS_URL + '?country=gb&apiKey=' + main.config["API-keys"]["news"], 'news_url test: FAILED'
+    articles = load_fixture('news_test.json')['articles']
+    assert news_api_request()['articles'] == articles, 'news_api_request test: FAILED'
+    assert list(stream_news_articles()) == articles, 'stream_news_articles test: FAILED'
+    assert format_news_notification(load_fixture('news_test.json')) == NEWS_NOTIFICATION, 'format_news_notification test: FAILED'
+    assert format_news_notification({'articles': articles[:1]}) is None, 'format_news_notification no match test: FAILED'
+    assert fetch_news_notification() == NEWS_NOTIFICATION, 'fetch_news_notification test: FAILED'
+    requested = len(stub_apis.requested)
+    assert check_news_api() == NEWS_NOTIFICATION and check_news_api() == NEWS_NOTIFICATION, 'check_news_api test: FAILED'
+    assert len(stub_apis.requested) == requested + 1, 'check_news_api cache test: FAILED'
+
+def test_weather(stub_apis) -> None:
+    """this function tests that the weather is requested for each location and formatted"""
+    assert weather_api_request()['cod'] == 200, 'weather_api_request test: FAILED'
+    assert stub_apis.requested[-1][1]['q'] == main.config["location"], 'weather_api_request location test: FAILED'
+    notification = format_weather_notification(load_fixture('weather_test.json'))
+    assert notification['title'].startswith('Weather - ' + main.config["location"] + ' - '), 'format_weather_notification title test: FAILED'
+    assert notification['content'] == 'Weather: light rain. Temperature: 13°C Feels like: 12°C', 'format_weather_notification test: FAILED'
+    assert fetch_weather('Leeds')['name'] == 'Leeds', 'fetch_weather test: FAILED'
+    assert main.weather_client.pool_size >= main.weather_pool._max_workers, 'weather connection pool test: FAILED'
+    weather = fetch_weather_batch(['Leeds', 'York', 'York'])
+    assert sorted(weather) == ['Leeds', 'York'] and weather['York'].result()['name'] == 'York', 'fetch_weather_batch test: FAILED'
+    assert check_weather_api('York')['title'].startswith('Weather - York - '), 'check_weather_api test: FAILED'
+    assert [query['q'] for path, query in stub_apis.requested] == [main.config["location"], 'Leeds', 'York'], 'weather cache test: FAILED'
+
+def test_weather_batch(stub_apis, app_state) -> None:
+    """this function tests that the weather is fetched once for each location of the upcoming alarms"""
+    soon = wall_clock(time.time() + 120, main.TIMEZONE)
+    later = wall_clock(time.time() + 3 * 3600, main.TIMEZONE)
+    cities = ['Batch Leeds', 'Batch York', 'Batch Hull']
+    batch = []
+    for i in range(30):
+        due = later if i % 10 == 9 else soon #the last alarm for each location is not due yet
+        batch.append({'title': 'weather %d' % i, 'date': due[0], 'time': due[1],
+                      'news': False, 'weather': i % 5 != 4, 'location': cities[i % 3], 'schedule': None})
+    batch.append({'title': 'weather later', 'date': later[0], 'time': later[1],
+                  'news': False, 'weather': True, 'location': 'Batch Leicester', 'schedule': None})
+    for alarm in batch:
+        main.alarms.add(alarm)
+    start = alarm_epoch(batch[0]) - 1
+    assert len(upcoming_alarms(start, start + 600)) == 27, 'upcoming_alarms test: FAILED'
+    wait(prefetch_weather().values())
+    assert sorted(query['q'] for path, query in stub_apis.requested) == sorted(cities), 'weather batch test: FAILED'
+    assert any(event.action is prefetch_weather for event in main.s.queue), 'prefetch_weather reschedule test: FAILED'
+    notification = check_weather_api('Batch York')
+    assert notification['title'].startswith('Weather - Batch York - '), 'weather location test: FAILED'
+    assert len(stub_apis.requested) == 3, 'weather cache test: FAILED'
+
+def test_covid(stub_apis, app_state) -> None:
+    """this function tests that Covid-19 figures are requested a page at a time and summarised"""
+    days = load_fixture('covid_test.json')['data']
+    assert covid_api_request()['data'] == days, 'covid_api_request test: FAILED'
+    assert [query['page'] for path, query in stub_apis.requested] == ['1', '2'], 'covid_api_request pages test: FAILED'
+    assert covid_api_request('2020-11-12')['data'] == days[:2], 'covid_api_request since test: FAILED'
+    assert len(stub_apis.requested) == 3, 'covid_api_request last page test: FAILED'
+    json_file = {"data": [{"date": "2020-07-28", "newCasesByPublishDate": "547", "cumCasesByPublishDate": "259022"},
+                          {"date": "2020-07-27", "newCasesByPublishDate": "616", "cumCasesByPublishDate": "258475",
+                           "newDeathsByDeathDate": "20", "cumDeathsByDeathDate": "41282"}]}
+    assert format_covid_notification(json_file) == {'title': 'Covid-19 report - England 2020-07-28', 'content': "New cases today: 547 New cases yesterday: 616, Total cases: 259022, Yesterday's deaths: 20, Total deaths: 41282 Threshold level is Green - safe"}, 'format_covid_notification test: FAILED'
+    assert update_covid_store()['date'] == '2020-11-14' and len(main.covid_store) == len(days), 'update_covid_store test: FAILED'
+    assert check_covid_api()['title'] == 'Covid-19 report - England 2020-11-14', 'check_covid_api test: FAILED'
+
+def test_announcements(stub_apis, app_state, fake_speech, monkeypatch) -> None:
+    """this function tests that announcements are built, rendered ahead of time and read"""
+    assert format_announcement(None, 'content') == 'unavailable', 'format_announcement missing test: FAILED'
+    assert format_announcement({'content': 'Temperature: 13°C.'}, 'content') == 'Temperature  13degrees celcius ', 'format_announcement test: FAILED'
+    alarm = {'title': 'fun', 'content': "['2020-12-04', '10:44']", 'date': '2020-12-04', 'time': '10:44',
+             'news': True, 'weather': True, 'location': 'Leeds', 'schedule': None}
+    announcements = create_announcment(alarm)
+    assert len(announcements) == 4 and announcements[0] == 'alarm fun has gone off', 'create_announcment test: FAILED'
+    assert announcements[2] == 'lastest news is ' + format_announcement(NEWS_NOTIFICATION, 'title'), 'create_announcment news test: FAILED'
+    assert announcements[3].startswith('weather report is Weather  light rain'), 'create_announcment weather test: FAILED'
+    assert len(create_announcment(dict(alarm, news=False, weather=False))) == 2, 'create_announcment test: FAILED'
+    prepare_announcment(alarm)
+    assert len(alarm['announcement']) == 4 and alarm['announcement'][0] in fake_speech.rendered, 'prepare_announcment test: FAILED'
+    main.alarms.add(alarm)
+    read_announcment(alarm)
+    assert 'fun' not in main.alarms and 'announcement' not in alarm, 'read_announcment test: FAILED'
+    assert len(main.speech_queue) == 1, 'read_announcment queue test: FAILED'
+    tts_request('Text to speech example announcement!')
+    assert len(main.speech_queue) == 2, 'tts_request test: FAILED'
+    created = []
+    monkeypatch.setattr(main, 'create_announcment', lambda alarm: created.append(threading.current_thread().name) or ['late'])
+    monkeypatch.setattr(main, 'announcement_pool', ThreadPoolExecutor(max_workers=1))
+    main.alarms.add(alarm)
+    read_announcment(alarm) #went off before its announcement was prepared
+    main.announcement_pool.shutdown(wait=True)
+    assert created and created[0] != threading.current_thread().name, 'read_announcment hand off test: FAILED'
+    assert len(main.speech_queue) == 3, 'read_announcment unprepared test: FAILED'
+    main.announcement_pool = ThreadPoolExecutor(max_workers=1)
+    queue_preparation(alarm)
+    main.announcement_pool.shutdown(wait=True)
+    assert len(created) == 2 and alarm['announcement'] == ['late'], 'queue_preparation test: FAILED'
+    monkeypatch.setattr(main, 'speech_queue', SpeechQueue(main.speech))
+    tts_request('asked for on demand')
+    read_announcment(dict(alarm, title='urgent', announcement=['alarm urgent has gone off']))
+    main.speech_queue.start()
+    deadline = time.time() + 5
+    while not fake_speech.played and time.time() < deadline:
+        time.sleep(0.01)
+    main.speech_queue.stop()
+    assert fake_speech.played[0] == 'alarm urgent has gone off', 'alarm priority test: FAILED'
+
+def test_alarms(app_state, monkeypatch) -> None:
+    """this function tests that alarms are validated, added, scheduled, removed and restored"""
+    alarm = parse_alarm({'title': 'wake', 'date': day(), 'time': '23:59', 'news': 1})
+    assert alarm == {'title': 'wake', 'content': str([day(), '23:59']), 'date': day(), 'time': '23:59', 'news': True,
+                     'weather': False, 'location': None, 'repeat': None, 'schedule': None}, 'parse_alarm test: FAILED'
+    for invalid in ([], {'title': ''}, {'title': 'x', 'date': day(), 'time': '25:00'},
+                    {'title': 'x', 'date': day(), 'time': '07:00', 'location': 5},
+                    {'title': 'x', 'date': day(), 'time': '07:00', 'news': 'maybe'},
+                    {'title': 'x', 'date': day(), 'time': '07:00', 'weather': [True]}):
+        try:
+            parse_alarm(invalid)
+            assert False, 'parse_alarm validation test: FAILED'
+        except ValueError:
+            pass
+    flags = parse_alarm({'title': 'x', 'date': day(), 'time': '07:00', 'news': 'false', 'weather': ' True '})
+    assert (flags['news'], flags['weather']) == (False, True), 'parse_alarm flags test: FAILED'
+    try:
+        add_alarms([dict(flags, title='valid'), dict(flags, title='invalid', date='someday')])
+        assert False, 'add_alarms validation test: FAILED'
+    except ValueError:
+        pass
+    assert len(main.alarms) == 0 and len(main.s) == 0, 'add_alarms validation test: FAILED'
+    later = parse_alarm({'title': 'later', 'date': day(1), 'time': '07:00', 'weather': True, 'location': 'York'})
+    assert add_alarms([alarm, later, dict(alarm)]) == [alarm, later], 'add_alarms test: FAILED'
+    assert alarm['schedule'].time == alarm_epoch(alarm) and alarm['prepare'] is not None, 'add_alarms schedule test: FAILED'
+    assert later['schedule'] is None and len(main.s) == 2, 'add_alarms tomorrow test: FAILED'
+    assert public_alarm(later) == {'title': 'later', 'content': str([day(1), '07:00']), 'date': day(1), 'time': '07:00',
+                                   'news': False, 'weather': True, 'location': 'York', 'repeat': None}, 'public_alarm test: FAILED'
+    assert page_state() == {'alarms': [public_alarm(alarm), public_alarm(later)], 'notifications': []}, 'page_state test: FAILED'
+    schedule_alarm(later)
+    assert later['schedule'].time == alarm_epoch(later) and len(main.s) == 4, 'schedule_alarm test: FAILED'
+    assert remove_alarms(['wake', 'missing']) == [alarm] and len(main.s) == 2, 'remove_alarms test: FAILED'
+    schedule_alarms([alarm])
+    assert alarm['schedule'].time == alarm_epoch(alarm), 'schedule_alarms test: FAILED'
+    add_notification({'title': 'note', 'content': 'first'})
+    add_notification(None)
+    assert main.notifications == [{'title': 'note', 'content': 'first'}], 'add_notification test: FAILED'
+    assert remove_notification('note') == {'title': 'note', 'content': 'first'}, 'remove_notification test: FAILED'
+    assert remove_notification('note') is None, 'remove_notification missing test: FAILED'
+    add_notification({'title': 'kept', 'content': 'second'})
+    main.storage.flush()
+    monkeypatch.setattr(main, 'alarms', type(main.alarms)())
+    monkeypatch.setattr(main, 'notifications', [])
+    restore_state()
+    assert [public_alarm(restored) for restored in main.alarms] == [public_alarm(later)], 'restore_state test: FAILED'
+    assert main.alarms.get('later')['schedule'] is None, 'restore_state schedule test: FAILED'
+    assert main.notifications == [{'title': 'kept', 'content': 'second'}], 'restore_state notification test: FAILED'
+
+def test_promote_alarms(app_state) -> None:
+    """this function tests that alarms are only scheduled once their day has begun"""
+    missed = {'title': 'missed', 'date': day(-1), 'time': '07:00', 'schedule': None}
+    future = {'title': 'future', 'date': day(1), 'time': '07:00', 'schedule': None}
+    main.alarms.add(missed)
+    main.alarms.add(future)
+    promote_alarms()
+    assert missed['schedule'] is not None and missed['schedule'].time < time.time(), 'promote_alarms missed test: FAILED'
+    assert future['schedule'] is None, 'promote_alarms future test: FAILED'
+    assert any(event.action is promote_alarms and event.time == next_midnight(time.time()) for event in main.s.queue), 'promote_alarms test: FAILED'
+
+def test_recurring_alarms(app_state, fake_speech) -> None:
+    """this function tests that recurring alarms stay set and move on to their next occurrence"""
+    monday = alarm_epoch({'date': '2021-01-04', 'time': '07:00'})
+    assert next_occurrence('weekdays', '07:00', monday - 3 * 86400) == ('2021-01-04', '07:00'), 'next_occurrence test: FAILED'
+    assert next_occurrence('0 9 * * sat', None, monday) == ('2021-01-09', '09:00'), 'next_occurrence cron test: FAILED'
+    daily = parse_alarm({'title': 'daily', 'time': '07:00', 'repeat': 'daily'})
+    assert daily['repeat'] == 'daily' and daily['time'] == '07:00', 'parse_alarm repeat test: FAILED'
+    assert time.time() < alarm_epoch(daily) <= time.time() + 86400 + 3600, 'parse_alarm first occurrence test: FAILED'
+    cron = parse_alarm({'title': 'cron', 'date': day(1), 'repeat': '30 6 * * 1-5'})
+    assert cron['time'] == '06:30' and cron['date'] >= day(1), 'parse_alarm cron test: FAILED'
+    for invalid in ({'title': 'x', 'repeat': 'daily'}, {'title': 'x', 'time': '07:00', 'repeat': 'fortnightly'},
+                    {'title': 'x', 'time': '07:00', 'repeat': ['daily']}, {'title': 'x', 'repeat': '0 0 31 2 *'}):
+        try:
+            parse_alarm(invalid)
+            assert False, 'parse_alarm repeat validation test: FAILED'
+        except ValueError:
+            pass
+    date, due = wall_clock(time.time() - 60, main.TIMEZONE)
+    alarm = {'title': 'repeating', 'content': '', 'date': date, 'time': due, 'news': False, 'weather': False,
+             'location': None, 'repeat': 'daily', 'schedule': None, 'announcement': ['good morning']}
+    add_alarms([alarm])
+    subscription = main.events.subscribe(page_state())
+    read_announcment(alarm)
+    assert main.alarms.get('repeating') is alarm and len(main.speech_queue) == 1, 'recurring alarm fire test: FAILED'
+    assert alarm['time'] == due and time.time() < alarm_epoch(alarm) <= time.time() + 86400 + 3600, 'recurring alarm next test: FAILED'
+    assert alarm['content'] == str([alarm['date'], alarm['time']]), 'recurring alarm content test: FAILED'
+    assert alarm['schedule'] is None or alarm['schedule'].time == alarm_epoch(alarm), 'recurring alarm schedule test: FAILED'
+    main.events.close()
+    kinds = [message.split(b'\n')[1] for message in subscription.messages()]
+    assert kinds == [b'event: snapshot', b'event: alarm_fired', b'event: alarm_added'], 'recurring alarm events test: FAILED'
+    main.storage.flush()
+    saved = main.storage.load_alarm('repeating')
+    assert (saved['date'], saved['time'], saved['repeat']) == (alarm['date'], due, 'daily'), 'recurring alarm storage test: FAILED'
+    remove_alarms(['repeating'])
+    advance_alarm(alarm) #an alarm deleted while it was going off is not set again
+    assert 'repeating' not in main.alarms, 'advance_alarm deleted test: FAILED'
+    client = main.app.test_client()
+    client.get('/index', query_string={'alarm': day(1) + 'T07:00', 'two': 'form repeat', 'repeat': 'weekends'})
+    weekend = main.alarms.get('form repeat')
+    assert weekend['repeat'] == 'weekends' and weekend['date'] >= day(1), 'schedule_event repeat test: FAILED'
+    assert time.strptime(weekend['date'], '%Y-%m-%d').tm_wday >= 5, 'schedule_event weekend test: FAILED'
+    client.get('/index', query_string={'alarm': day(1) + 'T07:00', 'two': 'form fortnightly', 'repeat': 'fortnightly'})
+    assert 'form fortnightly' not in main.alarms, 'schedule_event invalid repeat test: FAILED'
+
+def test_update_notif(stub_apis, app_state, monkeypatch, caplog) -> None:
+    """this function tests that the news, weather and Covid-19 notifications are refreshed in the background"""
+    refresh = update_notif()
+    assert refresh is main.notification_refresh and refresh.result(timeout=10) is None, 'update_notif background test: FAILED'
+    titles = [notification['title'] for notification in main.notifications]
+    assert titles[0] == NEWS_NOTIFICATION['title'] and titles[1].startswith('Weather - '), 'update_notif test: FAILED'
+    assert titles[2] == 'Covid-19 report - England 2020-11-14', 'update_notif covid test: FAILED'
+    assert any(event.action is update_notif and event.time > time.time() + 14000 for event in main.s.queue), 'update_notif reschedule test: FAILED'
+    def unavailable():
+        raise ConnectionError('news API is down')
+    monkeypatch.setattr(main, 'check_news_api', unavailable)
+    with caplog.at_level(logging.ERROR):
+        refresh_notifications()
+    assert 'notifications could not be updated' in caplog.text and len(main.notifications) == 3, 'refresh_notifications error test: FAILED'
+
+def test_routes(app_state, fake_speech) -> None:
+    """this function tests the page and the form that sets and deletes alarms and notifications"""
+    client = main.app.test_client()
+    response = client.get('/index', query_string={'alarm': day(1) + 'T07:00', 'two': 'form alarm', 'news': 'news',
+                                                  'location': 'Leeds'})
+    assert response.status_code == 200 and b'form alarm' in response.data, 'schedule_event test: FAILED'
+    alarm = main.alarms.get('form alarm')
+    assert (alarm['date'], alarm['time'], alarm['news'], alarm['weather'], alarm['location']) == (day(1), '07:00', True, False, 'Leeds'), 'schedule_event alarm test: FAILED'
+    client.get('/index', query_string={'alarm': day(1) + 'T08:00', 'two': 'form alarm'})
+    assert main.alarms.get('form alarm') is alarm, 'schedule_event duplicate test: FAILED'
+    response = client.get('/index', query_string={'alarm': '2020-13-01T07:00', 'two': 'form invalid'})
+    assert response.status_code == 200 and 'form invalid' not in main.alarms, 'schedule_event invalid date test: FAILED'
+    add_notification({'title': 'note', 'content': 'shown on the page'})
+    assert b'shown on the page' in client.get('/').data, 'index test: FAILED'
+    response = client.get('/index', query_string={'alarm_item': 'form alarm', 'notif': 'note'}, headers={'X-Requested-With': 'fetch'})
+    assert response.status_code == 204 and len(main.alarms) == 0 and main.notifications == [], 'schedule_event delete test: FAILED'
+
+def test_settings(app_state, tmp_path) -> None:
+    """this function tests that changes to config.json are applied to the caches, log and news filter"""
+    path = str(tmp_path / 'config.json')
+    with open(path, 'w') as f:
+        f.write('{"API-keys": {"news": "a", "weather": "b"}, "location": "York", "cache-ttl": {"news": 5},'
+                ' "log-level": "DEBUG", "news-filter": {"keywords": ["rain"]}}')
+    changed = Config(path)
+    try:
+        apply_cache_ttl(changed)
+        apply_log_level(changed)
+        apply_news_filter(changed)
+        assert main.news_cache.ttl == 5 and main.weather_cache.ttl == 600, 'apply_cache_ttl test: FAILED'
+        assert logging.getLogger().isEnabledFor(logging.DEBUG), 'apply_log_level test: FAILED'
+        assert format_news_notification({'articles': [{'title': 'Rain', 'description': 'rain all day', 'source': {'name': 'x'}}]}) is not None, 'apply_news_filter test: FAILED'
+    finally:
+        apply_cache_ttl(main.config)
+        configure_logging() #sets the level from config.json again, pytest's own log handlers are kept
+        apply_news_filter(main.config)
+    assert not logging.getLogger().isEnabledFor(logging.DEBUG), 'log level default test: FAILED'
+
+def test_background_tasks(stub_apis, app_state, fake_speech) -> None:
+    """this function tests that the saved state is restored and the threads start and stop"""
+    main.storage.save_alarm({'title': 'saved', 'content': '', 'date': day(1), 'time': '07:00', 'news': False, 'weather': False})
+    main.storage.flush()
+    storage = main.storage
+    create_services()
+    assert main.storage is storage and main.speech.backend is fake_speech, 'create_services test: FAILED'
+    start_background_tasks()
+    try:
+        assert 'saved' in main.alarms, 'start_background_tasks restore test: FAILED'
+        main.notification_refresh.result(timeout=10)
+        assert len(main.notifications) == 3, 'start_background_tasks first refresh test: FAILED'
+        names = {thread.name for thread in threading.enumerate()}
+        assert {'alarm-engine', 'speech', 'config-watcher'} <= names, 'start_background_tasks threads test: FAILED'
+    finally:
+        stop_background_tasks()
+    names = {thread.name for thread in threading.enumerate()}
+    assert not {'alarm-engine', 'speech', 'config-watcher'} & names, 'stop_background_tasks test: FAILED'
+
+def test_lazy_imports(tmp_path) -> None:
+    """this function tests that importing main does not import the slow dependencies, set up the log,
+    start threads or create files"""
+    with open(os.path.join(ROOT, 'config.json'), 'r') as f, open(str(tmp_path / 'config.json'), 'w') as copy:
+        copy.write(f.read())
+    script = ('import sys; sys.path.insert(0, sys.argv[1]); import main, logging, threading; '
+              'print(sorted(set(sys.modules) & {"requests", "numpy", "pyttsx3", "uk_covid19"}), logging.getLogger().handlers, '
+              '[thread.name for thread in threading.enumerate()])')
+    output = subprocess.run([sys.executable, '-c', script, ROOT], cwd=str(tmp_path), capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[] [] ['MainThread']", 'lazy imports test: FAILED (' + output.strip() + ')'
+    assert os.listdir(str(tmp_path)) == ['config.json'], 'import side effects test: FAILED'
+
+def test_every_function_is_tested() -> None:
+    """this function checks that every function in main.py is used by at least one test"""
+    folder = os.path.dirname(os.path.abspath(__file__))
+    source = ''
+    for name in sorted(os.listdir(folder)):
+        if name.startswith('test_') and name.endswith('.py'):
+            with open(os.path.join(folder, name), encoding='utf-8') as f:
+                source += f.read()
+    routes = {rule.endpoint: rule.rule for rule in main.app.url_map.iter_rules()}
+    untested = [name for name, function in inspect.getmembers(main, inspect.isfunction)
+                if function.__module__ == 'main' and not re.search(r'\b%s\(' % name, source)
+                and "'%s" % routes.get(name, '(') not in source]
+    assert untested == [], 'functions in main.py without a test: ' + ', '.join(untested) + ': FAILED'
@@ -0,0 +1,69 @@
+"""
+Performance baselines of scheduling, formatting and building announcements. Each
+operation is timed and fails if it has become more than PERF_TOLERANCE times slower
+than its baseline in perf_baselines.json, three times by default. After a deliberate
+change, or on a much slower machine, record new baselines with:
+
+    UPDATE_PERF_BASELINES=1 python -m pytest tests/test_performance.py
+"""
+
+from alarm_engine import AlarmEngine
+from main import add_alarms
+from main import create_announcment
+from main import current_time
+from main import format_announcement
+from main import format_covid_notification
+from main import format_covid_summary
+from main import format_news_notification
+from main import format_weather_notification
+from main import next_occurrence
+from main import parse_alarm
+from main import prepare_announcment
+from main import remove_alarms
+from main import schedule_alarms
+from tests.support import load_fixture
+import main
+
+
+def test_scheduling_performance(app_state, performance) -> None:
+    """this function tests that scheduling alarms has not become slower"""
+    batch = [parse_alarm({'title': 'alarm %d' % i, 'date': current_time(), 'time': '23:59'}) for i in range(1000)]
+    def schedule():
+        main.s = AlarmEngine()
+        schedule_alarms(batch)
+    performance.check('schedule_alarms 1000 alarms', schedule, number=20)
+    engine = AlarmEngine()
+    for i in range(10000):
+        engine.enterabs(i, 1, print)
+    performance.check('enterabs and cancel with 10000 pending', lambda: engine.cancel(engine.enterabs(5000.5, 1, print)), number=10000)
+    titles = ['alarm %d' % i for i in range(100)]
+    def add_and_remove():
+        add_alarms(batch[:100], save=False)
+        remove_alarms(titles, save=False)
+    performance.check('add_alarms and remove_alarms 100 alarms', add_and_remove, number=50)
+    performance.check('parse_alarm', lambda: parse_alarm({'title': 'wake up', 'date': '2020-12-04', 'time': '07:00', 'news': True}), number=5000)
+    friday = main.alarm_epoch({'date': '2021-01-01', 'time': '08:00'})
+    performance.check('next_occurrence weekdays over a weekend', lambda: next_occurrence('weekdays', '07:00', friday), number=5000)
+
+def test_formatting_performance(performance) -> None:
+    """this function tests that formatting notifications and announcements has not become slower"""
+    weather = load_fixture('weather_test.json')
+    news = load_fixture('news_test.json')
+    covid = load_fixture('covid_test.json')
+    summary = {'date': '2020-11-14', 'new_cases': 20412, 'new_cases_yesterday': 24957, 'cum_cases': 1292373,
+               'new_deaths_yesterday': 112, 'cum_deaths_yesterday': 49064, 'cases_change': -4545,
+               'seven_day_average': 151904 / 7, 'threshold_level': 'Red - Not safe'}
+    performance.check('format_weather_notification', lambda: format_weather_notification(weather), number=2000)
+    performance.check('format_news_notification', lambda: format_news_notification(news), number=500)
+    performance.check('format_covid_notification', lambda: format_covid_notification(covid), number=2000)
+    performance.check('format_covid_summary', lambda: format_covid_summary(summary), number=2000)
+    notification = format_weather_notification(weather)
+    performance.check('format_announcement', lambda: format_announcement(notification, 'content'), number=5000)
+
+def test_announcement_performance(stub_apis, app_state, fake_speech, performance) -> None:
+    """this function tests that building and preparing an announcement from cached briefings has not become slower"""
+    alarm = {'title': 'fun', 'content': "['2020-12-04', '10:44']", 'date': '2020-12-04', 'time': '10:44',
+             'news': True, 'weather': True, 'location': 'Leeds', 'schedule': None}
+    create_announcment(alarm) #the briefings are cached, so only building the announcement is timed
+    performance.check('create_announcment with cached briefings', lambda: create_announcment(alarm), number=200)
+    performance.check('prepare_announcment with cached audio', lambda: prepare_announcment(alarm), number=100)
@@ -0,0 +1,75 @@
+"""
+Tests of the recurrence rules of recurring alarms, including when the clocks change
+"""
+
+from datetime import datetime
+from recurrence import local_epoch
+from recurrence import parse_rule
+from recurrence import zone
+
+LONDON = zone('Europe/London')
+
+
+def wall(text: str) -> float:
+    """Returns the seconds since the epoch of a London wall clock time formatted as YYYY-MM-DD HH:MM"""
+    return local_epoch(text[:10], text[11:], LONDON)
+
+def test_parse_rule() -> None:
+    """this function tests that recurrences are converted into rules and shared"""
+    assert parse_rule('weekdays', '07:00') is parse_rule('weekdays', '07:00'), 'parse_rule cache test: FAILED'
+    daily = parse_rule('daily', '07:30')
+    assert (daily.minutes, daily.hours, daily.weekdays) == (1 << 30, 1 << 7, 0x7f), 'parse_rule preset test: FAILED'
+    cron = parse_rule('*/15 9-17 * jan,dec 7')
+    assert cron.minutes == (1 | 1 << 15 | 1 << 30 | 1 << 45) and cron.months == (1 << 1 | 1 << 12), 'parse_rule cron test: FAILED'
+    assert cron.weekdays == 1 and cron.any_day and not cron.any_weekday, 'parse_rule sunday test: FAILED'
+    for invalid, at in (('daily', None), ('fortnightly', '07:00'), ('0 7 * *', None), ('60 7 * * *', None),
+                        ('0 7 * * 1-8', None), ('0 7 * * mon-', None), ('*/0 7 * * *', None), (5, None)):
+        try:
+            parse_rule(invalid, at)
+            assert False, 'parse_rule validation test: FAILED'
+        except ValueError:
+            pass
+    try:
+        zone('Nowhere/Land')
+        assert False, 'zone test: FAILED'
+    except ValueError:
+        pass
+
+def test_next_after() -> None:
+    """this function tests that the next occurrence of a rule is found"""
+    weekdays = parse_rule('weekdays', '06:30')
+    assert weekdays.next_after(wall('2021-01-01 06:00'), LONDON) == datetime(2021, 1, 1, 6, 30, tzinfo=LONDON), 'next_after same day test: FAILED'
+    assert weekdays.next_after(wall('2021-01-01 06:30'), LONDON) == datetime(2021, 1, 4, 6, 30, tzinfo=LONDON), 'next_after weekend test: FAILED'
+    hourly = parse_rule('0 9-17/4 * * *')
+    assert hourly.next_after(wall('2021-01-01 09:00'), LONDON).hour == 13, 'next_after hours test: FAILED'
+    assert hourly.next_after(wall('2021-01-01 17:00'), LONDON) == datetime(2021, 1, 2, 9, tzinfo=LONDON), 'next_after next day test: FAILED'
+    either = parse_rule('0 9 13 * 5') #the 13th of the month or a Friday, as in cron
+    assert either.next_after(wall('2021-01-09 10:00'), LONDON).day == 13, 'next_after day of month test: FAILED'
+    assert either.next_after(wall('2021-01-13 10:00'), LONDON).day == 15, 'next_after day of week test: FAILED'
+    assert parse_rule('0 0 29 2 *').next_after(wall('2021-03-01 00:00'), LONDON).year == 2024, 'next_after leap year test: FAILED'
+    try:
+        parse_rule('0 0 31 2 *').next_after(0, LONDON)
+        assert False, 'next_after never test: FAILED'
+    except ValueError:
+        pass
+
+def test_daylight_saving() -> None:
+    """this function tests that alarms keep their wall clock time when the clocks change"""
+    daily = parse_rule('daily', '07:00')
+    before = daily.next_after(wall('2021-03-27 08:00'), LONDON) #the clocks go forward on the 28th
+    assert before.timestamp() - wall('2021-03-27 07:00') == 23 * 3600, 'spring forward test: FAILED'
+    after = daily.next_after(wall('2021-10-30 08:00'), LONDON) #and back on the 31st
+    assert after.timestamp() - wall('2021-10-30 07:00') == 25 * 3600, 'fall back test: FAILED'
+    skipped = parse_rule('daily', '01:30').next_after(wall('2021-03-27 12:00'), LONDON)
+    assert skipped.timestamp() == wall('2021-03-28 02:30'), 'skipped time test: FAILED'
+    gap = parse_rule('daily', '01:30')
+    assert gap.next_after(wall('2021-03-28 02:00'), LONDON).timestamp() == wall('2021-03-28 02:30'), 'skipped time gap hour test: FAILED'
+    assert gap.next_after(wall('2021-03-28 02:29'), LONDON).timestamp() == wall('2021-03-28 02:30'), 'skipped time gap hour test: FAILED'
+    assert gap.next_after(wall('2021-03-28 02:30'), LONDON).date().day == 29, 'skipped time once test: FAILED'
+    repeated = parse_rule('daily', '01:30')
+    first = repeated.next_after(wall('2021-10-30 12:00'), LONDON)
+    assert first.timestamp() == datetime(2021, 10, 31, 0, 30, tzinfo=zone('UTC')).timestamp(), 'repeated time test: FAILED'
+    assert repeated.next_after(first.timestamp(), LONDON).date().day == 1, 'repeated time once test: FAILED'
+    assert repeated.next_after(first.timestamp() + 3000, LONDON).date().day == 1, 'repeated time second pass test: FAILED'
+    tokyo = parse_rule('daily', '07:00').next_after(wall('2021-01-01 12:00'), zone('Asia/Tokyo'))
+    assert tokyo.timestamp() == datetime(2021, 1, 1, 22, tzinfo=zone('UTC')).timestamp(), 'time zone test: FAILED'
@@ -0,0 +1,176 @@
+"""
+Tests of the routes, the events pushed to pages, the ASGI mode and /metrics
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from api_client import ApiClient
+from asgi import AsgiApp
+from main import current_time
+from metrics import Registry
+from metrics import registry
+from push import EventBroker
+from tests.support import delayed_route
+from tests.support import start_stub_server
+from tests.support import wall_clock
+import main
+
+
+def test_event_broker(app_state) -> None:
+    """this function tests that events are pushed to pages and slow pages are disconnected"""
+    broker = EventBroker(maxsize=3)
+    page = broker.subscribe({'alarms': [], 'notifications': []})
+    messages = page.messages(heartbeat=0.05)
+    assert b'event: snapshot' in next(messages), 'event snapshot test: FAILED'
+    broker.publish('alarm_added', {'title': 'wake up'})
+    message = next(messages).decode('utf-8')
+    assert 'event: alarm_added' in message and '"title": "wake up"' in message, 'event publish test: FAILED'
+    assert next(messages) == b': keep-alive\n\n', 'event keep-alive test: FAILED'
+    slow = broker.subscribe()
+    for i in range(5):
+        broker.publish('notification_added', {'title': str(i)})
+        assert b'"title": "%d"' % i in next(messages), 'event order test: FAILED'
+    assert broker.disconnected == 1 and len(broker) == 1, 'event slow page test: FAILED'
+    assert [m for m in slow.messages()][-1].startswith(b'id:'), 'event slow page stream test: FAILED'
+    assert len(broker) == 1, 'event unsubscribe test: FAILED'
+    def changed_meanwhile():
+        broker.publish('alarm_added', {'title': 'meanwhile'})
+        return {'alarms': [{'title': 'meanwhile'}], 'notifications': []}
+    late = broker.subscribe(changed_meanwhile).messages(heartbeat=0.05)
+    assert b'"title": "meanwhile"' in next(late) and b'event: snapshot' in next(late), 'event snapshot race test: FAILED'
+    assert b'"title": "meanwhile"' in next(messages), 'event snapshot race test: FAILED'
+    late.close()
+    client = main.app.test_client()
+    response = client.get('/events')
+    assert response.mimetype == 'text/event-stream', 'events route test: FAILED'
+    assert b'event: snapshot' in next(response.response), 'events route snapshot test: FAILED'
+    response.close()
+    assert client.get('/index', headers={'X-Requested-With': 'fetch'}).status_code == 204, 'fetch form test: FAILED'
+    broker.close()
+    assert len(broker) == 0 and list(page.messages()) == [], 'event close test: FAILED'
+
+def test_alarm_api(app_state) -> None:
+    """this function tests that alarms can be created, listed and deleted in bulk as JSON"""
+    client = main.app.test_client()
+    today = current_time()
+    tomorrow = wall_clock(time.time() + 86400, main.TIMEZONE)[0]
+    batch = [{'title': 'api %d' % i, 'date': today if i % 2 else tomorrow, 'time': '23:59', 'news': True} for i in range(250)]
+    response = client.post('/api/alarms', json=batch + [{'title': 'api 0', 'date': today, 'time': '07:00'}])
+    assert response.status_code == 201, 'api create test: FAILED'
+    assert response.get_json() == {'created': 250, 'duplicates': ['api 0']}, 'api duplicate test: FAILED'
+    assert main.alarms.get('api 1')['schedule'] is not None, 'api schedule today test: FAILED'
+    assert main.alarms.get('api 0')['schedule'] is None, 'api schedule tomorrow test: FAILED'
+    response = client.post('/api/alarms', json={'alarms': [{'title': 'valid', 'date': today, 'time': '07:00'},
+                                                           {'title': 'invalid', 'date': today, 'time': '7am'}]})
+    assert response.status_code == 400 and response.get_json()['index'] == 1, 'api invalid alarm test: FAILED'
+    assert 'valid' not in main.alarms, 'api invalid batch test: FAILED'
+    page = client.get('/api/alarms?per_page=100&page=3').get_json()
+    assert page['total'] == 250 and len(page['alarms']) == 50 and page['next'] is None, 'api last page test: FAILED'
+    page = client.get('/api/alarms?per_page=100').get_json()
+    assert page['alarms'][0] == {'title': 'api 0', 'content': str([tomorrow, '23:59']), 'date': tomorrow,
+                                 'time': '23:59', 'news': True, 'weather': False, 'location': None, 'repeat': None}, 'api list test: FAILED'
+    assert page['next'] == '/api/alarms?page=2&per_page=100', 'api next page test: FAILED'
+    assert client.get('/api/alarms?per_page=0').status_code == 400, 'api page size test: FAILED'
+    response = client.delete('/api/alarms', json={'titles': ['api %d' % i for i in range(250)] + ['unknown']})
+    assert response.get_json() == {'deleted': 250, 'missing': ['unknown']}, 'api delete test: FAILED'
+    assert len(main.alarms) == 0 and main.s.empty(), 'api delete schedule test: FAILED'
+    main.storage.flush()
+    assert list(main.storage.load_alarms()) == [], 'api delete storage test: FAILED'
+    with main.app.app_context():
+        response, status = main.api_error('broken', 418, index=2)
+    assert status == 418 and response.get_json() == {'error': 'broken', 'index': 2}, 'api_error test: FAILED'
+
+def test_asgi_app() -> None:
+    """this function tests that the ASGI mode serves the routes and streams events on the event loop"""
+    broker = EventBroker()
+    calls = []
+    application = AsgiApp(main.app, broker, lambda: {'alarms': [], 'notifications': []}, workers=2, heartbeat=0.05,
+                          startup=lambda: calls.append('startup'), shutdown=lambda: calls.append('shutdown'))
+    def scope(method, path, query=b''):
+        return {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'headers': [(b'host', b'localhost')]}
+    async def request(method, path, query=b''):
+        sent = []
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+        async def send(message):
+            sent.append(message)
+        await application(scope(method, path, query), receive, send)
+        return sent
+    async def stream():
+        sent = []
+        disconnect = asyncio.Event()
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+        async def send(message):
+            sent.append(message)
+            if len(sent) == 2: #the snapshot has been sent, so an event is published from another thread
+                threading.Thread(target=broker.publish, args=('alarm_added', {'title': 'asgi'})).start()
+            if b'alarm_added' in message.get('body', b''):
+                disconnect.set()
+        await asyncio.wait_for(application(scope('GET', '/events'), receive, send), 5)
+        return sent
+    async def lifespan():
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+        async def receive():
+            return messages.pop(0)
+        async def send(message):
+            sent.append(message['type'])
+        await application({'type': 'lifespan'}, receive, send)
+        return sent
+    sent = asyncio.run(request('GET', '/api/alarms', b'per_page=5'))
+    assert sent[0]['status'] == 200 and json.loads(sent[1]['body'])['per_page'] == 5, 'asgi route test: FAILED'
+    assert (b'content-type', b'application/json') in sent[0]['headers'], 'asgi headers test: FAILED'
+    sent = asyncio.run(stream())
+    assert sent[0]['headers'][0] == (b'content-type', b'text/event-stream'), 'asgi events test: FAILED'
+    bodies = [message.get('body', b'') for message in sent[1:]]
+    assert b'event: snapshot' in bodies[0] and b'event: alarm_added' in bodies[-1], 'asgi event stream test: FAILED'
+    assert len(broker) == 0, 'asgi disconnect test: FAILED'
+    assert asyncio.run(lifespan()) == ['lifespan.startup.complete', 'lifespan.shutdown.complete'], 'asgi lifespan test: FAILED'
+    assert calls == ['startup', 'shutdown'], 'asgi lifespan calls test: FAILED'
+
+def test_metrics(app_state, fake_speech, tmp_path) -> None:
+    """this function tests that measurements are recorded and served from /metrics"""
+    metrics = Registry()
+    latency = metrics.histogram('latency_seconds', 'test latency', ('source',), buckets=(0.01, 1))
+    for value in (0.005, 0.5, 7):
+        latency.observe(value, ('a "b"',))
+    failures = metrics.counter('failures_total', 'test failures')
+    failures.inc()
+    failures.inc(2)
+    metrics.gauge('depth', 'test depth', lambda: {('speech',): 3}, ('queue',))
+    text = metrics.render()
+    assert 'latency_seconds_bucket{source="a \\"b\\"",le="0.01"} 1\n' in text, 'metrics bucket test: FAILED'
+    assert 'latency_seconds_bucket{source="a \\"b\\"",le="+Inf"} 3\n' in text, 'metrics cumulative test: FAILED'
+    assert 'latency_seconds_count{source="a \\"b\\""} 3\n' in text and latency.total(('a "b"',)) == 7.505, 'metrics count test: FAILED'
+    assert 'failures_total 3\n' in text and 'depth{queue="speech"} 3\n' in text, 'metrics counter test: FAILED'
+    assert metrics.counter('failures_total', 'again') is failures, 'metrics registry test: FAILED'
+    fetches = registry.get('upstream_fetch_seconds')
+    server = start_stub_server({'/fine': delayed_route(0, {'cod': 200})})
+    ApiClient('metrics').get_json('http://127.0.0.1:%d/fine' % server.server_address[1])
+    server.shutdown()
+    server.server_close()
+    assert fetches.count(('metrics', 'ok')) == 1, 'metrics fetch latency test: FAILED'
+    synthesis = registry.get('tts_synthesis_seconds')
+    synthesised = synthesis.count()
+    main.speech.render('metrics test')
+    main.speech.render('metrics test')
+    assert synthesis.count() == synthesised + 1 and main.speech.hit_ratio() == 0.5, 'metrics tts test: FAILED'
+    lag = registry.get('alarm_lag_seconds')
+    fired = lag.count()
+    lagged = lag.total()
+    date, due = wall_clock(time.time() - 60, main.TIMEZONE)
+    main.read_announcment({'title': 'late', 'date': date, 'time': due,
+                           'announcement': ['late']})
+    assert lag.count() == fired + 1 and 60 <= lag.total() - lagged < 120, 'metrics alarm lag test: FAILED'
+    assert set(main.cache_stats()) == {'news', 'weather', 'covid', 'tts'}, 'cache_stats test: FAILED'
+    response = main.app.test_client().get('/metrics')
+    text = response.get_data(as_text=True)
+    assert response.status_code == 200 and 'queue_depth{queue="speech"} 1\n' in text, 'metrics endpoint test: FAILED'
+    assert 'cache_hit_ratio{cache="tts"}' in text, 'metrics labels test: FAILED'
+    assert 'upstream_fetch_seconds_bucket{source="metrics",outcome="ok",le="+Inf"} 1\n' in text, 'metrics endpoint fetch test: FAILED'
+    assert not logging.getLogger().isEnabledFor(logging.DEBUG), 'metrics log level test: FAILED'
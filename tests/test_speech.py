@@ -0,0 +1,62 @@
+"""
+Tests of rendering and speaking announcements
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from speech import NullBackend
+from speech import Pyttsx3Backend
+from speech import SpeechPipeline
+from speech import SpeechQueue
+from speech import merge_briefings
+from tests.support import FakeSpeechBackend
+
+
+def test_speech_pipeline() -> None:
+    """this function tests that announcements are rendered once and played from the cache"""
+    backend = FakeSpeechBackend()
+    with tempfile.TemporaryDirectory() as directory:
+        speech = SpeechPipeline(backend, cache_dir=directory, max_files=3)
+        speech.prerender(['alarm fun has gone off', 'covid report is fine'])
+        assert backend.rendered == ['alarm fun has gone off', 'covid report is fine'], 'speech prerender test: FAILED'
+        speech.speak(['alarm fun has gone off', 'covid report is fine', 'lastest news is new'])
+        assert backend.rendered[2:] == ['lastest news is new'], 'speech cache test: FAILED'
+        assert backend.played == ['alarm fun has gone off', 'covid report is fine', 'lastest news is new'], 'speech play test: FAILED'
+        speech.prerender(['one', 'two'])
+        assert len(os.listdir(directory)) == 3, 'speech prune test: FAILED'
+        played = os.path.join(directory, 'played')
+        player = Pyttsx3Backend([sys.executable, '-c', 'import shutil, sys; shutil.copy(sys.argv[1], %r)' % played])
+        player.play(speech.audio_path('one'), 'one')
+        assert os.path.exists(played) and player._engine is None, 'speech player test: FAILED'
+
+def test_speech_queue() -> None:
+    """this function tests that briefings are merged, cut short and never block the caller"""
+    assert merge_briefings([['alarm a has gone off', 'covid report'], ['alarm b has gone off', 'covid report', 'news']]) == \
+        ['alarm a has gone off', 'alarm b has gone off', 'covid report', 'news'], 'merge_briefings test: FAILED'
+    backend = NullBackend()
+    playing = threading.Event()
+    release = threading.Event()
+    def slow_play(path, text):
+        backend.played.append(text)
+        playing.set()
+        release.wait(2)
+    with tempfile.TemporaryDirectory() as directory:
+        speech = SpeechQueue(SpeechPipeline(backend, cache_dir=directory), maxsize=2)
+        backend.play = slow_play
+        speech.start()
+        start = time.monotonic()
+        assert speech.say(['alarm long has gone off', 'part one', 'part two']), 'speech queue test: FAILED'
+        playing.wait(1)
+        assert speech.say(['alarm a has gone off', 'covid report']), 'speech queue test: FAILED'
+        assert speech.say(['alarm b has gone off', 'covid report']), 'speech queue test: FAILED'
+        assert not speech.say(['alarm c has gone off']), 'speech queue bound test: FAILED'
+        assert time.monotonic() - start < 0.5, 'speech queue blocking test: FAILED'
+        release.set()
+        while len(backend.played) < 4 and time.monotonic() - start < 2:
+            time.sleep(0.01)
+        speech.stop(2)
+    assert backend.played == ['alarm long has gone off', 'alarm a has gone off', 'alarm b has gone off', 'covid report'], 'speech queue merge test: FAILED'
+    assert speech.interrupted == 1 and speech.dropped == 1, 'speech queue test: FAILED'
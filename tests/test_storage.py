@@ -0,0 +1,94 @@
+"""
+Tests of the settings in config.json and the database alarms are saved in
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from config import Config
+from config import ConfigError
+from storage import AlarmStorage
+
+
+def test_config() -> None:
+    """this function tests that config.json is validated and reloaded when it changes"""
+    settings = {"API-keys": {"weather": "a", "news": "b"}, "location": "Exeter"}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'config.json')
+        with open(path, 'w') as f:
+            json.dump(settings, f)
+        config = Config(path)
+        reloaded = []
+        config.add_listener(reloaded.append)
+        assert config["location"] == 'Exeter' and config.loads == 1, 'config load test: FAILED'
+        assert not config.reload_if_changed(), 'config reload test: FAILED'
+        settings["location"] = 'London'
+        with open(path, 'w') as f:
+            json.dump(settings, f)
+        os.utime(path, ns=(0, 1))
+        assert config.reload_if_changed() and config["location"] == 'London', 'config reload test: FAILED'
+        assert reloaded == [config], 'config listener test: FAILED'
+        with open(path, 'w') as f:
+            json.dump({"location": 'Exeter'}, f)
+        os.utime(path, ns=(0, 2))
+        assert not config.reload_if_changed() and config["location"] == 'London', 'config validation test: FAILED'
+        try:
+            Config(path)
+            assert False, 'config validation test: FAILED'
+        except ConfigError:
+            pass
+        with open(path, 'w') as f:
+            json.dump(dict(settings, **{"cache-ttl": 5}), f)
+        os.utime(path, ns=(0, 3))
+        assert not config.reload_if_changed() and config.get("cache-ttl") is None, 'config cache-ttl type test: FAILED'
+        with open(path, 'w') as f:
+            json.dump(dict(settings, **{"news-filter": ["Covid"]}), f)
+        os.utime(path, ns=(0, 4))
+        assert not config.reload_if_changed() and config.get("news-filter") is None, 'config news-filter type test: FAILED'
+        def failing(config):
+            raise RuntimeError('listener failed')
+        config.add_listener(failing)
+        config.watch(interval=0.02)
+        try:
+            with open(path, 'w') as f:
+                json.dump(settings, f)
+            os.utime(path, ns=(0, 5))
+            time.sleep(0.2)
+            assert config.loads == 3 and config._watcher.is_alive(), 'config watcher test: FAILED'
+        finally:
+            config.stop_watching()
+
+def test_alarm_storage() -> None:
+    """this function tests that alarms and notifications are restored after a restart"""
+    alarm = {'title': 'fun', 'content': "['2020-12-04', '10:44']", 'date': '2020-12-04', 'time': '10:44', 'news': True, 'weather': False, 'location': 'Leeds', 'repeat': 'weekdays', 'schedule': None}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'old.db')
+        connection = sqlite3.connect(path) #a database saved before alarms had a location or could repeat
+        connection.execute('CREATE TABLE alarms (title TEXT PRIMARY KEY, content TEXT NOT NULL, date TEXT NOT NULL, time TEXT NOT NULL, news INTEGER NOT NULL, weather INTEGER NOT NULL)')
+        connection.execute("INSERT INTO alarms VALUES ('old', '', '2020-12-04', '10:44', 0, 1)")
+        connection.commit()
+        connection.close()
+        storage = AlarmStorage(path)
+        assert [(alarm['location'], alarm['repeat']) for alarm in storage.load_alarms()] == [(None, None)], 'alarm storage migration test: FAILED'
+        storage.close()
+        path = os.path.join(directory, 'alarms.db')
+        storage = AlarmStorage(path)
+        storage.save_alarm(alarm)
+        storage.save_alarm(dict(alarm, title='gone'))
+        storage.delete_alarm('gone')
+        storage.save_notification({'title': 'news', 'content': 'first'})
+        storage.save_notification({'title': 'news', 'content': 'second'})
+        storage.delete_notification('news')
+        storage.save_notification({'title': 'empty', 'content': None})
+        storage.save_alarm(dict(alarm, title='broken', date=None)) #fails, but only on its own
+        storage.save_alarm(dict(alarm, title='after'))
+        storage.delete_alarm('after')
+        storage.close()
+        storage = AlarmStorage(path)
+        restored = list(storage.load_alarms())
+        assert restored == [{key: alarm[key] for key in restored[0]}], 'alarm storage test: FAILED'
+        assert restored[0]['news'] is True, 'alarm storage test: FAILED'
+        assert storage.load_notifications() == [{'title': 'news', 'content': 'second'}, {'title': 'empty', 'content': ''}], 'alarm storage notification test: FAILED'
+        storage.close()